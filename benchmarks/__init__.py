@@ -0,0 +1,6 @@
+"""Reproducible benchmarks for the Pingstream core
+
+Run `python -m benchmarks` from the repository root; everything runs
+offline against a local mock server (see mock_server.py) and generated
+OpenAPI specs (see specs.py).
+"""
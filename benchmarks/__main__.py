@@ -0,0 +1,128 @@
+"""Run the benchmarks, or compare two result files
+
+    python -m benchmarks run --quick -o results.json
+    python -m benchmarks compare baseline.json results.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from .mock_server import REPO_ROOT
+from .suites import SUITES, Settings
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Pingstream benchmarks")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="Run benchmark suites and write the results as JSON")
+    run.add_argument("--suite", nargs="+", choices=list(SUITES), default=list(SUITES), help="Suites to run (default: all)")
+    run.add_argument("--quick", action="store_true", help="Smaller sizes and fewer requests, for a quick check")
+    run.add_argument("--repeat", type=int, help="Runs per case (default: 5, or 3 with --quick)")
+    run.add_argument("--seed", type=int, default=0, help="Seed for generated specs and injected errors")
+    run.add_argument("-o", "--output", help="Write the results to this file instead of stdout")
+
+    compare = commands.add_parser("compare", help="Compare two result files; exits 1 on a regression")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown of the median, as a fraction (default: 0.1)")
+    return parser
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _curl_version():
+    try:
+        return subprocess.run(["curl", "--version"], capture_output=True, text=True).stdout.split("\n")[0]
+    except OSError:
+        return None
+
+
+def _print_result(result):
+    params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+    throughput = f"{result['throughput']:,.1f} {result['unit']}" if result["throughput"] else "-"
+    print(f"{result['suite']:<7} {result['name']:<18} {result['median_s'] * 1000:>11.3f} ms  {throughput:>16}  {params}", file=sys.stderr)
+
+
+def run_command(args):
+    settings = Settings(args.quick, args.repeat, args.seed)
+    started = time.time()
+    results = []
+    for name in args.suite:
+        results.extend(SUITES[name](settings, lambda result: _print_result(result) or result))
+
+    output = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(started)),
+            "elapsed_s": round(time.time() - started, 3),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "curl": _curl_version(),
+            "quick": settings.quick,
+            "repeat": settings.repeat,
+            "seed": settings.seed,
+        },
+        "results": results,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+def _case_key(result):
+    return (result["suite"], result["name"], json.dumps(result["params"], sort_keys=True))
+
+
+def compare_command(args):
+    """Print the change of each case's median; returns 1 if any slowed down past the threshold"""
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = {_case_key(result): result for result in json.load(f)["results"]}
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    for result in current:
+        old = baseline.get(_case_key(result))
+        if old is None or not old["median_s"]:
+            continue
+        change = result["median_s"] / old["median_s"] - 1
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['suite']:<7} {result['name']:<18} {old['median_s'] * 1000:>11.3f} -> {result['median_s'] * 1000:>11.3f} ms  {change:+7.1%}  {params}{flag}")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run_command(args)
+    if args.command == "compare":
+        return compare_command(args)
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
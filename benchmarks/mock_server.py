@@ -0,0 +1,253 @@
+"""Local mock API server for the benchmarks
+
+Every response is shaped by query parameters, on any path and method:
+
+    latency_ms   delay before responding (default 0)
+    size         approximate body size in bytes (default 1024)
+    kind         "json" (an array of records, default) or "bytes"
+    chunked      1 to send the body with chunked transfer encoding
+    chunks       with chunked, how many chunks to split the body into (default 16)
+    interval_ms  with chunked, delay between chunks, for streaming responses
+    error_rate   fraction of requests answered 500 instead (default 0)
+    status       status code of successful responses (default 200)
+    capacity     requests served at once; others wait their turn, so latency
+                 climbs once the load passes it
+    overload     with capacity, answer 429 when this many are already waiting
+    retry_after  seconds sent in the Retry-After header of 429s (default 1)
+
+Request bodies are read and discarded. Errors are drawn from a random
+generator seeded with --seed, so a run sends the same sequence of errors
+each time.
+
+Run it on its own with `python -m benchmarks.mock_server --port 8080`.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+BLOCK_SIZE = 64 * 1024
+RECORD = b'{"id": 1234567, "name": "item-1234567", "active": true, "score": 98.6, "tags": ["alpha", "beta"]},'
+# A block of whole records, so any number of blocks is still a valid array
+JSON_BLOCK = RECORD * (BLOCK_SIZE // len(RECORD))
+BYTES_BLOCK = b"x" * BLOCK_SIZE
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _body_pieces(kind, size):
+    """Yield pieces of a body of about `size` bytes without building it whole"""
+    if kind == "bytes":
+        while size > 0:
+            piece = BYTES_BLOCK[:min(size, BLOCK_SIZE)]
+            size -= len(piece)
+            yield piece
+        return
+
+    # "[" + records + a final record without its comma + "]"
+    yield b"["
+    remaining = max(0, size - len(RECORD) - 1)
+    while remaining >= len(JSON_BLOCK):
+        yield JSON_BLOCK
+        remaining -= len(JSON_BLOCK)
+    yield RECORD * (remaining // len(RECORD))
+    yield RECORD[:-1] + b"]"
+
+
+def body_size(kind, size):
+    """Exact length of the body _body_pieces() produces"""
+    if kind == "bytes":
+        return size
+    remaining = max(0, size - len(RECORD) - 1)
+    blocks, remaining = divmod(remaining, len(JSON_BLOCK))
+    return 1 + blocks * len(JSON_BLOCK) + (remaining // len(RECORD)) * len(RECORD) + len(RECORD)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _option(self, query, name, default, convert=int):
+        values = query.get(name)
+        return convert(values[0]) if values else default
+
+    def _discard_body(self):
+        length = self.headers.get("Content-Length")
+        if length:
+            left = int(length)
+            while left:
+                left -= len(self.rfile.read(min(left, BLOCK_SIZE)))
+        elif self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if not size:
+                    self.rfile.readline()
+                    break
+                self.rfile.read(size)
+                self.rfile.readline()
+
+    def _respond(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self._discard_body()
+
+        capacity = self._option(query, "capacity", 0)
+        if not capacity:
+            self._serve(query)
+            return
+        slots, waiting = self.server.admit(capacity)
+        overload = self._option(query, "overload", 0)
+        if overload and waiting > overload:
+            self.server.leave()
+            body = b'{"error": "overloaded"}'
+            self.send_response(429)
+            self.send_header("Retry-After", str(self._option(query, "retry_after", 1)))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        with slots:
+            self.server.leave()
+            self._serve(query)
+
+    def _serve(self, query):
+        latency = self._option(query, "latency_ms", 0.0, float)
+        if latency:
+            time.sleep(latency / 1000)
+
+        error_rate = self._option(query, "error_rate", 0.0, float)
+        if error_rate and self.server.draw() < error_rate:
+            body = b'{"error": "injected failure"}'
+            self.send_response(500)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        kind = self._option(query, "kind", "json", str)
+        size = self._option(query, "size", 1024)
+        self.send_response(self._option(query, "status", 200))
+        self.send_header("Content-Type", "application/json" if kind == "json" else "application/octet-stream")
+
+        if not self._option(query, "chunked", 0):
+            self.send_header("Content-Length", str(body_size(kind, size)))
+            self.end_headers()
+            for piece in _body_pieces(kind, size):
+                self.wfile.write(piece)
+            return
+
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = max(1, self._option(query, "chunks", 16))
+        interval = self._option(query, "interval_ms", 0.0, float) / 1000
+        chunk_size = max(1, body_size(kind, size) // chunks)
+        pending = bytearray()
+        for piece in _body_pieces(kind, size):
+            pending += piece
+            while len(pending) >= chunk_size:
+                self._write_chunk(pending[:chunk_size], interval)
+                del pending[:chunk_size]
+        if pending:
+            self._write_chunk(pending, interval)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data, interval):
+        self.wfile.write(b"%x\r\n" % len(data))
+        self.wfile.write(data)
+        self.wfile.write(b"\r\n")
+        if interval:
+            self.wfile.flush()
+            time.sleep(interval)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, seed=0):
+        super().__init__(address, MockHandler)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._waiting = 0
+
+    def draw(self):
+        with self._lock:
+            return self._random.random()
+
+    def admit(self, capacity):
+        """The semaphore for `capacity`, and how many requests are now waiting for a slot"""
+        with self._lock:
+            slots = self._slots.get(capacity)
+            if slots is None:
+                slots = self._slots[capacity] = threading.Semaphore(capacity)
+            self._waiting += 1
+            return slots, self._waiting
+
+    def leave(self):
+        """A request stopped waiting: it got a slot, or was turned away"""
+        with self._lock:
+            self._waiting -= 1
+
+
+class ServerProcess:
+    """The mock server in a child process, so it does not share the benchmark's GIL
+
+    Use as a context manager; `url` is the server's base URL.
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.url = None
+        self._process = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.mock_server", "--port", "0", "--seed", str(self.seed)],
+            cwd=REPO_ROOT,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        # The server prints its URL once it is listening
+        self.url = self._process.stdout.readline().strip()
+        if not self.url:
+            self._process.kill()
+            raise RuntimeError("Mock server did not start")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.wait()
+        self._process.stdout.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock API server for the Pingstream benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected errors")
+    args = parser.parse_args(argv)
+
+    server = MockServer((args.host, args.port), seed=args.seed)
+    print(f"http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Generated OpenAPI specs of a given size"""
+import json
+import os
+import random
+
+METHODS = ["get", "post", "put", "delete"]
+
+
+def _operation(method, index, rng):
+    operation = {
+        "tags": [f"resource{index % 50}"],
+        "summary": f"{method.upper()} operation {index}",
+        "operationId": f"{method}Resource{index}",
+        "parameters": [
+            {"name": "id", "in": "path", "required": True, "schema": {"type": "integer"}},
+            {"name": "limit", "in": "query", "schema": {"type": "integer"}},
+            {"name": "X-Request-Id", "in": "header", "schema": {"type": "string"}},
+        ],
+        "responses": {
+            "200": {"description": "Success"},
+            "404": {"description": "Not found"},
+        },
+    }
+    if method in ("post", "put"):
+        fields = rng.sample(["name", "email", "count", "active", "tags", "price", "notes"], 3)
+        operation["requestBody"] = {
+            "content": {"application/json": {"schema": {"type": "object", "properties": {f: {"type": "string"} for f in fields}}}}
+        }
+    return operation
+
+
+def openapi_spec(operations, seed=0):
+    """An OpenAPI 3 document with `operations` operations, the same for every seed"""
+    rng = random.Random(seed)
+    paths = {}
+    index = 0
+    while index < operations:
+        path = f"/resource{index % 50}/v{index // 50}/{{id}}"
+        methods = METHODS[:min(len(METHODS), operations - index)]
+        paths[path] = {method: _operation(method, index + offset, rng) for offset, method in enumerate(methods)}
+        index += len(methods)
+    return {
+        "openapi": "3.0.0",
+        "info": {"title": f"Benchmark API ({operations} operations)", "version": "1.0.0"},
+        "servers": [{"url": "http://127.0.0.1:8080"}],
+        "paths": paths,
+    }
+
+
+def write_spec(directory, operations, seed=0):
+    """Write openapi_spec(operations) to `directory` and return its path"""
+    path = os.path.join(directory, f"openapi_{operations}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(openapi_spec(operations, seed), f)
+    return path
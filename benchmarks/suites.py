@@ -0,0 +1,275 @@
+"""Benchmark suites
+
+Each suite is a function taking a Settings and a reporter and returning a
+list of result dicts, all with the same keys: suite, name, params, repeat,
+min_s, median_s, mean_s, throughput and unit. Send results also carry
+latency percentiles.
+"""
+import gc
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from pingstream_core import importer
+from pingstream_core.distributed import DistributedLoadTest
+from pingstream_core.engine import ConnectionPool, prepare_request, response_text, send_request
+from pingstream_core.exporter import EXPORT_FORMATS, export_collections
+from pingstream_core.jsonquery import query_json
+from pingstream_core.loadtest import LatencyHistogram, LoadTest
+from pingstream_core.model import Request
+from pingstream_core.reports import result_passed
+from pingstream_core.runner import run_requests
+
+from .mock_server import ServerProcess
+from .specs import openapi_spec, write_spec
+
+MB = 1024 * 1024
+
+# Same limits as the response view in pingstream.py
+INLINE_BODY_LIMIT = 2 * MB
+PREVIEW_PAGE_SIZE = 64 * 1024
+
+# Bodies above this size are fetched once per run whatever the repeat count
+LARGE_BODY = 100 * MB
+# Largest body decoded whole with json.loads
+DECODE_LIMIT = 16 * MB
+# A query box filter no record of the mock server's bodies matches, so the whole body is read
+JSON_QUERY = "$[?(@.score > 99)].id"
+
+
+class Settings:
+    """Sizes and counts for one run; quick runs use the smaller sets"""
+
+    def __init__(self, quick=False, repeat=None, seed=0):
+        self.quick = quick
+        self.repeat = repeat or (3 if quick else 5)
+        self.seed = seed
+        self.operations = [100, 1000, 10000] if quick else [100, 1000, 10000, 100000]
+        self.export_operations = [1000, 10000] if quick else [1000, 10000, 100000]
+        self.body_sizes = [1024, 64 * 1024, MB, 16 * MB] if quick else [1024, 64 * 1024, MB, 16 * MB, 100 * MB, 500 * MB]
+        self.requests = 100 if quick else 500
+        self.runner_requests = 100 if quick else 400
+        self.load_requests = 2000 if quick else 20000
+        self.load_processes = sorted({1, 2, os.cpu_count() or 1})
+
+
+def _timings(func, repeat):
+    """Run func() `repeat` times and return the seconds each run took"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _result(suite, name, params, times, work, unit):
+    """Result dict for a case; throughput is `work` done per second at the median time"""
+    median = statistics.median(times)
+    return {
+        "suite": suite,
+        "name": name,
+        "params": params,
+        "repeat": len(times),
+        "min_s": min(times),
+        "median_s": median,
+        "mean_s": statistics.mean(times),
+        "throughput": work / median if median else None,
+        "unit": unit,
+    }
+
+
+def _latency_result(suite, name, params, histogram, elapsed, extra=None):
+    """Result dict for a case timed per request with a LatencyHistogram in microseconds"""
+    result = {
+        "suite": suite,
+        "name": name,
+        "params": params,
+        "repeat": histogram.count,
+        "min_s": histogram.min / 1e6,
+        "median_s": histogram.percentile(50) / 1e6,
+        "mean_s": histogram.mean() / 1e6,
+        "throughput": histogram.count / elapsed,
+        "unit": "req/s",
+        "p90_s": histogram.percentile(90) / 1e6,
+        "p99_s": histogram.percentile(99) / 1e6,
+    }
+    result.update(extra or {})
+    return result
+
+
+def parse_suite(settings, report):
+    """Importing generated OpenAPI specs, loaded whole and streamed"""
+    results = []
+    directory = tempfile.mkdtemp(prefix="pingstream-bench-")
+    try:
+        for operations in settings.operations:
+            path = write_spec(directory, operations, settings.seed)
+            params = {"operations": operations, "file_bytes": os.path.getsize(path)}
+            repeat = settings.repeat if operations < 100000 else 1
+
+            def load_and_parse():
+                with open(path, "rb") as f:
+                    importer.parse_openapi_spec(json.load(f))
+
+            def stream_import():
+                # Re-importing the same file would be served from the import cache
+                importer._import_cache.clear()
+                with open(path, "rb") as f:
+                    importer.import_collection(f, path)
+
+            for name, func in (("json_load_parse", load_and_parse), ("import_collection", stream_import)):
+                results.append(report(_result("parse", name, params, _timings(func, repeat), operations, "ops/s")))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def _engines():
+    return ["pooled", "curl"] if shutil.which("curl") else ["pooled"]
+
+
+def send_suite(settings, report):
+    """The pooled engine against curl, and the collection runner, on the mock server"""
+    results = []
+    with ServerProcess(settings.seed) as server:
+        for engine in _engines():
+            cases = [
+                ("get_1kb", prepare_request("GET", f"{server.url}/items?size=1024")),
+                ("post_1mb", prepare_request("POST", f"{server.url}/items?size=64", body=json.dumps("x" * (MB - 2)))),
+            ]
+            for name, prepared in cases:
+                pool = ConnectionPool()
+                # Warm up the connection and the server's threads
+                for _ in range(5):
+                    send_request(prepared, engine, pool=pool, keep_body=False)
+                histogram = LatencyHistogram()
+                start = time.perf_counter()
+                for _ in range(settings.requests):
+                    sent = time.perf_counter()
+                    send_request(prepared, engine, pool=pool, keep_body=False)
+                    histogram.record((time.perf_counter() - sent) * 1e6)
+                elapsed = time.perf_counter() - start
+                pool.clear()
+                params = {"engine": engine, "requests": settings.requests}
+                results.append(report(_latency_result("send", name, params, histogram, elapsed)))
+
+        # Many requests with server latency and injected errors through the runner
+        jobs = [
+            ("bench", Request(f"item {i}", "GET", f"/items/{i}?latency_ms=20&error_rate=0.1&size=2048"))
+            for i in range(settings.runner_requests)
+        ]
+        # With curl the runner sends each host's requests in batches from one process
+        for engine in _engines():
+            histogram = LatencyHistogram()
+            failed = 0
+            start = time.perf_counter()
+            for result in run_requests(jobs, base_url=server.url, engine=engine, concurrency=16, per_host=16):
+                histogram.record(result["latency_ms"] * 1000)
+                failed += not result_passed(result)
+            elapsed = time.perf_counter() - start
+            name = "runner" if engine == "pooled" else f"runner_{engine}"
+            params = {"engine": engine, "requests": len(jobs), "concurrency": 16, "latency_ms": 20, "error_rate": 0.1}
+            results.append(report(_latency_result("send", name, params, histogram, elapsed, {"failed": failed})))
+
+        # A closed-loop load test from this process, then spread over worker processes
+        prepared = prepare_request("GET", f"{server.url}/items?size=1024")
+        for processes in [0] + settings.load_processes:
+            options = {"concurrency": 32, "total_requests": settings.load_requests}
+            if processes:
+                test = DistributedLoadTest(prepared, processes=processes, **options)
+            else:
+                test = LoadTest(prepared, **options)
+            test.start()
+            test.wait()
+            snapshot = test.snapshot()
+            params = {"processes": processes, "requests": settings.load_requests, "concurrency": 32}
+            results.append(report(_latency_result("send", "load_test", params, test.histogram, snapshot["elapsed"], {"failed": snapshot["errors"]})))
+    return results
+
+
+def _render_prep(response):
+    """What the response view does with a body before showing it"""
+    body = response["body"]
+    if body.size <= INLINE_BODY_LIMIT:
+        json.loads(response_text(response))
+    else:
+        # First and last preview pages
+        body.read_range(0, PREVIEW_PAGE_SIZE)
+        body.read_range(max(body.size - 1, 0) // PREVIEW_PAGE_SIZE * PREVIEW_PAGE_SIZE, PREVIEW_PAGE_SIZE)
+
+
+def decode_suite(settings, report):
+    """Receiving, spooling and preparing JSON bodies of 1 KB to 500 MB for display"""
+    results = []
+    with ServerProcess(settings.seed) as server:
+        pool = ConnectionPool()
+        for size in settings.body_sizes:
+            repeat = settings.repeat if size < LARGE_BODY else 1
+            for chunked in (0, 1):
+                prepared = prepare_request("GET", f"{server.url}/data?size={size}&chunked={chunked}")
+                responses = []
+
+                def receive():
+                    responses.append(send_request(prepared, pool=pool))
+
+                times = _timings(receive, repeat)
+                params = {"bytes": responses[0]["body"].size, "chunked": bool(chunked)}
+                results.append(report(_result("decode", "receive", params, times, params["bytes"] / MB, "MB/s")))
+
+                if not chunked:
+                    response = responses[-1]
+                    times = _timings(lambda: _render_prep(response), repeat)
+                    results.append(report(_result("decode", "render_prep", params, times, params["bytes"] / MB, "MB/s")))
+                    times = _timings(lambda: list(query_json(response["body"].open(), JSON_QUERY)), repeat)
+                    results.append(report(_result("decode", "json_query", params, times, params["bytes"] / MB, "MB/s")))
+                    if size <= DECODE_LIMIT:
+                        times = _timings(lambda: json.loads(response["body"].read()), repeat)
+                        results.append(report(_result("decode", "json_decode", params, times, params["bytes"] / MB, "MB/s")))
+                for response in responses:
+                    response["body"].close()
+        pool.clear()
+    return results
+
+
+def export_suite(settings, report):
+    """Exporting collections to a file in each format, and importing the export again"""
+    results = []
+    directory = tempfile.mkdtemp(prefix="pingstream-bench-")
+    try:
+        for operations in settings.export_operations:
+            collections = importer.parse_openapi_spec(openapi_spec(operations, settings.seed))
+            repeat = settings.repeat if operations < 100000 else 1
+            for export_format in EXPORT_FORMATS:
+                for compress in (False, True):
+                    path = os.path.join(directory, ("export.jsonl" if export_format == "jsonl" else "export.json") + (".gz" if compress else ""))
+
+                    def export():
+                        with open(path, "wb") as f:
+                            export_collections(collections, f, export_format, compress=compress)
+
+                    def reimport():
+                        importer._import_cache.clear()
+                        with open(path, "rb") as f:
+                            importer.import_collection(f, path)
+
+                    times = _timings(export, repeat)
+                    params = {"operations": operations, "format": export_format, "gzip": compress, "output_bytes": os.path.getsize(path)}
+                    results.append(report(_result("export", "export", params, times, operations, "ops/s")))
+                    times = _timings(reimport, repeat)
+                    results.append(report(_result("export", "reimport", params, times, operations, "ops/s")))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+SUITES = {
+    "parse": parse_suite,
+    "send": send_suite,
+    "decode": decode_suite,
+    "export": export_suite,
+}
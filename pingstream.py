@@ -1,15 +1,31 @@
 import streamlit as st
-import subprocess
+import io
 import json
-import tempfile
 import os
-import uuid
+import socket
+import tempfile
+import time
+from collections import deque
 from datetime import datetime
 
-st.set_page_config(page_title="pingstream", layout="wide")
+from pingstream_core.cache import get_cache
+from pingstream_core.distributed import TOKEN_VARIABLE, DistributedLoadTest
+from pingstream_core.engine import ENGINES, HTTP_VERSIONS, TIMING_PHASES, RequestError, curl_command, get_header, prepare_request, response_text, send_request
+from pingstream_core.exporter import EXPORT_FORMATS, export_collections
+from pingstream_core.history import STATUS_FILTERS, get_store
+from pingstream_core.importer import import_collection
+from pingstream_core.index import EndpointIndex
+from pingstream_core.jsonquery import format_path, json_children, query_json
+from pingstream_core.loadtest import AdaptiveLoadTest, LoadTest
+from pingstream_core.model import memory_report
+from pingstream_core.multipart import file_content_type
+from pingstream_core.profiler import get_profiler, state_sizes
+from pingstream_core.reports import Tally, write_jsonl_result
+from pingstream_core.runner import collection_jobs, run_requests
+from pingstream_core.templates import DATASET_TYPES, RequestTemplate, dataset_rows, iteration_jobs
 
-# Add custom CSS for a cleaner look
-st.markdown("""
+# Custom CSS for a cleaner look
+PAGE_CSS = """
 <style>
     .main {
         background-color: #f9f9f9;
@@ -57,264 +73,661 @@ st.markdown("""
         background-color: #f0f2f6;
         border-left: 2px solid #4a90e2;
     }
+    .waterfall-row {
+        display: flex;
+        align-items: center;
+        font-size: 12px;
+        margin-bottom: 4px;
+    }
+    .waterfall-label {
+        width: 70px;
+    }
+    .waterfall-track {
+        flex: 1;
+        position: relative;
+        height: 12px;
+        background-color: #f0f2f6;
+        border-radius: 2px;
+    }
+    .waterfall-bar {
+        position: absolute;
+        height: 12px;
+        border-radius: 2px;
+    }
+    .waterfall-time {
+        width: 70px;
+        text-align: right;
+    }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-def parse_openapi_spec(data):
-    """Parse OpenAPI specification to extract endpoints"""
-    collections = []
-    
-    # Check if it's OpenAPI format
-    if 'openapi' in data and 'paths' in data:
-        # Process OpenAPI spec
-        for path, path_data in data['paths'].items():
-            for method, operation in path_data.items():
-                if method.lower() in ['get', 'post', 'put', 'delete', 'patch']:
-                    # Get tag as folder name (if exists)
-                    folder = 'Default'
-                    if 'tags' in operation and operation['tags']:
-                        folder = operation['tags'][0]
-                    
-                    # Get summary/description
-                    name = operation.get('summary', path)
-                    if not name or name == path:
-                        name = operation.get('operationId', path)
-                    
-                    # Extract parameters
-                    params = []
-                    if 'parameters' in operation:
-                        for param in operation['parameters']:
-                            if param['in'] == 'query':
-                                params.append({
-                                    "key": param['name'],
-                                    "value": ""
-                                })
-                    
-                    # Extract request body schema if exists
-                    body = "{}"
-                    if 'requestBody' in operation and 'content' in operation['requestBody']:
-                        if 'application/json' in operation['requestBody']['content']:
-                            schema = operation['requestBody']['content']['application/json'].get('schema', {})
-                            # Generate a sample body based on schema (simplified)
-                            if 'properties' in schema:
-                                sample_body = {}
-                                for prop, details in schema['properties'].items():
-                                    sample_body[prop] = ""
-                                body = json.dumps(sample_body, indent=2)
-                    
-                    # Extract headers
-                    headers = []
-                    if 'parameters' in operation:
-                        for param in operation['parameters']:
-                            if param['in'] == 'header':
-                                headers.append({
-                                    "key": param['name'],
-                                    "value": ""
-                                })
-                    
-                    # Create request object
-                    request = {
-                        "id": str(uuid.uuid4()),
-                        "name": name,
-                        "method": method.upper(),
-                        "url": path,
-                        "headers": headers,
-                        "params": params,
-                        "body": body
-                    }
-                    
-                    # Add to collections
-                    found = False
-                    for collection in collections:
-                        if collection['name'] == folder:
-                            collection['requests'].append(request)
-                            found = True
-                            break
-                    
-                    if not found:
-                        collections.append({
-                            "name": folder,
-                            "requests": [request]
-                        })
-    
-    # Check if it's a Postman collection
-    elif 'info' in data and 'item' in data:
-        def process_items(items, parent_name=None):
-            for item in items:
-                if 'request' in item:
-                    # This is a request
-                    folder = parent_name or 'Default'
-                    
-                    # Extract URL
-                    url = ""
-                    if isinstance(item['request']['url'], dict):
-                        url = item['request']['url'].get('raw', '')
-                    else:
-                        url = item['request']['url']
-                    
-                    # Extract headers
-                    headers = []
-                    if 'header' in item['request']:
-                        for header in item['request']['header']:
-                            headers.append({
-                                "key": header['key'],
-                                "value": header.get('value', '')
-                            })
-                    
-                    # Extract body
-                    body = "{}"
-                    if 'body' in item['request'] and item['request']['body']:
-                        if 'raw' in item['request']['body']:
-                            body = item['request']['body']['raw']
-                    
-                    # Create request object
-                    request = {
-                        "id": str(uuid.uuid4()),
-                        "name": item['name'],
-                        "method": item['request']['method'],
-                        "url": url,
-                        "headers": headers,
-                        "params": [],  # Postman stores params in the URL
-                        "body": body
-                    }
-                    
-                    # Add to collections
-                    found = False
-                    for collection in collections:
-                        if collection['name'] == folder:
-                            collection['requests'].append(request)
-                            found = True
-                            break
-                    
-                    if not found:
-                        collections.append({
-                            "name": folder,
-                            "requests": [request]
-                        })
-                        
-                elif 'item' in item:
-                    # This is a folder
-                    process_items(item['item'], item['name'])
-            
-        process_items(data['item'])
-    
-    return collections
+def setup_page():
+    """Configure the page; called from main() so importing this module has no side effects"""
+    st.set_page_config(page_title="pingstream", layout="wide")
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 def load_request(request_data):
-    """Load request data into the form"""
+    """Load request data into the form
+
+    `request_data` holds form fields (see Request.to_form()): method, url,
+    headers and params as key/value rows, and body.
+    """
     st.session_state.method = request_data['method']
     st.session_state.url = request_data['url']
-    st.session_state.headers = request_data['headers'] if request_data['headers'] else [{"key": "", "value": ""}]
-    st.session_state.params = request_data['params'] if request_data['params'] else [{"key": "", "value": ""}]
+    # Copy the rows so editing the form does not change the stored request
+    st.session_state.headers = [dict(h) for h in request_data['headers']] if request_data['headers'] else [{"key": "", "value": ""}]
+    st.session_state.params = [dict(p) for p in request_data['params']] if request_data['params'] else [{"key": "", "value": ""}]
     st.session_state.body = request_data['body']
+    
+    # Drop the old row inputs so they pick up the loaded values
+    for key in list(st.session_state.keys()):
+        if key.startswith(("header_key_", "header_value_", "param_key_", "param_value_")):
+            del st.session_state[key]
+
+PHASE_COLORS = {
+    'dns': '#9b59b6',
+    'connect': '#e67e22',
+    'tls': '#16a085',
+    'wait': '#4a90e2',
+    'transfer': '#27ae60'
+}
+
+# Bodies up to this size are parsed and shown whole; larger ones are paged
+INLINE_BODY_LIMIT = 2 * 1024 * 1024
+PREVIEW_PAGE_SIZE = 64 * 1024
+LIVE_TAIL_SIZE = 4 * 1024
+# JSON query matches listed, members per tree node and page, and characters per value shown
+QUERY_RESULT_LIMIT = 100
+TREE_PAGE_SIZE = 50
+JSON_PREVIEW_CHARS = 200
+HISTORY_PAGE_SIZE = 20
+BROWSER_PAGE_SIZE = 25
+# Latest dataset iterations shown in the table; all are written to a file
+ITERATION_TAIL_SIZE = 100
+# Seconds between redraws of a running load test's report
+LOAD_REPORT_INTERVAL = 0.5
+# Reruns and session state keys listed in the profiler panel
+PROFILER_RERUNS_SHOWN = 10
+PROFILER_STATE_KEYS_SHOWN = 25
+
+EXPORT_FORMAT_LABELS = {
+    'postman': 'Postman v2.1',
+    'openapi': 'OpenAPI 3',
+    'jsonl': 'JSON Lines (fastest to re-import)',
+}
+
+HTTP_VERSION_LABELS = {
+    'auto': 'Best available',
+    '1.1': 'HTTP/1.1',
+    '2': 'HTTP/2',
+    '2-prior-knowledge': 'HTTP/2 prior knowledge (h2c)',
+}
+
+METHOD_COLORS = {
+    'GET': 'green',
+    'POST': 'blue',
+    'PUT': 'orange',
+    'DELETE': 'red',
+    'PATCH': 'purple'
+}
+
+def endpoint_index():
+    """Search index over the imported collections, rebuilt only when they change"""
+    cached = st.session_state.get('endpoint_index')
+    if cached is None or cached[0] != st.session_state.collections_version:
+        cached = (st.session_state.collections_version, EndpointIndex(st.session_state.collections))
+        st.session_state.endpoint_index = cached
+    return cached[1]
+
+def collections_memory():
+    """Memory report for the imported collections, recomputed only when they change"""
+    cached = st.session_state.get('collections_memory')
+    if cached is None or cached[0] != st.session_state.collections_version:
+        cached = (st.session_state.collections_version, memory_report(st.session_state.collections))
+        st.session_state.collections_memory = cached
+    return cached[1]
+
+def export_file(export_format, compress):
+    """Export the collections to a temporary file, rewritten only when they or the options change
+
+    Returns the file's path and the number of requests written.
+    """
+    options = (st.session_state.collections_version, export_format, compress)
+    cached = st.session_state.get('export_file')
+    if cached is None or cached[0] != options:
+        if cached is not None:
+            os.unlink(cached[1])
+        with tempfile.NamedTemporaryFile(prefix="pingstream-export-", delete=False) as f:
+            written = export_collections(st.session_state.collections, f, export_format, compress=compress)
+        cached = (options, f.name, written)
+        st.session_state.export_file = cached
+    return cached[1], cached[2]
+
+def page_controls(total, key):
+    """Previous/next buttons for a long list; returns the slice of it to show"""
+    pages = max(1, -(-total // BROWSER_PAGE_SIZE))
+    page = min(st.session_state.get(key, 0), pages - 1)
+    if pages > 1:
+        cols = st.columns([1, 2, 1])
+        if cols[0].button("◀", key=f"{key}_prev", disabled=page == 0):
+            page -= 1
+        if cols[2].button("▶", key=f"{key}_next", disabled=page == pages - 1):
+            page += 1
+        cols[1].caption(f"Page {page + 1} of {pages}")
+    st.session_state[key] = page
+    start = page * BROWSER_PAGE_SIZE
+    return start, min(start + BROWSER_PAGE_SIZE, total)
+
+def request_button(request, key, help=None):
+    """Sidebar button that loads a collection request into the form"""
+    # Display request with method color
+    method_color = METHOD_COLORS.get(request.method, 'gray')
+    request_label = f"<span style='color:{method_color};font-weight:bold;'>{request.method}</span> {request.name}"
+    
+    if st.button(request_label, key=key, use_container_width=True, help=help or request.url):
+        load_request(request.to_form())
+
+def render_waterfall(response):
+    """Show how long each phase of the request took as a waterfall"""
+    timings = response['timings']
+    total = timings['total'] or 1
+    rows = []
+    offset = 0
+    for phase in TIMING_PHASES:
+        left = offset / total * 100
+        width = max(timings[phase] / total * 100, 0.5)
+        rows.append(
+            f"<div class='waterfall-row'><span class='waterfall-label'>{phase}</span>"
+            f"<div class='waterfall-track'><div class='waterfall-bar' style='left:{left:.2f}%;width:{width:.2f}%;background-color:{PHASE_COLORS[phase]};'></div></div>"
+            f"<span class='waterfall-time'>{timings[phase]:.1f} ms</span></div>"
+        )
+        offset += timings[phase]
+    st.markdown("".join(rows), unsafe_allow_html=True)
+    st.caption(
+        f"TTFB {timings['ttfb']:.1f} ms · total {timings['total']:.1f} ms  \n"
+        f"↑ {response['bytes_up']:,} B · ↓ {response['bytes_down']:,} B · "
+        f"{'reused connection' if response['reused'] else 'new connection'}"
+    )
+
+def set_last_response(response):
+    """Keep the response for display across reruns, freeing the previous body"""
+    previous = st.session_state.get('last_response')
+    if previous is not None:
+        previous['body'].close()
+    st.session_state.last_response = response
+    st.session_state.body_offset = 0
+    # Query results and tree listings belong to the body they were read from
+    for key in ('json_query_result', 'json_listings', 'json_open'):
+        st.session_state.pop(key, None)
+
+def render_body_pages(body):
+    """Show a large body one page at a time"""
+    last_page = max(body.size - 1, 0) // PREVIEW_PAGE_SIZE * PREVIEW_PAGE_SIZE
+    offset = st.number_input(
+        "Start at byte",
+        min_value=0,
+        max_value=last_page,
+        step=PREVIEW_PAGE_SIZE,
+        key="body_offset",
+        help=f"The body is {body.size:,} bytes; {PREVIEW_PAGE_SIZE:,} are shown at a time",
+    )
+    chunk = body.read_range(int(offset), PREVIEW_PAGE_SIZE)
+    st.caption(f"Bytes {int(offset):,}–{int(offset) + len(chunk):,} of {body.size:,}")
+    st.text_area("Response", chunk.decode('utf-8', errors='replace'), height=300)
+
+def json_preview(value):
+    """A value as compact JSON, cut to JSON_PREVIEW_CHARS"""
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= JSON_PREVIEW_CHARS else text[:JSON_PREVIEW_CHARS] + "…"
+
+def render_json_query(body):
+    """JSONPath query box over a JSON body, read incrementally from the spooled file"""
+    query = st.text_input(
+        "JSONPath query",
+        key="json_query",
+        placeholder="$.items[?(@.price > 10)].name",
+        help="Only the matched nodes are parsed, so this works on bodies of hundreds of MB. Supports .name, ['name'], [0], [0:10:2], *, .. and [?(@.field > 1 && @.other)]",
+    )
+    if not query:
+        return
+    cached = st.session_state.get('json_query_result')
+    if cached is None or cached[0] != query:
+        started = time.perf_counter()
+        try:
+            matches = query_json(body.open(), query, limit=QUERY_RESULT_LIMIT + 1)
+            rows = [{"Path": format_path(path), "Value": json_preview(value)} for path, value in matches]
+        except ValueError as e:
+            st.error(f"Query failed: {e}")
+            return
+        cached = (query, rows, time.perf_counter() - started)
+        st.session_state.json_query_result = cached
+    _, rows, elapsed = cached
+    
+    if not rows:
+        st.caption(f"No matches · {elapsed * 1000:,.0f} ms")
+        return
+    more = len(rows) > QUERY_RESULT_LIMIT
+    st.caption(f"{'First ' if more else ''}{min(len(rows), QUERY_RESULT_LIMIT):,} matches · {elapsed * 1000:,.0f} ms")
+    st.dataframe(rows[:QUERY_RESULT_LIMIT], use_container_width=True)
+    
+    # Every match is written out only on request, one per line
+    if st.button("Prepare Matches Download"):
+        lines = io.BytesIO()
+        for path, value in query_json(body.open(), query):
+            lines.write((json.dumps({"path": format_path(path), "value": value}) + "\n").encode('utf-8'))
+        st.download_button("Download Matches", data=lines, file_name="matches.jsonl", mime="application/x-ndjson")
+
+def json_listing(body, path, more=False):
+    """Members of the node at `path`, read a page at a time and kept until the next response"""
+    listings = st.session_state.setdefault('json_listings', {})
+    listing = listings.get(path)
+    if listing is None:
+        listing = listings[path] = json_children(body.open(), path, limit=TREE_PAGE_SIZE)
+    elif more:
+        page = json_children(body.open(), path, offset=len(listing['children']), limit=TREE_PAGE_SIZE)
+        listing['children'].extend(page['children'])
+        listing['has_more'] = page['has_more']
+    return listing
+
+def render_json_node(body, path, depth):
+    """Show the members of one node; objects and arrays are buttons that expand in place"""
+    listing = json_listing(body, path)
+    indent = "\u2003" * depth
+    if listing['kind'] == "value":
+        st.text(f"{indent}{json_preview(listing['value'])}")
+        return
+    opened = st.session_state.json_open
+    for key, kind, value in listing['children']:
+        label = f"[{key}]" if isinstance(key, int) else key
+        if kind == "value":
+            st.text(f"{indent}{label}: {json_preview(value)}")
+            continue
+        child = path + (key,)
+        if st.button(f"{indent}{'▾' if child in opened else '▸'} {label} {'{…}' if kind == 'object' else '[…]'}", key=f"json_node_{format_path(child)}"):
+            if child in opened:
+                opened.remove(child)
+            else:
+                opened.add(child)
+        if child in opened:
+            render_json_node(body, child, depth + 1)
+    if listing['has_more']:
+        if st.button(f"{indent}Show {TREE_PAGE_SIZE} more", key=f"json_more_{format_path(path)}"):
+            json_listing(body, path, more=True)
+            st.rerun()
+
+def render_json_tree(body):
+    """Collapsible tree over a JSON body; a node's members are only read when it is expanded"""
+    if 'json_open' not in st.session_state:
+        st.session_state.json_open = set()
+    with st.container(height=500):
+        try:
+            render_json_node(body, (), 0)
+        except (ValueError, KeyError) as e:
+            st.error(f"Cannot read the body as JSON: {e}")
+
+def render_response(response):
+    """Show status, timing, headers and body of a response"""
+    body = response['body']
+    st.subheader("Response")
+    cache_result = response.get('cache')
+    cache_note = f" · cache {cache_result}" if cache_result and cache_result != "bypass" else ""
+    st.caption(f"{response['http_version']} {response['status']} {response['reason']} · {response['timings']['total']:.0f} ms · {body.size:,} bytes · {response['engine']}{cache_note}")
+    requested = response.get('requested_http_version', 'auto')
+    if requested != 'auto' and response['http_version'] != f"HTTP/{requested.split('-')[0]}" and cache_result not in ("hit", "revalidated"):
+        st.warning(f"{HTTP_VERSION_LABELS[requested]} was asked for, but the server answered with {response['http_version']}")
+    if cache_result == "hit":
+        st.info("Served from the response cache without a network request")
+    elif cache_result == "revalidated":
+        st.info("Cached copy revalidated: the server answered 304 Not Modified")
+    
+    response_col, timing_col = st.columns([3, 1])
+    with timing_col:
+        st.markdown("**Timing**")
+        render_waterfall(response)
+    
+    with response_col:
+        with st.expander("Response Headers"):
+            st.table([{"Header": k, "Value": v} for k, v in response['headers']])
+        
+        content_type = get_header(response['headers'], 'Content-Type') or 'application/octet-stream'
+        json_body = 'json' in content_type.lower() or body.head.lstrip()[:1] in (b'{', b'[')
+        view = "Text"
+        if json_body:
+            render_json_query(body)
+            # Large bodies open as a tree, so nothing is parsed until it is expanded
+            view = st.radio("View", ["Text", "Tree"], index=0 if body.size <= INLINE_BODY_LIMIT else 1, horizontal=True, key="body_view")
+        
+        if view == "Tree":
+            render_json_tree(body)
+        elif body.size <= INLINE_BODY_LIMIT:
+            response_body = response_text(response)
+            
+            # Display formatted response
+            try:
+                response_json = json.loads(response_body)
+                st.json(response_json)
+            except json.JSONDecodeError:
+                st.text_area("Response", response_body, height=300)
+        else:
+            render_body_pages(body)
+        
+        if body.size <= INLINE_BODY_LIMIT:
+            st.download_button("Download Body", data=body.read(), file_name="response", mime=content_type)
+        # Reading the whole body for the download only happens on request
+        elif st.button("Prepare Download"):
+            st.download_button("Download Body", data=body.read(), file_name="response", mime=content_type)
+
+def runner_rows(results):
+    """Shape runner results for the results table"""
+    return [
+        {
+            "Folder": r["folder"],
+            **({"Row": r["row"]} if r["row"] else {}),
+            "Name": r["name"],
+            "Method": r["method"],
+            "URL": r["url"],
+            "Status": r["status"],
+            "Latency (ms)": round(r["latency_ms"], 1) if r["latency_ms"] is not None else None,
+            "Protocol": r["protocol"],
+            "Cache": r["cache"],
+            "Error": r["error"],
+        }
+        for r in results
+    ]
+
+def render_load_report(report):
+    """Show load test throughput, errors and latency percentiles"""
+    latency = report["latency_ms"]
+    cols = st.columns(4)
+    cols[0].metric("Throughput", f"{report['throughput']:.1f} req/s")
+    cols[1].metric("Requests", report["requests"])
+    cols[2].metric("Error rate", f"{report['error_rate'] * 100:.2f}%")
+    cols[3].metric("Elapsed", f"{report['elapsed']:.1f} s")
+    
+    cols = st.columns(4)
+    for col, name in zip(cols, ["p50", "p90", "p99", "p99.9"]):
+        col.metric(name, f"{latency[name]:.1f} ms" if latency[name] is not None else "-")
+    
+    if report["timeline"]:
+        cols = st.columns(2)
+        with cols[0]:
+            st.caption("Requests per second")
+            st.line_chart({"requests": [w["requests"] for w in report["timeline"]], "errors": [w["errors"] for w in report["timeline"]]})
+        with cols[1]:
+            st.caption("Latency per second (ms)")
+            st.line_chart({"p50": [w["p50_ms"] for w in report["timeline"]], "p99": [w["p99_ms"] for w in report["timeline"]]})
+    
+    if report["statuses"] or report["error_messages"]:
+        st.caption("Responses: " + ", ".join(
+            [f"{status} × {count}" for status, count in sorted(report["statuses"].items())]
+            + [f"{message} × {count}" for message, count in report["error_messages"].items()]
+        ))
+    
+    # Distributed tests also report on their workers
+    if "workers" in report:
+        if report["error"]:
+            st.error(report["error"])
+        if report["workers"]:
+            st.caption(f"{len(report['workers'])} of {report['workers_expected']} workers joined")
+            st.dataframe(
+                [{"Worker": w["worker"], "Address": w["address"], "Requests": w["requests"], "State": w["state"]} for w in report["workers"]],
+                use_container_width=True,
+            )
+    
+    # Adaptive tests also report how the concurrency was steered
+    if "steps" in report:
+        knee = report["knee"]
+        cols = st.columns(4)
+        cols[0].metric("Concurrency now", report["concurrency"])
+        cols[1].metric("Knee", f"{knee['concurrency']} workers" if knee else "-", help="Least concurrency reaching the peak healthy throughput; more only adds queueing")
+        cols[2].metric("Knee throughput", f"{knee['throughput']:.1f} req/s" if knee else "-", f"p50 {knee['p50_ms']:.1f} ms" if knee else None, delta_color="off")
+        cols[3].metric("Throttled / retried", f"{report['throttled']} / {report['retried']}")
+        if report["steps"]:
+            st.caption("Concurrency and throughput per control step")
+            st.line_chart({"concurrency": [step["concurrency"] for step in report["steps"]], "req/s": [step["throughput"] for step in report["steps"]]})
+
+def render_load_test(was_running):
+    """Load test report; run as a fragment that redraws itself while the test runs"""
+    load_test = st.session_state.get('load_test')
+    if load_test is None:
+        return
+    report = load_test.snapshot()
+    if isinstance(load_test, DistributedLoadTest) and report["running"] and len(report["workers"]) < report["workers_expected"]:
+        port = load_test.address[1]
+        st.info(
+            f"Waiting for workers to join. Start remote ones with\n\n"
+            f"`{TOKEN_VARIABLE}={load_test.token} python -m pingstream_core worker {socket.gethostname()}:{port}`"
+        )
+    render_load_report(report)
+    if was_running and not load_test.running:
+        # Redraw the whole page so the Start button comes back
+        st.rerun()
+
+def render_profiler():
+    """Show the wall time of recent reruns by phase, engine counters and session state sizes"""
+    profiler = get_profiler()
+    runs = list(profiler.runs)[-PROFILER_RERUNS_SHOWN:]
+    if not runs:
+        st.caption("Nothing recorded yet; interact with the page to profile reruns")
+    else:
+        last = runs[-1]
+        st.caption(f"Last rerun: {last.duration * 1000:.0f} ms · {len(profiler.runs)} recorded")
+        # One row per rerun, newest first, with a column per phase
+        st.dataframe(
+            [{"Wall (ms)": round(run.duration * 1000, 1), **{name: round(ms, 1) for name, ms in run.breakdown().items()}} for run in reversed(runs)],
+            use_container_width=True,
+        )
+        sections = [(name, duration, depth) for name, _, duration, depth in last.spans if depth > 0]
+        if sections:
+            st.caption("Sections of the last rerun")
+            st.dataframe(
+                [{"Section": "  " * (depth - 1) + name, "ms": round(duration * 1000, 2)} for name, duration, depth in sections],
+                use_container_width=True,
+            )
+    
+    counters = dict(profiler.counters)
+    if counters:
+        st.caption("Counters")
+        st.dataframe(
+            [{"Counter": name, "Total": total, "Last rerun": runs[-1].counters.get(name, 0) if runs else 0} for name, total in sorted(counters.items())],
+            use_container_width=True,
+        )
+    
+    if st.checkbox("Measure session state", key="profile_state", help="Walks every object in the session state; slow with large collections"):
+        rows, total = state_sizes(st.session_state)
+        st.caption(f"{total / 1024:,.0f} KB in {len(rows)} keys, shared objects counted once")
+        st.dataframe(
+            [{"Key": row["key"], "Type": row["type"], "KB": round(row["bytes"] / 1024, 1)} for row in rows[:PROFILER_STATE_KEYS_SHOWN]],
+            use_container_width=True,
+        )
+    
+    cols = st.columns(2)
+    with cols[0]:
+        st.download_button("Chrome trace", json.dumps(profiler.chrome_trace()), file_name="pingstream-trace.json", mime="application/json", help="Open in chrome://tracing or ui.perfetto.dev")
+    with cols[1]:
+        st.download_button("JSON", json.dumps(profiler.to_json()), file_name="pingstream-profile.json", mime="application/json")
+    if runs and st.button("Clear Profile"):
+        profiler.clear()
+        st.rerun()
 
 def main():
+    profiler = get_profiler()
+    profiler.phase("setup")
+    setup_page()
     st.title("🚀 Pingstream")
     
     # Initialize session state variables
     if 'collections' not in st.session_state:
         st.session_state.collections = []
+    if 'collections_version' not in st.session_state:
+        st.session_state.collections_version = 0
     if 'expanded_folders' not in st.session_state:
         st.session_state.expanded_folders = set()
     if 'headers' not in st.session_state:
         st.session_state.headers = [{"key": "", "value": ""}]
     if 'params' not in st.session_state:
         st.session_state.params = [{"key": "", "value": ""}]
+    if 'form_fields' not in st.session_state:
+        st.session_state.form_fields = [{"key": "", "value": ""}]
     if 'body' not in st.session_state:
         st.session_state.body = '{}'
-    if 'history' not in st.session_state:
-        st.session_state.history = []
+    if 'history_limit' not in st.session_state:
+        st.session_state.history_limit = HISTORY_PAGE_SIZE
     
     with st.sidebar:
+        profiler.phase("sidebar.import")
         st.subheader("Import API Collection")
         
         # File uploader for API collections
-        uploaded_file = st.file_uploader("Upload OpenAPI or Collection JSON", type=["json", "yaml"])
+        uploaded_file = st.file_uploader("Upload OpenAPI or Collection JSON", type=["json", "yaml", "yml", "jsonl", "gz"])
         
-        if uploaded_file is not None:
+        if uploaded_file is not None and st.button("Process Collection"):
             try:
-                # Parse the uploaded file
-                content = uploaded_file.read()
-                if uploaded_file.type == "application/x-yaml" or uploaded_file.name.endswith('.yaml'):
-                    import yaml
-                    data = yaml.safe_load(content)
-                else:
-                    data = json.loads(content)
+                # Parse the uploaded file, streaming JSON so large specs stay small in memory
+                progress = st.progress(0.0, text="Importing...")
+                def show_progress(done, total):
+                    progress.progress(min(done / total, 1.0) if total else 1.0, text=f"Importing... {done:,} of {total:,} bytes")
                 
-                if st.button("Process Collection"):
-                    with st.spinner('Processing collection...'):
-                        collections = parse_openapi_spec(data)
-                        if collections:
-                            st.success(f"Successfully imported {sum(len(c['requests']) for c in collections)} endpoints in {len(collections)} folders")
-                            # Give collection a name based on the file name
-                            collection_name = uploaded_file.name.split('.')[0]
-                            # Add the new collection to the existing ones
-                            for collection in collections:
-                                collection_existing = False
-                                for existing_collection in st.session_state.collections:
-                                    if existing_collection['name'] == collection['name']:
-                                        # Merge requests
-                                        existing_collection['requests'].extend(collection['requests'])
-                                        collection_existing = True
-                                if not collection_existing:
-                                    st.session_state.collections.append(collection)
+                collections = import_collection(uploaded_file, uploaded_file.name, progress=show_progress)
+                progress.empty()
+                if collections:
+                    st.success(f"Successfully imported {sum(len(c.requests) for c in collections)} endpoints in {len(collections)} folders")
+                    # Add the new collection to the existing ones, merging folders by name
+                    st.session_state.collections_version += 1
+                    existing_collections = {c.name: c for c in st.session_state.collections}
+                    for collection in collections:
+                        existing_collection = existing_collections.get(collection.name)
+                        if existing_collection is not None:
+                            existing_collection.requests.extend(collection.requests)
                         else:
-                            st.error("Failed to parse the collection. Make sure it's a valid OpenAPI or Postman collection.")
+                            st.session_state.collections.append(collection)
+                            existing_collections[collection.name] = collection
+                else:
+                    st.error("Failed to parse the collection. Make sure it's a valid OpenAPI or Postman collection.")
             except Exception as e:
                 st.error(f"Error processing file: {str(e)}")
         
         # Clear collections button
         if st.session_state.collections and st.button("Clear All Collections"):
             st.session_state.collections = []
+            st.session_state.collections_version += 1
         
-        # Display collections and endpoints
+        # Display collections and endpoints, one page at a time
+        profiler.phase("sidebar.collections")
         if st.session_state.collections:
             st.subheader("API Collections")
+            endpoint_search = st.text_input("Search endpoints", key="endpoint_search", placeholder="orders/{id}, GET users, getOrderById")
             
-            for collection_idx, collection in enumerate(st.session_state.collections):
-                # Display folder
-                if st.button(f"📁 {collection['name']}", key=f"folder_{collection_idx}"):
-                    if collection['name'] in st.session_state.expanded_folders:
-                        st.session_state.expanded_folders.remove(collection['name'])
-                    else:
-                        st.session_state.expanded_folders.add(collection['name'])
-                
-                # Display requests if folder is expanded
-                if collection['name'] in st.session_state.expanded_folders:
-                    for req_idx, request in enumerate(collection['requests']):
-                        # Display request with method color
-                        method_colors = {
-                            'GET': 'green',
-                            'POST': 'blue',
-                            'PUT': 'orange',
-                            'DELETE': 'red',
-                            'PATCH': 'purple'
-                        }
-                        method_color = method_colors.get(request['method'], 'gray')
-                        request_label = f"<span style='color:{method_color};font-weight:bold;'>{request['method']}</span> {request['name']}"
-                        
-                        if st.button(request_label, key=f"req_{collection_idx}_{req_idx}", use_container_width=True, help=request['url']):
-                            load_request(request)
+            if endpoint_search:
+                if st.session_state.get('endpoint_search_last') != endpoint_search:
+                    st.session_state.endpoint_search_last = endpoint_search
+                    st.session_state.endpoint_page = 0
+                index = endpoint_index()
+                results = index.search(endpoint_search)
+                st.caption(f"{len(results)} matching endpoints")
+                start, end = page_controls(len(results), "endpoint_page")
+                for entry_id in results[start:end]:
+                    entry = index.entry(entry_id)
+                    request_button(entry['request'], key=f"found_{entry_id}", help=f"{entry['folder']} · {entry['request'].url}")
+            else:
+                start, end = page_controls(len(st.session_state.collections), "folder_page")
+                for collection_idx in range(start, end):
+                    collection = st.session_state.collections[collection_idx]
+                    # Display folder
+                    if st.button(f"📁 {collection.name} ({len(collection.requests)})", key=f"folder_{collection_idx}"):
+                        if collection.name in st.session_state.expanded_folders:
+                            st.session_state.expanded_folders.remove(collection.name)
+                        else:
+                            st.session_state.expanded_folders.add(collection.name)
+                    
+                    # Display requests if folder is expanded
+                    if collection.name in st.session_state.expanded_folders:
+                        req_start, req_end = page_controls(len(collection.requests), f"requests_page_{collection_idx}")
+                        for req_idx in range(req_start, req_end):
+                            request_button(collection.requests[req_idx], key=f"req_{collection_idx}_{req_idx}")
+            
+            # Memory held by the imported collections
+            if st.checkbox("Show memory use", key="show_memory"):
+                report = collections_memory()
+                st.caption(f"{sum(row['bytes'] for row in report) / 1024:,.0f} KB for {sum(row['requests'] for row in report):,} requests")
+                st.dataframe(
+                    [{"Folder": row["folder"], "Requests": row["requests"], "KB": round(row["bytes"] / 1024, 1), "Bytes/request": row["bytes"] // max(1, row["requests"])} for row in report],
+                    use_container_width=True,
+                )
         
-        # Regular request history
+        # Request history, stored on disk and loaded a page at a time
+        profiler.phase("sidebar.history")
         st.subheader("Request History")
-        if st.session_state.history:
-            for i, (timestamp, method, url) in enumerate(st.session_state.history):
-                if st.button(f"{timestamp} - {method} {url[:30]}...", key=f"hist_{i}"):
-                    # Functionality to load past requests could be added here
-                    pass
+        history = get_store()
+        history_search = st.text_input("Search URL", key="history_search")
+        cols = st.columns(2)
+        with cols[0]:
+            history_method = st.selectbox("Method", ["Any", "GET", "POST", "PUT", "DELETE", "PATCH"], key="history_method")
+        with cols[1]:
+            history_status = st.selectbox("Status", ["Any"] + list(STATUS_FILTERS), key="history_status")
+        
+        entries = history.search(
+            url_contains=history_search or None,
+            method=None if history_method == "Any" else history_method,
+            status=None if history_status == "Any" else history_status,
+            limit=st.session_state.history_limit,
+        )
+        for entry in entries:
+            timestamp = datetime.fromtimestamp(entry['created']).strftime("%m-%d %H:%M:%S")
+            status = entry['status'] or "ERR"
+            took = f" · {entry['total_ms']:.0f} ms" if entry['total_ms'] is not None else ""
+            if st.button(f"{timestamp} - {status} {entry['method']} {entry['url'][:30]}...", key=f"hist_{entry['id']}", help=entry['url'] + took):
+                load_request(history.get(entry['id'])['request'])
+        
+        if len(entries) == st.session_state.history_limit and st.button("Load more", key="history_more"):
+            st.session_state.history_limit += HISTORY_PAGE_SIZE
+            st.rerun()
+        if entries and st.button("Clear History"):
+            history.clear()
+            history.clear_bodies()
+            st.rerun()
+        
+        # Response cache
+        profiler.phase("sidebar.cache")
+        st.header("Response Cache")
+        use_cache = st.checkbox("Use response cache", key="use_cache", help="Serve repeated GETs from a local cache, revalidating with ETag/Last-Modified when stale")
+        cache = get_cache() if use_cache else None
+        # Filled in at the end of the run, once this run's requests are counted
+        cache_stats = st.empty()
+        if cache is not None:
+            if st.button("Clear Cache"):
+                cache.clear()
+                st.rerun()
+        
+        # Timings of earlier reruns, for finding where the time goes
+        profiler.phase("sidebar.profiler")
+        st.header("Profiler")
+        if st.checkbox("Profile reruns", key="profile_reruns", help="Time each part of every rerun and count engine work, from the next rerun on"):
+            render_profiler()
     
     # Request Method and URL
-    col1, col2 = st.columns([1, 4])
+    profiler.phase("form.request_line")
+    col1, col2, col3, col4 = st.columns([1, 4, 1, 1])
     with col1:
         method = st.selectbox("Method", ["GET", "POST", "PUT", "DELETE", "PATCH"], key="method")
     with col2:
         url = st.text_input("URL", placeholder="https://api.example.com/v1/resource", key="url")
+    with col3:
+        engine = st.selectbox("Engine", ENGINES, key="engine", help="pooled keeps connections alive between requests; curl runs a subprocess per request")
+    with col4:
+        http_version = st.selectbox(
+            "HTTP version",
+            HTTP_VERSIONS,
+            format_func=HTTP_VERSION_LABELS.get,
+            key="http_version",
+            help="HTTP/2 needs the curl engine. Runs with curl send each host's requests over shared connections, multiplexed on HTTP/2",
+        )
     
     # Tabs for different request components
     tabs = st.tabs(["Headers", "Params", "Body", "Files"])
     
     # Headers Tab
+    profiler.phase("form.headers")
     with tabs[0]:
         st.subheader("Headers")
         for i, header in enumerate(st.session_state.headers):
@@ -335,6 +748,7 @@ def main():
             st.rerun()
     
     # Parameters Tab
+    profiler.phase("form.params")
     with tabs[1]:
         st.subheader("Query Parameters")
         for i, param in enumerate(st.session_state.params):
@@ -355,6 +769,7 @@ def main():
             st.rerun()
     
     # Body Tab
+    profiler.phase("form.body")
     with tabs[2]:
         st.subheader("Request Body")
         body_type = st.radio("Body Type", ["none", "raw JSON"], horizontal=True)
@@ -364,149 +779,382 @@ def main():
             try:
                 # Validate JSON
                 if body_json:
-                    json.loads(body_json)
+                    with profiler.section("validate_json"):
+                        json.loads(body_json)
                 st.session_state.body = body_json
             except json.JSONDecodeError:
                 st.error("Invalid JSON format")
     
     # Files Tab
+    profiler.phase("form.files")
     with tabs[3]:
         st.subheader("Files")
-        uploaded_file = st.file_uploader("Upload File", type=None)
-        if uploaded_file is not None:
-            file_details = {"FileName": uploaded_file.name, "FileType": uploaded_file.type, "Size": uploaded_file.size}
-            st.json(file_details)
+        st.caption("Files and form fields are sent as multipart/form-data, streamed without copying, in place of the raw body.")
+        uploaded_files = st.file_uploader("Upload Files", type=None, accept_multiple_files=True)
+        file_parts = []
+        for i, uploaded_file in enumerate(uploaded_files or []):
+            cols = st.columns([2, 2, 2])
+            with cols[0]:
+                st.text(f"{uploaded_file.name}\n{uploaded_file.size:,} bytes")
+            with cols[1]:
+                field = st.text_input("Field", "file", key=f"file_field_{i}")
+            with cols[2]:
+                content_type = st.text_input("Content Type", file_content_type(uploaded_file.name, uploaded_file.type), key=f"file_type_{i}")
+            file_parts.append((field or "file", uploaded_file.name, uploaded_file, content_type or None))
+        
+        st.markdown("**Form Fields**")
+        for i, form_field in enumerate(st.session_state.form_fields):
+            cols = st.columns([3, 3, 1])
+            with cols[0]:
+                key = st.text_input("Key", form_field["key"], key=f"form_key_{i}")
+            with cols[1]:
+                value = st.text_input("Value", form_field["value"], key=f"form_value_{i}")
+            with cols[2]:
+                if st.button("❌", key=f"del_form_{i}"):
+                    st.session_state.form_fields.pop(i)
+                    st.rerun()
+            
+            st.session_state.form_fields[i] = {"key": key, "value": value}
+        
+        if st.button("+ Add Form Field"):
+            st.session_state.form_fields.append({"key": "", "value": ""})
+            st.rerun()
     
     # Execute Request
+    profiler.phase("send")
     if st.button("🚀 Send Request", type="primary"):
         if not url:
             st.error("URL is required")
-            return
-        
-        # Construct curl command
-        curl_cmd = ["curl", "-s"]
-        
-        # Add method
-        if method != "GET":
-            curl_cmd.extend(["-X", method])
-        
-        # Add headers
-        for header in st.session_state.headers:
-            if header["key"] and header["value"]:
-                curl_cmd.extend(["-H", f"{header['key']}: {header['value']}"])
+        else:
+            # Build the request from the form
+            prepared = prepare_request(
+                method,
+                url,
+                headers=st.session_state.headers,
+                params=st.session_state.params,
+                body=st.session_state.body if body_type == "raw JSON" else None,
+                files=file_parts,
+                form=st.session_state.form_fields,
+                http_version=http_version,
+            )
         
-        # Add JSON body
-        if method in ["POST", "PUT", "PATCH"] and body_type == "raw JSON" and st.session_state.body.strip():
-            curl_cmd.extend(["-H", "Content-Type: application/json"])
-            curl_cmd.extend(["-d", st.session_state.body])
+            st.session_state.last_curl = " ".join(curl_command(prepared))
+            set_last_response(None)
         
-        # Add file if uploaded
-        if uploaded_file is not None:
-            # Save uploaded file to temp location
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{uploaded_file.name}") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                file_path = tmp_file.name
+            with st.spinner('Executing request...'):
+                # Show the body as it arrives, for chunked and event streams
+                upload_bar = st.empty()
+                upload = {"started": time.monotonic(), "shown": 0.0}
+                def show_upload(sent, total):
+                    now = time.monotonic()
+                    if now - upload["shown"] < 0.2 and sent != total:
+                        return
+                    upload["shown"] = now
+                    rate = sent / max(now - upload["started"], 1e-6) / 1e6
+                    if total:
+                        upload_bar.progress(min(1.0, sent / total), text=f"Uploaded {sent / 1e6:,.1f} of {total / 1e6:,.1f} MB · {rate:,.1f} MB/s")
+                    else:
+                        upload_bar.progress(0.0, text=f"Uploaded {sent / 1e6:,.1f} MB · {rate:,.1f} MB/s")
             
-            curl_cmd.extend(["-F", f"file=@{file_path}"])
-        
-        # Build URL with query parameters
-        full_url = url
-        if hasattr(st.session_state, 'params'):
-            params = []
-            for param in st.session_state.params:
-                if param["key"] and param["value"]:
-                    params.append(f"{param['key']}={param['value']}")
+                live = st.empty()
+                stream = {"tail": b"", "shown": 0.0}
+                def show_chunk(chunk):
+                    stream["tail"] = (stream["tail"] + chunk)[-LIVE_TAIL_SIZE:]
+                    if time.monotonic() - stream["shown"] > 0.2:
+                        live.code(stream["tail"].decode('utf-8', errors='replace'), language=None)
+                        stream["shown"] = time.monotonic()
             
-            if params:
-                if "?" in url:
-                    full_url += "&" + "&".join(params)
+                form_request = {
+                    "method": method,
+                    "url": url,
+                    "headers": st.session_state.headers,
+                    "params": st.session_state.params,
+                    "body": st.session_state.body,
+                }
+                try:
+                    send = cache.send if cache is not None else send_request
+                    response = send(prepared, engine=engine, on_chunk=show_chunk, on_upload=show_upload)
+                except RequestError as e:
+                    get_store().record(form_request, error=str(e))
+                    st.error(f"Error: {str(e)}")
+                except Exception as e:
+                    get_store().record(form_request, error=str(e))
+                    st.error(f"Error executing request: {str(e)}")
                 else:
-                    full_url += "?" + "&".join(params)
-        
-        curl_cmd.append(full_url)
+                    # Add to history
+                    get_store().record(form_request, response)
+                    response['requested_http_version'] = http_version
+                    set_last_response(response)
+                upload_bar.empty()
+                live.empty()
+    
+    # Display the equivalent curl command and the last response
+    profiler.phase("response")
+    if st.session_state.get('last_curl'):
+        st.code(st.session_state.last_curl, language="bash")
+    if st.session_state.get('last_response'):
+        render_response(st.session_state.last_response)
+
+    # Load Test
+    profiler.phase("load_test")
+    with st.expander("📈 Load Test"):
+        st.caption("Sends the request built above repeatedly. File uploads are not included.")
+        cols = st.columns(3)
+        with cols[0]:
+            load_mode = st.radio("Mode", ["Fixed concurrency", "Target RPS", "Adaptive"], key="load_mode", help="Adaptive ramps the concurrency up while latency and errors stay healthy, backs off when they do not, and reports the knee")
+        with cols[1]:
+            load_concurrency = st.number_input("Concurrency", min_value=1, max_value=1024, value=10, key="load_concurrency", help="Workers sending back to back, the most requests in flight when targeting an RPS, or the most the adaptive mode may use")
+            load_rate = st.number_input("Target RPS", min_value=1, max_value=100000, value=50, key="load_rate", disabled=load_mode != "Target RPS")
+        with cols[2]:
+            load_stop = st.radio("Stop after", ["Duration", "Request count"], key="load_stop", horizontal=True)
+            if load_stop == "Duration":
+                load_limit = st.number_input("Seconds", min_value=1, max_value=86400, value=10, key="load_seconds")
+            else:
+                load_limit = st.number_input("Requests", min_value=1, max_value=10000000, value=1000, key="load_requests")
+        if load_mode == "Adaptive":
+            cols = st.columns(3)
+            with cols[0]:
+                load_tolerance = st.number_input("Latency tolerance (×)", min_value=1.05, max_value=10.0, value=1.5, step=0.1, key="load_tolerance", help="Back off when the median latency grows past this multiple of the lowest seen")
+            with cols[1]:
+                load_max_errors = st.number_input("Max error rate (%)", min_value=0.0, max_value=100.0, value=5.0, step=1.0, key="load_max_errors")
+            with cols[2]:
+                load_retries = st.number_input("Retries", min_value=0, max_value=10, value=2, key="load_retries", help="For 429, 503 and connection errors; Retry-After is honoured, otherwise backoff is jittered")
+        else:
+            cols = st.columns(3)
+            with cols[0]:
+                load_processes = st.number_input("Worker processes", min_value=0, max_value=256, value=0, key="load_processes", help=f"0 sends from the app itself. More spread the load over that many processes, each with its own GIL; this machine has {os.cpu_count() or 1} cores")
+            with cols[1]:
+                load_remote = st.number_input("Remote workers", min_value=0, max_value=256, value=0, key="load_remote_workers", help="Workers on other hosts to wait for; the report shows the command to start them with")
         
-        # Add to history
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.session_state.history.append((timestamp, method, url))
+        load_test = st.session_state.get('load_test')
+        if load_test is not None and load_test.running:
+            if st.button("⏹ Stop Load Test"):
+                load_test.stop()
+        elif st.button("Start Load Test"):
+            if not url:
+                st.error("URL is required")
+            else:
+                prepared = prepare_request(
+                    method,
+                    url,
+                    headers=st.session_state.headers,
+                    params=st.session_state.params,
+                    body=st.session_state.body if body_type == "raw JSON" else None,
+                    http_version=http_version,
+                )
+                duration = int(load_limit) if load_stop == "Duration" else None
+                total_requests = int(load_limit) if load_stop == "Request count" else None
+                if load_mode == "Adaptive":
+                    load_test = AdaptiveLoadTest(
+                        prepared,
+                        engine=engine,
+                        max_concurrency=int(load_concurrency),
+                        latency_tolerance=float(load_tolerance),
+                        max_error_rate=float(load_max_errors) / 100,
+                        retries=int(load_retries),
+                        duration=duration,
+                        total_requests=total_requests,
+                    )
+                elif load_processes or load_remote:
+                    try:
+                        load_test = DistributedLoadTest(
+                            prepared,
+                            engine=engine,
+                            concurrency=int(load_concurrency),
+                            rate=int(load_rate) if load_mode == "Target RPS" else None,
+                            duration=duration,
+                            total_requests=total_requests,
+                            processes=int(load_processes),
+                            remote_workers=int(load_remote),
+                            # Remote workers need to reach us on every interface
+                            listen=("0.0.0.0", 0) if load_remote else ("127.0.0.1", 0),
+                        )
+                    except (OSError, ValueError) as e:
+                        load_test = None
+                        st.error(f"Cannot start the workers: {e}")
+                else:
+                    load_test = LoadTest(
+                        prepared,
+                        engine=engine,
+                        concurrency=int(load_concurrency),
+                        rate=int(load_rate) if load_mode == "Target RPS" else None,
+                        duration=duration,
+                        total_requests=total_requests,
+                    )
+                if load_test is not None:
+                    st.session_state.load_test = load_test.start()
+                    st.rerun()
         
-        # Display the curl command
-        st.code(" ".join(curl_cmd), language="bash")
+        if load_test is not None:
+            # Only the report is redrawn while the test runs; the rest of the page stays usable
+            running = load_test.running
+            st.fragment(render_load_test, run_every=LOAD_REPORT_INTERVAL if running else None)(running)
+
+    # Data-driven iterations
+    profiler.phase("iterations")
+    with st.expander("🔁 Iterate over a Dataset"):
+        st.caption("Sends the request built above, or every request of a folder, once per row of a CSV or JSON Lines file. `{{column}}` in the URL, headers, params and JSON body is replaced by the row's value. Rows are read one at a time and every result is written to a file as it finishes.")
+        dataset_file = st.file_uploader("Dataset", type=DATASET_TYPES, key="dataset_file")
+        folder_names = [collection.name for collection in st.session_state.collections]
+        iterate_target = st.selectbox("Send", ["Request above"] + (["All Collections"] + folder_names if folder_names else []), key="iterate_target")
+        iterate_base_url = st.text_input("Base URL", placeholder="https://api.example.com", key="iterate_base_url", help="Prefixed to request URLs that are relative paths", disabled=iterate_target == "Request above")
+        cols = st.columns(2)
+        with cols[0]:
+            iterate_concurrency = st.number_input("Concurrency", min_value=1, max_value=256, value=8, key="iterate_concurrency")
+        with cols[1]:
+            iterate_per_host = st.number_input("Connections per host", min_value=1, max_value=256, value=8, key="iterate_per_host")
         
-        with st.spinner('Executing request...'):
-            try:
-                # Execute curl command
-                process = subprocess.Popen(curl_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                stdout, stderr = process.communicate()
-                
-                # Remove temp file if created
-                if 'file_path' in locals():
-                    os.unlink(file_path)
-                
-                if stderr:
-                    st.error(f"Error: {stderr.decode('utf-8')}")
+        if st.button("🔁 Run Iterations", disabled=dataset_file is None):
+            if iterate_target == "Request above" and not url:
+                st.error("URL is required")
+            else:
+                if iterate_target == "Request above":
+                    body = st.session_state.body if body_type == "raw JSON" else None
+                    jobs = [("Request", RequestTemplate(method, url, st.session_state.headers, st.session_state.params, body, name=url))]
                 else:
-                    response_text = stdout.decode('utf-8')
-                    st.subheader("Response")
-                    
-                    # Display formatted response
-                    try:
-                        response_json = json.loads(response_text)
-                        st.json(response_json)
-                    except json.JSONDecodeError:
-                        st.text_area("Response", response_text, height=300)
+                    jobs = collection_jobs(st.session_state.collections, None if iterate_target == "All Collections" else iterate_target)
             
-            except Exception as e:
-                st.error(f"Error executing request: {str(e)}")
+                previous = st.session_state.get('iteration_run')
+                if previous:
+                    os.unlink(previous["path"])
+                results_file = tempfile.NamedTemporaryFile("w", encoding="utf-8", prefix="pingstream-iterations-", suffix=".jsonl", delete=False)
+                status = st.empty()
+                table = st.empty()
+                tail = deque(maxlen=ITERATION_TAIL_SIZE)
+                tally = Tally()
+                started = time.monotonic()
+                last_render = 0
+                error = None
+                try:
+                    for result in run_requests(
+                        iteration_jobs(jobs, dataset_rows(dataset_file, dataset_file.name)),
+                        base_url="" if iterate_target == "Request above" else iterate_base_url,
+                        engine=engine,
+                        concurrency=int(iterate_concurrency),
+                        per_host=int(iterate_per_host),
+                        cache=cache,
+                        http_version=http_version,
+                    ):
+                        write_jsonl_result(result, results_file)
+                        tally.add(result)
+                        tail.append(result)
+                        if time.monotonic() - last_render > 0.25:
+                            rate = tally.total / max(time.monotonic() - started, 1e-6)
+                            status.caption(f"{tally.total:,} requests · {tally.failed:,} failed · {rate:,.0f} req/s")
+                            table.dataframe(runner_rows(tail), use_container_width=True)
+                            last_render = time.monotonic()
+                except ValueError as e:
+                    error = str(e)
+                finally:
+                    results_file.close()
+                status.empty()
+                table.empty()
+                st.session_state.iteration_run = {
+                    "path": results_file.name,
+                    "summary": tally.summary(time.monotonic() - started),
+                    "tail": list(tail),
+                    "error": error,
+                }
+        
+        if st.session_state.get('iteration_run'):
+            run = st.session_state.iteration_run
+            summary = run["summary"]
+            if run["error"]:
+                st.error(f"Dataset error: {run['error']}")
+            st.caption(f"{summary['passed']:,} succeeded · {summary['failed']:,} failed · {summary['elapsed_s']:.1f} s · last {len(run['tail'])} shown")
+            st.dataframe(runner_rows(run["tail"]), use_container_width=True)
+            with open(run["path"], "rb") as results:
+                st.download_button("Download Results (JSON Lines)", data=results, file_name="iterations.jsonl", mime="application/x-ndjson")
 
-    # Export Collection Button (at the bottom)
+    # Collection Runner
+    profiler.phase("runner")
     if st.session_state.collections:
-        if st.button("Export All Collections"):
-            export_data = {
-                "info": {
-                    "name": "Exported API Collection",
-                    "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
-                },
-                "item": []
-            }
+        with st.expander("▶️ Run Folder / Collection"):
+            folder_names = [collection.name for collection in st.session_state.collections]
+            run_target = st.selectbox("Folder", ["All Collections"] + folder_names, key="run_target")
+            run_base_url = st.text_input("Base URL", placeholder="https://api.example.com", key="run_base_url", help="Prefixed to request URLs that are relative paths")
+            cols = st.columns(3)
+            with cols[0]:
+                run_concurrency = st.number_input("Concurrency", min_value=1, max_value=256, value=8, key="run_concurrency")
+            with cols[1]:
+                run_per_host = st.number_input("Connections per host", min_value=1, max_value=256, value=4, key="run_per_host")
+            with cols[2]:
+                run_timeout = st.number_input("Global timeout (s)", min_value=0, max_value=86400, value=300, key="run_timeout", help="0 means no limit")
             
-            for collection in st.session_state.collections:
-                folder = {
-                    "name": collection["name"],
-                    "item": []
-                }
+            if st.button("▶️ Run"):
+                jobs = collection_jobs(st.session_state.collections, None if run_target == "All Collections" else run_target)
+                progress = st.progress(0.0)
+                table = st.empty()
+                results = []
+                started = time.monotonic()
+                last_render = 0
                 
-                for request in collection["requests"]:
-                    req_item = {
-                        "name": request["name"],
-                        "request": {
-                            "method": request["method"],
-                            "url": request["url"],
-                            "header": [{"key": h["key"], "value": h["value"]} for h in request["headers"] if h["key"]],
-                            "body": {
-                                "mode": "raw",
-                                "raw": request["body"],
-                                "options": {
-                                    "raw": {
-                                        "language": "json"
-                                    }
-                                }
-                            }
-                        }
-                    }
-                    folder["item"].append(req_item)
+                # Stream results into the table as requests finish
+                run = run_requests(
+                    jobs,
+                    base_url=run_base_url,
+                    engine=engine,
+                    concurrency=int(run_concurrency),
+                    per_host=int(run_per_host),
+                    total_timeout=run_timeout or None,
+                    cache=cache,
+                    http_version=http_version,
+                )
+                for result in run:
+                    results.append(result)
+                    if time.monotonic() - last_render > 0.25 or len(results) == len(jobs):
+                        progress.progress(len(results) / len(jobs), text=f"{len(results)}/{len(jobs)} requests")
+                        table.dataframe(runner_rows(results), use_container_width=True)
+                        last_render = time.monotonic()
                 
-                export_data["item"].append(folder)
+                table.empty()
+                st.session_state.runner_results = {
+                    "results": sorted(results, key=lambda r: r["index"]),
+                    "elapsed": time.monotonic() - started,
+                    "not_started": run.not_started,
+                }
             
-            # Convert to JSON
-            export_json = json.dumps(export_data, indent=2)
+            if st.session_state.get('runner_results'):
+                run = st.session_state.runner_results
+                succeeded = sum(1 for r in run["results"] if r["status"] is not None and r["status"] < 400)
+                not_started = f" · {run['not_started']} not started (timeout)" if run["not_started"] else ""
+                st.caption(f"{succeeded} succeeded · {len(run['results']) - succeeded} failed · {run['elapsed']:.1f} s{not_started}")
+                st.dataframe(runner_rows(run["results"]), use_container_width=True)
+
+    # Export Collection Button (at the bottom)
+    profiler.phase("export")
+    if st.session_state.collections:
+        cols = st.columns([2, 1])
+        with cols[0]:
+            export_format = st.selectbox("Export format", list(EXPORT_FORMATS), format_func=EXPORT_FORMAT_LABELS.get, key="export_format")
+        with cols[1]:
+            export_gzip = st.checkbox("gzip", key="export_gzip", help="Compress the export; it imports back as it is")
+        if st.button("Export All Collections"):
+            # Written to a file a request at a time, not built up in memory
+            path, written = export_file(export_format, export_gzip)
+            total = sum(len(c.requests) for c in st.session_state.collections)
+            if written < total:
+                st.warning(f"{total - written:,} requests share a path and method with another, or use a method other than GET, POST, PUT, DELETE and PATCH, and are left out of the OpenAPI export")
             
             # Display download link
-            st.download_button(
-                label="Download Collection",
-                data=export_json,
-                file_name="api_collection.json",
-                mime="application/json"
-            )
+            file_name = EXPORT_FORMATS[export_format]
+            with open(path, "rb") as f:
+                st.download_button(
+                    label="Download Collection",
+                    data=f,
+                    file_name=file_name + ".gz" if export_gzip else file_name,
+                    mime="application/gzip" if export_gzip else "application/json"
+                )
+    
+    profiler.phase("cache_stats")
+    if cache is not None:
+        stats = cache.stats()
+        cache_stats.caption(
+            f"{stats['hit']} hits · {stats['revalidated']} revalidated · {stats['miss']} misses · "
+            f"{stats['memory_entries']} in memory ({stats['memory_bytes']:,} bytes) · {stats['disk_entries']} on disk ({stats['disk_bytes']:,} bytes)"
+        )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # The checkbox's value is in the session state before the sidebar draws it
+    with get_profiler().run(enabled=st.session_state.get('profile_reruns', False)):
+        main()
\ No newline at end of file
@@ -0,0 +1 @@
+"""Pingstream core: request building, sending and collection handling without Streamlit"""
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+
+from .engine import DEFAULT_TIMEOUT, TIMING_PHASES, ResponseBody, get_header, send_request
+from .history import PINGSTREAM_HOME
+
+# Budgets for the in-memory tier and the disk tier under PINGSTREAM_HOME/cache
+CACHE_MAX_ENTRIES = 512
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024
+# Larger responses are passed through without being stored
+CACHE_MAX_ENTRY_BYTES = 16 * 1024 * 1024
+
+# Statuses that can be stored (RFC 9111 section 4.2.2)
+CACHEABLE_STATUSES = {200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501}
+# Without explicit freshness, a response with Last-Modified stays fresh for
+# this fraction of its age, up to a day
+HEURISTIC_FRACTION = 0.1
+MAX_HEURISTIC_LIFETIME = 24 * 3600
+
+# Request headers that make a request unsuitable for the cache
+BYPASS_HEADERS = ["If-None-Match", "If-Modified-Since", "If-Match", "If-Unmodified-Since", "If-Range", "Range"]
+
+# Request headers carrying credentials: their values are part of the key, so
+# one user's responses are never served to another
+CREDENTIAL_HEADERS = ["Authorization", "Cookie"]
+
+# How a response was served, as found in response["cache"]
+CACHE_RESULTS = ["hit", "revalidated", "miss", "bypass"]
+
+
+def cache_key(method, url):
+    """Normalized request key: method plus URL with a lowercase scheme and host and no default port"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    default_port = {"http": ":80", "https": ":443"}.get(scheme)
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+    return f"{method.upper()} {urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))}"
+
+
+def _digest(key, headers):
+    """File name for an entry: a hash of its key and of any credentials the request carries"""
+    credentials = "\n".join(
+        f"{name}: {get_header(headers, name)}" for name in CREDENTIAL_HEADERS if get_header(headers, name) is not None
+    )
+    return hashlib.sha256((key + "\n" + credentials if credentials else key).encode()).hexdigest()
+
+
+def parse_cache_control(value):
+    """Cache-Control directives as a dict; directives without an argument map to True"""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers, now):
+    """Seconds a response stays fresh, from max-age, Expires or Last-Modified"""
+    max_age = _seconds(parse_cache_control(get_header(headers, "Cache-Control")).get("max-age"))
+    if max_age is not None:
+        return max_age
+    date = _http_date(get_header(headers, "Date")) or now
+    expires = get_header(headers, "Expires")
+    if expires is not None:
+        # An invalid Expires means already expired
+        expires_at = _http_date(expires)
+        return max(0, expires_at - date) if expires_at else 0
+    last_modified = _http_date(get_header(headers, "Last-Modified"))
+    if last_modified is not None:
+        return min(MAX_HEURISTIC_LIFETIME, max(0, (date - last_modified) * HEURISTIC_FRACTION))
+    return 0
+
+
+def _vary_names(headers):
+    """Lowercase names from the Vary header, or None for Vary: *"""
+    names = [name.strip().lower() for name in (get_header(headers, "Vary") or "").split(",") if name.strip()]
+    return None if "*" in names else names
+
+
+def _entry_size(entry):
+    return len(entry["body"]) + sum(len(key) + len(value) for key, value in entry["headers"])
+
+
+class ResponseCache:
+    """Private HTTP cache for GET responses, with a memory tier and a disk tier
+
+    Entries are keyed by cache_key(), the request's credentials
+    (CREDENTIAL_HEADERS, hashed) and the values of the request headers
+    named in the response's Vary header; one variant is kept per URL and
+    credential. Responses marked no-store are not stored; private ones
+    are, since this cache serves one user (RFC 9111, section 5.2.2.7).
+    Fresh entries are served without touching the network; stale ones
+    with an ETag or Last-Modified are revalidated with If-None-Match /
+    If-Modified-Since, and a 304 refreshes them. Both tiers are LRUs:
+    memory is bounded by entry count and bytes, disk by bytes. Every
+    stored entry is written through to disk, so the cache outlives the
+    process.
+    """
+
+    def __init__(self, home=None, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.directory = os.path.join(home or PINGSTREAM_HOME, "cache")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        # Least recently used first in both tiers
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self.counters = dict.fromkeys(CACHE_RESULTS, 0)
+
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".entry"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-len(".entry")], stat.st_size))
+        for _, digest, size in sorted(files):
+            self._disk[digest] = size
+            self._disk_bytes += size
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + ".entry")
+
+    def _remember(self, digest, entry):
+        """Put an entry in the memory tier, evicting least recently used entries"""
+        old = self._memory.pop(digest, None)
+        if old is not None:
+            self._memory_bytes -= old["size"]
+        if entry["size"] > self.max_bytes:
+            return
+        self._memory[digest] = entry
+        self._memory_bytes += entry["size"]
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted["size"]
+
+    def _write_disk(self, digest, entry):
+        """Write an entry as one line of JSON metadata followed by the body"""
+        meta = {key: value for key, value in entry.items() if key != "body"}
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as tmp_file:
+            tmp_file.write(json.dumps(meta).encode() + b"\n")
+            tmp_file.write(entry["body"])
+        os.replace(tmp_file.name, self._path(digest))
+        size = os.path.getsize(self._path(digest))
+
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(digest, 0)
+            self._disk[digest] = size
+            while self._disk_bytes > self.disk_max_bytes and self._disk:
+                evicted, evicted_size = self._disk.popitem(last=False)
+                self._disk_bytes -= evicted_size
+                try:
+                    os.unlink(self._path(evicted))
+                except OSError:
+                    pass
+
+    def _read_disk(self, digest):
+        try:
+            with open(self._path(digest), "rb") as entry_file:
+                entry = json.loads(entry_file.readline())
+                entry["body"] = entry_file.read()
+        except (OSError, ValueError):
+            return None
+        entry["headers"] = [tuple(header) for header in entry["headers"]]
+        return entry
+
+    def _lookup(self, digest):
+        """Find an entry in memory, then on disk, marking it most recently used"""
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                self._memory.move_to_end(digest)
+                return entry
+            on_disk = digest in self._disk
+            if on_disk:
+                self._disk.move_to_end(digest)
+        if not on_disk:
+            return None
+
+        entry = self._read_disk(digest)
+        if entry is not None:
+            with self._lock:
+                self._remember(digest, entry)
+        return entry
+
+    def _store(self, digest, entry):
+        with self._lock:
+            self._remember(digest, entry)
+        self._write_disk(digest, entry)
+
+    def _count(self, result):
+        with self._lock:
+            self.counters[result] += 1
+
+    def send(self, prepared, engine="pooled", timeout=DEFAULT_TIMEOUT, pool=None, on_chunk=None, keep_body=True, on_upload=None):
+        """Like send_request(), but served from or stored in the cache when possible
+
+        The response gets a "cache" key saying how it was served (see
+        CACHE_RESULTS).
+        """
+        request_cc = parse_cache_control(get_header(prepared["headers"], "Cache-Control"))
+        if (
+            prepared["method"] != "GET"
+            or prepared["body"] is not None
+            or prepared["files"]
+            or prepared.get("form")
+            or "no-store" in request_cc
+            or any(get_header(prepared["headers"], name) is not None for name in BYPASS_HEADERS)
+        ):
+            response = send_request(prepared, engine=engine, timeout=timeout, pool=pool, on_chunk=on_chunk, keep_body=keep_body, on_upload=on_upload)
+            response["cache"] = "bypass"
+            self._count("bypass")
+            return response
+
+        start = time.perf_counter()
+        key = cache_key(prepared["method"], prepared["url"])
+        digest = _digest(key, prepared["headers"])
+        entry = self._lookup(digest)
+        if entry is not None and any(get_header(prepared["headers"], name) != value for name, value in entry["vary"].items()):
+            entry = None
+
+        now = time.time()
+        force_revalidate = "no-cache" in request_cc or (get_header(prepared["headers"], "Pragma") or "").lower() == "no-cache"
+        if entry is not None and not entry["no_cache"] and not force_revalidate and now - entry["stored"] < entry["lifetime"]:
+            timings = dict.fromkeys(TIMING_PHASES, 0.0)
+            timings.update({"ttfb": 0.0, "total": (time.perf_counter() - start) * 1000})
+            self._count("hit")
+            return self._entry_response(entry, engine, timings, on_chunk, "hit")
+
+        conditional = dict(prepared)
+        if entry is not None:
+            conditional["headers"] = list(prepared["headers"])
+            if entry["etag"]:
+                conditional["headers"].append(("If-None-Match", entry["etag"]))
+            if entry["last_modified"]:
+                conditional["headers"].append(("If-Modified-Since", entry["last_modified"]))
+        # The body is needed to store the response, whatever the caller wants
+        response = send_request(conditional, engine=engine, timeout=timeout, pool=pool, on_chunk=on_chunk, keep_body=True)
+        received = time.time()
+
+        if entry is not None and response["status"] == 304:
+            response["body"].close()
+            # The 304 carries updated metadata for the stored response
+            refreshed = {key.lower() for key, _ in response["headers"]} - {"content-length", "transfer-encoding"}
+            headers = [(key, value) for key, value in entry["headers"] if key.lower() not in refreshed]
+            headers.extend((key, value) for key, value in response["headers"] if key.lower() in refreshed)
+            entry = dict(entry, headers=headers)
+            entry["size"] = _entry_size(entry)
+            self._fill_freshness(entry, received)
+            self._store(digest, entry)
+            self._count("revalidated")
+            revalidated = self._entry_response(entry, engine, response["timings"], on_chunk, "revalidated")
+            revalidated.update({key: response[key] for key in ("bytes_up", "bytes_down", "reused")})
+            return revalidated
+
+        self._count("miss")
+        response["cache"] = "miss"
+        new_entry = self._make_entry(key, prepared, response, received)
+        if new_entry is not None:
+            self._store(digest, new_entry)
+        return response
+
+    def _fill_freshness(self, entry, received):
+        headers = entry["headers"]
+        response_cc = parse_cache_control(get_header(headers, "Cache-Control"))
+        entry["stored"] = received - (_seconds(get_header(headers, "Age")) or 0)
+        entry["lifetime"] = freshness_lifetime(headers, received)
+        entry["no_cache"] = "no-cache" in response_cc
+        entry["etag"] = get_header(headers, "ETag")
+        entry["last_modified"] = get_header(headers, "Last-Modified")
+
+    def _make_entry(self, key, prepared, response, received):
+        """Build a cache entry for a response, or return None if it must not be stored"""
+        headers = response["headers"]
+        response_cc = parse_cache_control(get_header(headers, "Cache-Control"))
+        vary = _vary_names(headers)
+        if (
+            response["status"] not in CACHEABLE_STATUSES
+            or "no-store" in response_cc
+            or vary is None
+            or response["body"].size > CACHE_MAX_ENTRY_BYTES
+        ):
+            return None
+
+        entry = {
+            "key": key,
+            "status": response["status"],
+            "reason": response["reason"],
+            "http_version": response["http_version"],
+            "headers": headers,
+            "vary": {name: get_header(prepared["headers"], name) for name in vary},
+        }
+        self._fill_freshness(entry, received)
+        if entry["lifetime"] == 0 and not entry["etag"] and not entry["last_modified"]:
+            # Could never be served without fetching it again anyway
+            return None
+        entry["body"] = response["body"].read()
+        entry["size"] = _entry_size(entry)
+        return entry
+
+    def _entry_response(self, entry, engine, timings, on_chunk, result):
+        body = ResponseBody()
+        body.write(entry["body"])
+        if on_chunk is not None and entry["body"]:
+            on_chunk(entry["body"])
+        return {
+            "status": entry["status"],
+            "reason": entry["reason"],
+            "http_version": entry["http_version"],
+            "headers": list(entry["headers"]),
+            "body": body,
+            "timings": timings,
+            "bytes_up": 0,
+            "bytes_down": 0,
+            "reused": False,
+            "engine": engine,
+            "cache": result,
+        }
+
+    def stats(self):
+        """Counters per CACHE_RESULTS value plus the size of both tiers"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            })
+        return stats
+
+    def clear(self):
+        """Drop every entry from both tiers and reset the counters"""
+        with self._lock:
+            digests = list(self._disk)
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk.clear()
+            self._disk_bytes = 0
+            self.counters = dict.fromkeys(CACHE_RESULTS, 0)
+        for digest in digests:
+            try:
+                os.unlink(self._path(digest))
+            except OSError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the shared response cache, opening it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
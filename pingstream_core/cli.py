@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from .engine import DEFAULT_TIMEOUT, ENGINES, HTTP_VERSIONS, prepare_request
+from .importer import import_collection
+from .reports import REPORT_FORMATS, Tally, result_passed, write_jsonl_result, write_report
+from .runner import collection_jobs, resolve_url, run_requests
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pingstream", description="Run API collections without the Streamlit UI")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="Send every request of a collection and report the results")
+    run.add_argument("collection", help="OpenAPI spec or Postman collection (JSON or YAML)")
+    run.add_argument("--folder", help="Only run the requests of this folder")
+    run.add_argument("--base-url", default="", help="Prefix for relative URLs, such as OpenAPI paths")
+    run.add_argument("--engine", choices=ENGINES, default="pooled")
+    run.add_argument("--http", choices=HTTP_VERSIONS, default="auto", help="HTTP version; 2 and 2-prior-knowledge (h2c) need --engine curl")
+    run.add_argument("--concurrency", type=_positive_int, default=8, help="Requests in flight at once (default: 8)")
+    run.add_argument("--per-host", type=_positive_int, default=4, help="Requests in flight to any one host (default: 4)")
+    run.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout per request in seconds")
+    run.add_argument("--total-timeout", type=float, help="Stop the whole run after this many seconds")
+    run.add_argument("--cache", action="store_true", help="Serve GETs from the response cache under PINGSTREAM_HOME/cache")
+    run.add_argument("--data", help="CSV or JSON Lines dataset; every request is sent once per row, with {{column}} filled in")
+    run.add_argument("--report", choices=REPORT_FORMATS, default="json", help="jsonl writes each result as it finishes")
+    run.add_argument("-o", "--output", help="Write the report to this file instead of stdout")
+    run.add_argument("-q", "--quiet", action="store_true", help="Do not print a line per request")
+
+    load = commands.add_parser("load", help="Load test a URL or a collection from several worker processes")
+    load.add_argument("target", help="URL to send, or an OpenAPI spec or Postman collection whose requests are sent in turn")
+    load.add_argument("-X", "--method", default="GET", help="Method for a URL (default: GET)")
+    load.add_argument("-H", "--header", action="append", default=[], help="'Name: value' header for a URL; repeatable")
+    load.add_argument("-d", "--body", help="JSON body for a URL")
+    load.add_argument("--folder", help="Only send the requests of this folder")
+    load.add_argument("--base-url", default="", help="Prefix for relative URLs, such as OpenAPI paths")
+    load.add_argument("--engine", choices=ENGINES, default="pooled")
+    load.add_argument("--http", choices=HTTP_VERSIONS, default="auto", help="HTTP version; 2 and 2-prior-knowledge (h2c) need --engine curl")
+    load.add_argument("--concurrency", type=_positive_int, default=10, help="Requests in flight at once across all workers (default: 10)")
+    load.add_argument("--rate", type=float, help="Target requests per second across all workers, instead of sending back to back")
+    load.add_argument("--duration", type=float, help="Seconds to run for")
+    load.add_argument("--requests", type=int, help="Requests to send in all")
+    load.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout per request in seconds")
+    load.add_argument("--processes", type=int, help="Worker processes to start here (default: one per core)")
+    load.add_argument("--remote-workers", type=int, default=0, help="Workers on other hosts to wait for; start them with 'pingstream worker'")
+    load.add_argument("--listen", default="127.0.0.1:0", help="HOST:PORT workers connect to (default: a free loopback port); use 0.0.0.0 for remote workers")
+    load.add_argument("--token", default=os.environ.get("PINGSTREAM_WORKER_TOKEN"), help="Token workers must present (default: $PINGSTREAM_WORKER_TOKEN, or a random one)")
+    load.add_argument("-o", "--output", help="Write the JSON report to this file instead of stdout")
+    load.add_argument("-q", "--quiet", action="store_true", help="Do not print progress every second")
+
+    worker = commands.add_parser("worker", help="Send load test requests for a coordinator started with 'pingstream load'")
+    worker.add_argument("coordinator", help="HOST:PORT the coordinator listens on")
+    worker.add_argument("--token", default=os.environ.get("PINGSTREAM_WORKER_TOKEN"), help="The coordinator's token (default: $PINGSTREAM_WORKER_TOKEN)")
+    return parser
+
+
+def _positive_int(value):
+    """argparse type for counts of at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return number
+
+
+def _address(value):
+    """Split HOST:PORT"""
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected HOST:PORT, not {value!r}")
+    return host, int(port)
+
+
+def run_command(args):
+    """Run a collection; returns the exit status (1 when any request failed)"""
+    try:
+        with open(args.collection, "rb") as fileobj:
+            collections = import_collection(fileobj, args.collection)
+    except (OSError, ValueError) as e:
+        print(f"pingstream: cannot import {args.collection}: {e}", file=sys.stderr)
+        return 2
+    jobs = collection_jobs(collections, args.folder)
+    if not jobs:
+        print(f"pingstream: no requests found in {args.collection}", file=sys.stderr)
+        return 2
+
+    cache = None
+    if args.cache:
+        from .cache import get_cache
+        cache = get_cache()
+
+    dataset = None
+    if args.data:
+        from .templates import dataset_rows, iteration_jobs
+        try:
+            dataset = open(args.data, "rb")
+        except OSError as e:
+            print(f"pingstream: cannot open {args.data}: {e}", file=sys.stderr)
+            return 2
+        jobs = iteration_jobs(jobs, dataset_rows(dataset, args.data))
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    # jsonl reports are written as results arrive; the others need every result
+    streaming = args.report == "jsonl"
+    start = time.perf_counter()
+    results = []
+    tally = Tally()
+    try:
+        run = run_requests(
+            jobs,
+            base_url=args.base_url,
+            engine=args.engine,
+            concurrency=args.concurrency,
+            per_host=args.per_host,
+            timeout=args.timeout,
+            total_timeout=args.total_timeout,
+            cache=cache,
+            http_version=args.http,
+        )
+        for result in run:
+            tally.add(result)
+            if streaming:
+                write_jsonl_result(result, output)
+            else:
+                results.append(result)
+            if not args.quiet:
+                outcome = result["error"] or result["status"]
+                row = f" [row {result['row']}]" if result["row"] else ""
+                print(f"{'ok  ' if result_passed(result) else 'FAIL'} {result['method']:<7} {result['url']}{row}  {outcome}  {result['latency_ms']:.1f} ms", file=sys.stderr)
+        elapsed = time.perf_counter() - start
+
+        summary = tally.summary(elapsed)
+        if run.not_started != 0:
+            summary["not_started"] = run.not_started
+        if streaming:
+            write_report(args.report, [], summary, output)
+        else:
+            results.sort(key=lambda result: result["index"])
+            write_report(args.report, results, summary, output)
+    except ValueError as e:
+        # A malformed dataset row
+        print(f"pingstream: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if dataset is not None:
+            dataset.close()
+
+    print(
+        f"pingstream: {summary['passed']} passed, {summary['failed']} failed of {summary['total']} in {elapsed:.2f}s",
+        file=sys.stderr,
+    )
+    if run.not_started != 0:
+        remaining = "the remaining requests" if run.not_started is None else f"{run.not_started} more requests"
+        print(f"pingstream: total timeout reached; {remaining} were not started", file=sys.stderr)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"pingstream: cache {stats['hit']} hits, {stats['revalidated']} revalidated, {stats['miss']} misses", file=sys.stderr)
+    return 0 if summary["failed"] == 0 and run.not_started == 0 else 1
+
+
+def _load_requests(args):
+    """The prepared requests a load command sends: one for a URL, or every request of a collection"""
+    if "://" in args.target and not os.path.exists(args.target):
+        headers = []
+        for header in args.header:
+            key, _, value = header.partition(":")
+            headers.append({"key": key.strip(), "value": value.strip()})
+        return [prepare_request(args.method.upper(), args.target, headers=headers, body=args.body, http_version=args.http)]
+    with open(args.target, "rb") as fileobj:
+        collections = import_collection(fileobj, args.target)
+    return [
+        prepare_request(request.method, resolve_url(args.base_url, request.url), request.header_rows(), request.param_rows(), request.body, http_version=args.http)
+        for _, request in collection_jobs(collections, args.folder)
+    ]
+
+
+def load_command(args):
+    """Run a distributed load test; returns the exit status (1 when any request failed)"""
+    from .distributed import DistributedLoadTest
+
+    if not args.duration and not args.requests:
+        print("pingstream: set --duration or --requests", file=sys.stderr)
+        return 2
+    try:
+        requests = _load_requests(args)
+    except (OSError, ValueError) as e:
+        print(f"pingstream: cannot load {args.target}: {e}", file=sys.stderr)
+        return 2
+    if not requests:
+        print(f"pingstream: no requests found in {args.target}", file=sys.stderr)
+        return 2
+    try:
+        test = DistributedLoadTest(
+            requests,
+            engine=args.engine,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            duration=args.duration,
+            total_requests=args.requests,
+            timeout=args.timeout,
+            processes=args.processes,
+            remote_workers=args.remote_workers,
+            listen=_address(args.listen),
+            token=args.token,
+        )
+    except (OSError, ValueError) as e:
+        print(f"pingstream: {e}", file=sys.stderr)
+        return 2
+
+    if args.remote_workers:
+        print(
+            f"pingstream: waiting for {args.remote_workers} remote workers; on each host run\n"
+            f"  PINGSTREAM_WORKER_TOKEN={test.token} python -m pingstream_core worker {test.address[0]}:{test.address[1]}",
+            file=sys.stderr,
+        )
+    test.start()
+    try:
+        while test.running:
+            test.wait(1.0)
+            if not args.quiet and test.running:
+                report = test.snapshot()
+                p99 = report["latency_ms"]["p99"]
+                print(
+                    f"pingstream: {report['elapsed']:.0f}s  {len(report['workers'])} workers  {report['requests']:,} requests  "
+                    f"{report['throughput']:,.0f} req/s  p99 {p99 if p99 is None else round(p99, 1)} ms  {report['errors']:,} errors",
+                    file=sys.stderr,
+                )
+    except KeyboardInterrupt:
+        test.stop()
+        test.wait()
+
+    report = test.snapshot()
+    if report["error"]:
+        print(f"pingstream: {report['error']}", file=sys.stderr)
+        return 2
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(
+        f"pingstream: {report['requests']:,} requests from {len(report['workers'])} workers in {report['elapsed']:.2f}s, "
+        f"{report['throughput']:,.0f} req/s, {report['errors']:,} failed",
+        file=sys.stderr,
+    )
+    return 0 if report["errors"] == 0 else 1
+
+
+def worker_command(args):
+    from .distributed import run_worker
+
+    try:
+        host, port = _address(args.coordinator)
+        run_worker(host, port, token=args.token)
+    except (OSError, ValueError) as e:
+        print(f"pingstream worker: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run_command(args)
+    if args.command == "load":
+        return load_command(args)
+    if args.command == "worker":
+        return worker_command(args)
+    parser.print_help()
+    return 2
@@ -0,0 +1,445 @@
+import base64
+import hmac
+import itertools
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from .engine import DEFAULT_TIMEOUT, send_request
+from .loadtest import LatencyHistogram, LoadTest, _new_window
+
+PROTOCOL_VERSION = 1
+# Seconds between the samples a worker streams back
+SAMPLE_INTERVAL = 0.25
+# Seconds the coordinator waits for its workers to join, and for each to say hello
+JOIN_TIMEOUT = 30
+HELLO_TIMEOUT = 5
+# Longest message line accepted, in bytes
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+# Environment variable local workers get the token from, so it stays off the command line
+TOKEN_VARIABLE = "PINGSTREAM_WORKER_TOKEN"
+
+# Directory `python -m pingstream_core` works from
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Connection:
+    """One end of the coordinator/worker protocol: JSON objects, one per line, over TCP"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._reader = sock.makefile("rb")
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        data = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            self.sock.sendall(data)
+
+    def receive(self):
+        """The next message, or None once the other end has gone or sent something unreadable"""
+        try:
+            line = self._reader.readline(MAX_MESSAGE_SIZE)
+        except OSError:
+            return None
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return None
+        return message if isinstance(message, dict) else None
+
+    def close(self):
+        try:
+            # Wakes a thread blocked in receive()
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._reader.close()
+        self.sock.close()
+
+
+def _encode_request(prepared):
+    """A prepared request as a JSON-ready dict"""
+    if prepared["files"]:
+        raise ValueError("Requests with file uploads cannot be sent by workers")
+    return {
+        "method": prepared["method"],
+        "url": prepared["url"],
+        "headers": prepared["headers"],
+        "body": base64.b64encode(prepared["body"]).decode("ascii") if prepared["body"] is not None else None,
+        "form": prepared.get("form", []),
+        "http_version": prepared.get("http_version", "auto"),
+    }
+
+
+def _decode_request(data):
+    return {
+        "method": data["method"],
+        "url": data["url"],
+        "headers": [tuple(header) for header in data["headers"]],
+        "body": base64.b64decode(data["body"]) if data["body"] is not None else None,
+        "files": [],
+        "form": [tuple(field) for field in data["form"]],
+        "http_version": data["http_version"],
+    }
+
+
+def _shares(total, parts):
+    """Split `total` into `parts` whole numbers that differ by at most one"""
+    return [total // parts + (i < total % parts) for i in range(parts)]
+
+
+def _new_sample():
+    return {"histogram": LatencyHistogram(), "statuses": {}, "errors": 0, "error_messages": {}, "windows": {}}
+
+
+class _WorkerLoadTest(LoadTest):
+    """A worker's share of a distributed test; results are only kept until the next sample is taken"""
+
+    def __init__(self, prepared, **options):
+        super().__init__(prepared, **options)
+        self.completed = 0
+        self._sample = _new_sample()
+
+    def _record(self, finished, latency_us, status, error):
+        failed = error is not None or status >= 400
+        second = int(finished - self.started)
+        with self._lock:
+            self.completed += 1
+            sample = self._sample
+            sample["histogram"].record(latency_us)
+            if error is not None:
+                sample["error_messages"][error] = sample["error_messages"].get(error, 0) + 1
+            else:
+                sample["statuses"][status] = sample["statuses"].get(status, 0) + 1
+            sample["errors"] += failed
+            window = sample["windows"].setdefault(second, _new_window())
+            window["requests"] += 1
+            window["errors"] += failed
+            window["histogram"].record(latency_us)
+
+    def take_sample(self):
+        """What finished since the last sample, as a message for the coordinator"""
+        with self._lock:
+            sample, self._sample = self._sample, _new_sample()
+        return {
+            "type": "sample",
+            "histogram": sample["histogram"].to_json(),
+            "statuses": sorted(sample["statuses"].items()),
+            "errors": sample["errors"],
+            "error_messages": sample["error_messages"],
+            "windows": [
+                [second, window["requests"], window["errors"], window["histogram"].to_json()]
+                for second, window in sorted(sample["windows"].items())
+            ],
+        }
+
+
+def run_worker(host, port, token=None):
+    """Join a coordinator, run the share of its load test it hands out, and stream samples back
+
+    Returns the number of requests sent. Raises ConnectionError when the
+    coordinator turns the worker away or goes away.
+    """
+    sock = socket.create_connection((host, port), timeout=JOIN_TIMEOUT)
+    sock.settimeout(None)
+    connection = _Connection(sock)
+    try:
+        connection.send({
+            "type": "hello",
+            "version": PROTOCOL_VERSION,
+            "token": token or "",
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+        })
+        message = connection.receive()
+        if message is None:
+            raise ConnectionError("The coordinator closed the connection")
+        kind = message.get("type")
+        if kind == "error":
+            raise ConnectionError(str(message.get("message", "Turned away by the coordinator")))
+        if kind == "stop":
+            # Stopped while workers were still joining, or not needed
+            return 0
+        if kind != "start":
+            raise ConnectionError(f"Unexpected {kind!r} message from the coordinator")
+        try:
+            requests = [_decode_request(data) for data in message["requests"]]
+            settings = {name: message[name] for name in ("engine", "concurrency", "rate", "duration", "total_requests", "timeout")}
+        except (KeyError, TypeError, ValueError) as e:
+            raise ConnectionError(f"Malformed start message from the coordinator: {e!r}") from None
+        if settings["total_requests"] == 0 or not requests:
+            # More workers joined than there were requests to send
+            connection.send({"type": "done"})
+            return 0
+
+        send = send_request
+        if len(requests) > 1:
+            # Each request of the list in turn; next() on a cycle is atomic under the GIL
+            turn = itertools.cycle(requests)
+
+            def send(prepared, **options):
+                return send_request(next(turn), **options)
+
+        test = _WorkerLoadTest(requests[0], send=send, **settings).start()
+
+        def listen():
+            # A stop message, or the coordinator going away, ends the test early
+            while True:
+                message = connection.receive()
+                if message is None or message.get("type") == "stop":
+                    test.stop()
+                    return
+
+        threading.Thread(target=listen, name="pingstream-worker-listen", daemon=True).start()
+        try:
+            while True:
+                test.wait(SAMPLE_INTERVAL)
+                running = test.running
+                connection.send(test.take_sample())
+                if not running:
+                    break
+            connection.send({"type": "done"})
+        except OSError as e:
+            test.stop()
+            raise ConnectionError(f"Lost the coordinator: {e}") from None
+        return test.completed
+    finally:
+        connection.close()
+
+
+class DistributedLoadTest(LoadTest):
+    """Spread a load test over worker processes, on this machine and optionally on others
+
+    `processes` workers are started here with `python -m pingstream_core
+    worker`, and `remote_workers` more are waited for on `listen`, a
+    (host, port) pair; they join with `token`. Once all have joined, or
+    JOIN_TIMEOUT has passed, the concurrency, rate and request count are
+    split between them; no more than `concurrency` workers take part, so
+    each has a request in flight. Each runs its share as a LoadTest with
+    its own GIL and connection pool. Every SAMPLE_INTERVAL workers stream
+    back what finished as a sparse latency histogram with status and error
+    counts, which are merged here, so snapshot() reports on the whole test
+    as a LoadTest does. `prepared` may be a list of requests, which every
+    worker sends in turn.
+    """
+
+    def __init__(self, prepared, engine="pooled", concurrency=10, rate=None, duration=None, total_requests=None,
+                 timeout=DEFAULT_TIMEOUT, processes=None, remote_workers=0, listen=("127.0.0.1", 0), token=None):
+        requests = prepared if isinstance(prepared, list) else [prepared]
+        super().__init__(requests[0], engine=engine, concurrency=concurrency, rate=rate, duration=duration,
+                         total_requests=total_requests, timeout=timeout)
+        self.requests = [_encode_request(request) for request in requests]
+        self.processes = (os.cpu_count() or 1) if processes is None else max(0, int(processes))
+        # Every worker keeps at least one request in flight
+        self.processes = min(self.processes, self.concurrency)
+        self.remote_workers = max(0, int(remote_workers))
+        if not self.processes and not self.remote_workers:
+            raise ValueError("Start at least one worker process or wait for a remote worker")
+        self.token = token or secrets.token_urlsafe(16)
+        self.workers = []
+        self.error = None
+        self._processes = []
+        self._connections = []
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(listen)
+        self._server.listen()
+        self._server.settimeout(0.2)
+        self.address = self._server.getsockname()
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run_distributed, name="pingstream-loadtest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        super().stop()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.send({"type": "stop"})
+            except OSError:
+                pass
+
+    def _spawn(self):
+        host, port = self.address
+        if host == "0.0.0.0":
+            host = "127.0.0.1"
+        env = dict(os.environ, **{TOKEN_VARIABLE: self.token})
+        for _ in range(self.processes):
+            self._processes.append(subprocess.Popen(
+                [sys.executable, "-m", "pingstream_core", "worker", f"{host}:{port}"],
+                cwd=_PACKAGE_ROOT,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+            ))
+
+    def _admit(self, sock, peer):
+        """Read a new connection's hello; returns the connection, or None if it was turned away"""
+        sock.settimeout(HELLO_TIMEOUT)
+        connection = _Connection(sock)
+        hello = connection.receive()
+        problem = None
+        if hello is None or hello.get("type") != "hello":
+            problem = "Expected a hello message"
+        elif hello.get("version") != PROTOCOL_VERSION:
+            problem = f"Protocol version {hello.get('version')} is not {PROTOCOL_VERSION}; run the same Pingstream version everywhere"
+        elif not hmac.compare_digest(str(hello.get("token", "")), self.token):
+            problem = "Wrong token"
+        if problem is not None:
+            try:
+                connection.send({"type": "error", "message": problem})
+            except OSError:
+                pass
+            connection.close()
+            return None
+        sock.settimeout(None)
+        worker = {"worker": f"{hello.get('host', peer[0])}:{hello.get('pid', peer[1])}", "address": peer[0], "requests": 0, "state": "joined"}
+        with self._lock:
+            self.workers.append(worker)
+            self._connections.append(connection)
+        return worker, connection
+
+    def _gather(self):
+        """Accept workers until all expected have joined, the join times out, or the test is stopped"""
+        hostname = socket.gethostname()
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        joined = []
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            # Local workers that died before joining are not waited for
+            names = {worker["worker"] for worker, _ in joined}
+            coming = sum(process.poll() is None or f"{hostname}:{process.pid}" in names for process in self._processes)
+            if len(joined) >= coming + self.remote_workers:
+                break
+            try:
+                sock, peer = self._server.accept()
+            except socket.timeout:
+                continue
+            admitted = self._admit(sock, peer)
+            if admitted is not None:
+                joined.append(admitted)
+        return joined
+
+    def _hand_out(self, joined):
+        """Send workers their share of the test; returns those taking part
+
+        Every worker sends at least one request at a time, so with fewer
+        requests in flight than workers the rest are sent home.
+        """
+        for worker, connection in joined[self.concurrency:]:
+            connection.send({"type": "stop"})
+            worker["state"] = "unused"
+        joined = joined[:self.concurrency]
+        parts = len(joined)
+        concurrency = _shares(self.concurrency, parts)
+        totals = _shares(self.total_requests, parts) if self.total_requests else [None] * parts
+        with self._lock:
+            # The test starts now, not when workers were being waited for
+            self.started = time.monotonic()
+        for (worker, connection), share, total in zip(joined, concurrency, totals):
+            connection.send({
+                "type": "start",
+                "requests": self.requests,
+                "engine": self.engine,
+                "concurrency": share,
+                "rate": self.rate / parts if self.rate else None,
+                "duration": self.duration,
+                "total_requests": total,
+                "timeout": self.timeout,
+            })
+            worker["state"] = "running"
+        return joined
+
+    def _merge(self, worker, sample):
+        with self._lock:
+            self.histogram.merge_json(sample["histogram"])
+            for status, count in sample["statuses"]:
+                self.statuses[status] = self.statuses.get(status, 0) + count
+            for error, count in sample["error_messages"].items():
+                self.error_messages[error] = self.error_messages.get(error, 0) + count
+            self.errors += sample["errors"]
+            # Seconds are counted from each worker's start, which are close enough to line up
+            for second, requests, errors, histogram in sample["windows"]:
+                window = self.windows.setdefault(second, _new_window())
+                window["requests"] += requests
+                window["errors"] += errors
+                window["histogram"].merge_json(histogram)
+            worker["requests"] += sample["histogram"]["count"]
+
+    def _collect(self, worker, connection):
+        """Merge a worker's samples until it is done or gone"""
+        while True:
+            message = connection.receive()
+            kind = None if message is None else message.get("type")
+            if kind == "sample":
+                try:
+                    self._merge(worker, message)
+                    continue
+                except (KeyError, TypeError, ValueError):
+                    pass
+            elif kind == "done":
+                worker["state"] = "done"
+                return
+            # Gone, or sent something unreadable: drop the worker
+            worker["state"] = "lost"
+            connection.close()
+            return
+
+    def _run_distributed(self):
+        try:
+            self._spawn()
+            joined = self._gather()
+            if not joined:
+                if not self._stop.is_set():
+                    self.error = "No worker joined"
+                return
+            if self._stop.is_set():
+                for _, connection in joined:
+                    connection.send({"type": "stop"})
+                return
+            joined = self._hand_out(joined)
+            readers = [
+                threading.Thread(target=self._collect, args=admitted, name="pingstream-coordinator", daemon=True)
+                for admitted in joined
+            ]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+        except OSError as e:
+            self.error = f"{e.__class__.__name__}: {e}"
+        finally:
+            self._server.close()
+            with self._lock:
+                connections, self._connections = self._connections, []
+            for connection in connections:
+                connection.close()
+            for process in self._processes:
+                try:
+                    process.wait(HELLO_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            self.finished = time.monotonic()
+
+    def snapshot(self):
+        report = super().snapshot()
+        with self._lock:
+            report.update({
+                "workers": [dict(worker) for worker in self.workers],
+                "workers_expected": self.processes + self.remote_workers,
+                "address": f"{self.address[0]}:{self.address[1]}",
+                "error": self.error,
+            })
+        return report
@@ -0,0 +1,739 @@
+import http.client
+import os
+import queue
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .multipart import MultipartEncoder
+from .profiler import count
+
+ENGINES = ["pooled", "curl"]
+# HTTP versions a request can ask for. "auto" takes the best both sides
+# support (HTTP/2 over TLS with curl), and "2-prior-knowledge" speaks HTTP/2
+# without negotiating, which is how h2c servers are reached. HTTP/2 needs curl.
+HTTP_VERSIONS = ["auto", "1.1", "2", "2-prior-knowledge"]
+CURL_HTTP_FLAGS = {"1.1": "--http1.1", "2": "--http2", "2-prior-knowledge": "--http2-prior-knowledge"}
+BODY_METHODS = ["POST", "PUT", "PATCH"]
+DEFAULT_TIMEOUT = 30
+
+# Response bodies are read in chunks and spooled to disk past the memory limit
+CHUNK_SIZE = 64 * 1024
+SPOOL_MEMORY_LIMIT = 1024 * 1024
+HEAD_SIZE = 64 * 1024
+
+# Consecutive phases of a request, in the order they happen
+TIMING_PHASES = ["dns", "connect", "tls", "wait", "transfer"]
+
+# Marker separating curl's write-out from any error text on stderr
+CURL_WRITE_OUT_MARKER = "__pingstream__"
+CURL_WRITE_OUT_FIELDS = [
+    "http_code",
+    "time_namelookup",
+    "time_connect",
+    "time_appconnect",
+    "time_pretransfer",
+    "time_starttransfer",
+    "time_total",
+    "size_request",
+    "size_upload",
+    "size_header",
+    "size_download",
+    "num_connects",
+]
+
+
+class RequestError(Exception):
+    """Raised when a request could not be sent or no response was received"""
+
+
+def build_url(url, params):
+    """Append query parameters that have both a key and a value to the URL"""
+    pairs = []
+    for param in params or []:
+        if param["key"] and param["value"]:
+            pairs.append(f"{param['key']}={param['value']}")
+
+    if not pairs:
+        return url
+    if "?" in url:
+        return url + "&" + "&".join(pairs)
+    return url + "?" + "&".join(pairs)
+
+
+def prepare_request(method, url, headers=None, params=None, body=None, files=None, form=None, http_version="auto"):
+    """Turn form input into a request both engines can send
+
+    `body` is only sent for methods that carry one. `files` is a list of
+    (field, filename, fileobj) or (field, filename, fileobj, content_type)
+    tuples and `form` a list of key/value rows; together they are sent as
+    multipart/form-data, streamed from the file objects. `http_version` is
+    one of HTTP_VERSIONS.
+    """
+    prepared_headers = []
+    for header in headers or []:
+        if header["key"] and header["value"]:
+            prepared_headers.append((header["key"], header["value"]))
+
+    data = None
+    if method in BODY_METHODS and body and body.strip():
+        prepared_headers.append(("Content-Type", "application/json"))
+        data = body.encode("utf-8")
+
+    return {
+        "method": method,
+        "url": build_url(url, params),
+        "headers": prepared_headers,
+        "body": data,
+        "files": list(files or []),
+        "form": [(field["key"], field["value"]) for field in form or [] if field["key"]],
+        "http_version": http_version,
+    }
+
+
+def curl_command(prepared):
+    """Build the curl argv for a prepared request
+
+    File parts are shown by their original filename, which is enough for
+    display; _send_curl() streams them to curl itself.
+    """
+    cmd = ["curl", "-s"]
+    multipart = prepared["files"] or prepared.get("form")
+
+    http_flag = CURL_HTTP_FLAGS.get(prepared.get("http_version", "auto"))
+    if http_flag:
+        cmd.append(http_flag)
+
+    if prepared["method"] != "GET":
+        cmd.extend(["-X", prepared["method"]])
+
+    for key, value in prepared["headers"]:
+        # -F sets its own multipart Content-Type
+        if not (multipart and key.lower() == "content-type"):
+            cmd.extend(["-H", f"{key}: {value}"])
+
+    if prepared["body"] is not None and not multipart:
+        cmd.extend(["-d", prepared["body"].decode("utf-8")])
+
+    for key, value in prepared.get("form", []):
+        cmd.extend(["--form-string", f"{key}={value}"])
+
+    for file_part in prepared["files"]:
+        field, filename = file_part[:2]
+        content_type = file_part[3] if len(file_part) > 3 else None
+        cmd.extend(["-F", f"{field}=@{filename}" + (f";type={content_type}" if content_type else "")])
+
+    cmd.append(prepared["url"])
+    return cmd
+
+
+class ResponseBody:
+    """Response body spooled to a temporary file as it arrives
+
+    The first HEAD_SIZE bytes are also kept in memory for quick previews.
+    With keep=False only the size and head are tracked, which is all the
+    runner and load tests need.
+    """
+
+    def __init__(self, keep=True):
+        self.size = 0
+        self.head = b""
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT) if keep else None
+
+    def __len__(self):
+        return self.size
+
+    def write(self, chunk):
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[:HEAD_SIZE - len(self.head)]
+        if self._file is not None:
+            self._file.write(chunk)
+        self.size += len(chunk)
+
+    def read_range(self, start, length):
+        """Read up to `length` bytes starting at byte `start`"""
+        if start + length <= len(self.head):
+            return self.head[start:start + length]
+        if self._file is None:
+            raise ValueError("Response body was not kept")
+        self._file.seek(start)
+        return self._file.read(length)
+
+    def read(self):
+        """Read the whole body into memory"""
+        return self.read_range(0, self.size)
+
+    def open(self):
+        """Return the spooled file, rewound, for streaming the body elsewhere"""
+        if self._file is None:
+            raise ValueError("Response body was not kept")
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def response_text(response):
+    """Decode a response body for display"""
+    return response["body"].read().decode("utf-8", errors="replace")
+
+
+def get_header(headers, name):
+    """Return the first header value matching `name`, case-insensitively"""
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class _PooledConnection(http.client.HTTPConnection):
+    """HTTP connection that resolves and handshakes through its pool"""
+
+    def __init__(self, pool, scheme, host, port, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.pool = pool
+        self.scheme = scheme
+        self.reused = False
+        self.phases = {}
+        self.bytes_sent = 0
+
+    def connect(self):
+        count("pool.connections_opened")
+        self.sock, self.phases = self.pool.open_socket(self.scheme, self.host, self.port, self.timeout)
+
+    def send(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.bytes_sent += len(data)
+        super().send(data)
+
+
+class ConnectionPool:
+    """Keep-alive connections per origin, with DNS and TLS session caches
+
+    A single pool lives at module level so it survives Streamlit reruns,
+    which only re-execute the app script and not imported modules.
+    """
+
+    def __init__(self, max_idle_per_host=8, dns_ttl=60):
+        self.max_idle_per_host = max_idle_per_host
+        self.dns_ttl = dns_ttl
+        # Raised limits of the runs using the pool, see capacity()
+        self._reserved = []
+        self.ssl_context = ssl.create_default_context()
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._dns = {}
+        self._tls_sessions = {}
+
+    def resolve(self, host, port):
+        """Resolve a host through the DNS cache"""
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._dns.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._dns[key] = (now + self.dns_ttl, addresses)
+        return addresses
+
+    def open_socket(self, scheme, host, port, timeout):
+        """Open a new socket to the origin, resuming a TLS session if we have one
+
+        Returns the socket and how long the dns, connect and tls phases took
+        in milliseconds.
+        """
+        sock = None
+        last_error = None
+        started = time.perf_counter()
+        addresses = self.resolve(host, port)
+        resolved = time.perf_counter()
+        for family, socktype, proto, _, address in addresses:
+            try:
+                sock = socket.socket(family, socktype, proto)
+                sock.settimeout(timeout)
+                sock.connect(address)
+                break
+            except OSError as e:
+                last_error = e
+                if sock is not None:
+                    sock.close()
+                sock = None
+        if sock is None:
+            # Drop the cached answer so the next attempt resolves again
+            with self._lock:
+                self._dns.pop((host, port), None)
+            raise last_error or OSError(f"Could not connect to {host}:{port}")
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connected = time.perf_counter()
+
+        if scheme == "https":
+            with self._lock:
+                session = self._tls_sessions.get((host, port))
+            try:
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=host, session=session)
+            except Exception:
+                sock.close()
+                raise
+
+        return sock, {
+            "dns": (resolved - started) * 1000,
+            "connect": (connected - resolved) * 1000,
+            "tls": (time.perf_counter() - connected) * 1000,
+        }
+
+    def acquire(self, scheme, host, port, timeout):
+        """Take an idle connection for the origin or create a new one"""
+        with self._lock:
+            idle = self._idle.get((scheme, host, port))
+            while idle:
+                conn = idle.pop()
+                if conn.sock is not None:
+                    conn.timeout = timeout
+                    conn.sock.settimeout(timeout)
+                    conn.reused = True
+                    conn.phases = {}
+                    conn.bytes_sent = 0
+                    count("pool.connections_reused")
+                    return conn
+        return _PooledConnection(self, scheme, host, port, timeout)
+
+    def release(self, conn):
+        """Return a connection to the pool once its response has been read"""
+        if conn.sock is None:
+            return
+        key = (conn.scheme, conn.host, conn.port)
+        with self._lock:
+            session = getattr(conn.sock, "session", None)
+            if session is not None:
+                self._tls_sessions[(conn.host, conn.port)] = session
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._limit():
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _limit(self):
+        return max([self.max_idle_per_host] + self._reserved)
+
+    @contextmanager
+    def capacity(self, per_host):
+        """Keep at least `per_host` idle connections per origin while the block runs
+
+        Afterwards the limit drops back to the highest one still in use and
+        the surplus idle connections are closed.
+        """
+        with self._lock:
+            self._reserved.append(per_host)
+        try:
+            yield self
+        finally:
+            surplus = []
+            with self._lock:
+                self._reserved.remove(per_host)
+                limit = self._limit()
+                for idle in self._idle.values():
+                    # The oldest connections go first; a limit of 0 closes them all
+                    excess = max(0, len(idle) - limit)
+                    surplus.extend(idle[:excess])
+                    del idle[:excess]
+            for conn in surplus:
+                conn.close()
+
+    def clear(self):
+        """Close every idle connection and forget cached lookups"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self._dns.clear()
+            self._tls_sessions.clear()
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+_pool = ConnectionPool()
+
+
+def get_pool():
+    """Return the shared connection pool"""
+    return _pool
+
+
+def _send_pooled(prepared, timeout, pool, on_chunk, keep_body, on_upload):
+    parts = urlsplit(prepared["url"])
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        raise RequestError(f"Unsupported URL: {prepared['url']}")
+    if prepared.get("http_version", "auto") not in ("auto", "1.1"):
+        raise RequestError("HTTP/2 needs the curl engine; the pooled engine speaks HTTP/1.1")
+    host = parts.hostname
+    port = parts.port or (443 if scheme == "https" else 80)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    headers = list(prepared["headers"])
+    body = prepared["body"]
+    multipart = None
+    if prepared["files"] or prepared.get("form"):
+        # Like curl, a multipart upload replaces any raw body
+        headers = [(k, v) for k, v in headers if k.lower() != "content-type"]
+        multipart = MultipartEncoder(prepared.get("form"), prepared["files"])
+        headers.append(("Content-Type", multipart.content_type))
+
+    names = {key.lower() for key, _ in headers}
+    if "user-agent" not in names:
+        headers.append(("User-Agent", "pingstream"))
+    if "accept" not in names:
+        headers.append(("Accept", "*/*"))
+    if multipart is not None:
+        if multipart.length is None:
+            headers.append(("Transfer-Encoding", "chunked"))
+        elif "content-length" not in names:
+            headers.append(("Content-Length", str(multipart.length)))
+    elif body is not None and "content-length" not in names:
+        headers.append(("Content-Length", str(len(body))))
+
+    start = time.perf_counter()
+    # A kept-alive connection may have been closed by the server while idle,
+    # so a failure on a reused connection is retried once on a fresh one
+    for attempt in range(2):
+        conn = pool.acquire(scheme, host, port, timeout)
+        try:
+            conn.putrequest(prepared["method"], target, skip_host="host" in names, skip_accept_encoding=True)
+            for key, value in headers:
+                conn.putheader(key, value)
+            if multipart is not None:
+                # Every attempt streams the parts again from the start
+                conn.endheaders(multipart.chunks(on_upload), encode_chunked=multipart.length is None)
+            else:
+                conn.endheaders(body)
+            resp = conn.getresponse()
+            break
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if not conn.reused or attempt:
+                raise RequestError(str(e) or e.__class__.__name__) from e
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise RequestError(str(e) or e.__class__.__name__) from e
+    first_byte = time.perf_counter()
+
+    data = ResponseBody(keep=keep_body)
+    try:
+        while True:
+            chunk = resp.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            data.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+    except (OSError, http.client.HTTPException) as e:
+        conn.close()
+        data.close()
+        raise RequestError(str(e) or e.__class__.__name__) from e
+    end = time.perf_counter()
+
+    # read1() leaves the response open after its last byte, and http.client
+    # will not send another request on the connection until it is closed
+    resp.close()
+    if resp.will_close:
+        conn.close()
+    else:
+        pool.release(conn)
+
+    http_version = "HTTP/1.0" if resp.version == 10 else "HTTP/1.1"
+    response_headers = resp.getheaders()
+    header_bytes = len(f"{http_version} {resp.status} {resp.reason}\r\n\r\n")
+    header_bytes += sum(len(key) + len(value) + 4 for key, value in response_headers)
+
+    # The request is on the wire once endheaders() returns, so everything
+    # before that which is not connection setup counts as waiting
+    timings = {"dns": 0.0, "connect": 0.0, "tls": 0.0}
+    timings.update(conn.phases)
+    setup = sum(timings.values())
+    timings["wait"] = max(0.0, (first_byte - start) * 1000 - setup)
+    timings["transfer"] = (end - first_byte) * 1000
+    timings["ttfb"] = (first_byte - start) * 1000
+    timings["total"] = (end - start) * 1000
+
+    return {
+        "status": resp.status,
+        "reason": resp.reason,
+        "http_version": http_version,
+        "headers": response_headers,
+        "body": data,
+        "timings": timings,
+        "bytes_up": conn.bytes_sent,
+        "bytes_down": header_bytes + data.size,
+        "reused": conn.reused,
+        "engine": "pooled",
+    }
+
+
+def _parse_header_block(raw):
+    """Parse the last header block curl dumped with -D"""
+    blocks = [b for b in raw.replace("\r\n", "\n").split("\n\n") if b.strip()]
+    if not blocks:
+        return "", "", []
+    lines = blocks[-1].split("\n")
+    status_line = lines[0].split(" ", 2)
+    headers = []
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers.append((key.strip(), value.strip()))
+    reason = status_line[2] if len(status_line) > 2 else ""
+    return status_line[0], reason, headers
+
+
+def _curl_timings(fields):
+    """Turn curl's cumulative write-out times into per-phase milliseconds"""
+    seconds = {field: float(fields[field]) for field in fields if field.startswith("time_")}
+    connected = seconds["time_connect"]
+    # time_appconnect stays 0 without TLS
+    handshaken = max(seconds["time_appconnect"], connected)
+    return {
+        "dns": seconds["time_namelookup"] * 1000,
+        "connect": (connected - seconds["time_namelookup"]) * 1000,
+        "tls": (handshaken - connected) * 1000,
+        "wait": (seconds["time_starttransfer"] - handshaken) * 1000,
+        "transfer": (seconds["time_total"] - seconds["time_starttransfer"]) * 1000,
+        "ttfb": seconds["time_starttransfer"] * 1000,
+        "total": seconds["time_total"] * 1000,
+    }
+
+
+def _drain(stream, received):
+    """Move everything from a pipe into a queue, ending with None"""
+    try:
+        while True:
+            chunk = stream.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            received.put(chunk)
+    finally:
+        received.put(None)
+
+
+def _feed_curl(stdin, chunks, errors):
+    """Write a request body to curl's stdin, then close it"""
+    try:
+        for chunk in chunks:
+            stdin.write(chunk)
+    except BrokenPipeError:
+        # curl stopped reading; its exit status says why
+        pass
+    except (OSError, ValueError) as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def _send_curl(prepared, timeout, on_chunk, keep_body, on_upload):
+    temp_paths = []
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix="_headers") as header_file:
+            temp_paths.append(header_file.name)
+
+        upload = None
+        if prepared["files"] or prepared.get("form"):
+            # The multipart body is streamed to curl's stdin rather than
+            # copied to temporary files for -F, and replaces any raw body
+            multipart = MultipartEncoder(prepared.get("form"), prepared["files"])
+            headers = [(k, v) for k, v in prepared["headers"] if k.lower() != "content-type"]
+            headers.append(("Content-Type", multipart.content_type))
+            if multipart.length is not None:
+                # Without these curl sends stdin chunked, and waits for 100-continue
+                headers.extend([("Content-Length", str(multipart.length)), ("Transfer-Encoding", "")])
+            headers.append(("Expect", ""))
+            cmd = curl_command(dict(prepared, headers=headers, body=None, files=[], form=[]))
+            # -T would otherwise turn the request into a PUT
+            cmd[-1:-1] = ["-T", "-"] + (["-X", "GET"] if prepared["method"] == "GET" else [])
+            upload = multipart.chunks(on_upload)
+        elif prepared["body"] is not None:
+            # Raw bodies go through stdin too, as arguments are limited in size
+            cmd = curl_command(dict(prepared, body=None))
+            cmd[-1:-1] = ["--data-binary", "@-"]
+            upload = [prepared["body"]]
+        else:
+            cmd = curl_command(prepared)
+        # Ask curl for errors and status on stderr, and the headers in a file
+        cmd[1:2] = [
+            "-sSN",
+            "--max-time", str(timeout),
+            "-D", header_file.name,
+            "-w", "%{stderr}\n" + CURL_WRITE_OUT_MARKER + "".join(f" %{{{field}}}" for field in CURL_WRITE_OUT_FIELDS),
+        ]
+
+        count("subprocess.curl")
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE if upload is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            raise RequestError(f"Could not run curl: {e}") from e
+
+        upload_errors = []
+        if upload is not None:
+            # Feed stdin from this thread, so on_upload and on_chunk both run
+            # on the caller's thread, while a helper keeps stdout drained
+            received = queue.Queue()
+            threading.Thread(target=_drain, args=(process.stdout, received), daemon=True).start()
+            _feed_curl(process.stdin, upload, upload_errors)
+            chunks = iter(received.get, None)
+        else:
+            chunks = iter(lambda: process.stdout.read1(CHUNK_SIZE), b"")
+
+        data = ResponseBody(keep=keep_body)
+        for chunk in chunks:
+            data.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        # curl only writes a little to stderr, so reading it last cannot block
+        stderr = process.stderr.read()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+        error_text, _, write_out = stderr.decode("utf-8", errors="replace").rpartition(CURL_WRITE_OUT_MARKER)
+        if process.returncode != 0:
+            data.close()
+            raise RequestError(error_text.strip() or f"curl exited with status {process.returncode}")
+        if upload_errors:
+            data.close()
+            raise RequestError(f"Could not read upload: {upload_errors[0]}")
+
+        with open(header_file.name, "r", encoding="latin-1") as f:
+            header_block = f.read()
+    finally:
+        for path in temp_paths:
+            os.unlink(path)
+
+    return _curl_response(dict(zip(CURL_WRITE_OUT_FIELDS, write_out.split())), header_block, data)
+
+
+def _curl_response(fields, header_block, data):
+    """The response dict for one transfer, from curl's write-out fields and -D header dump"""
+    http_version, reason, headers = _parse_header_block(header_block)
+    return {
+        "status": int(fields["http_code"]),
+        "reason": reason,
+        "http_version": http_version,
+        "headers": headers,
+        "body": data,
+        "timings": _curl_timings(fields),
+        "bytes_up": int(fields["size_request"]) + int(fields["size_upload"]),
+        "bytes_down": int(fields["size_header"]) + int(fields["size_download"]),
+        "reused": fields["num_connects"] == "0",
+        "engine": "curl",
+    }
+
+
+def send_batch(batch, timeout=DEFAULT_TIMEOUT, keep_body=True):
+    """Send several prepared requests from one curl process, in parallel
+
+    curl keeps one connection per origin where it can: requests to an
+    HTTP/2 origin are multiplexed over a single connection, and HTTP/1.1
+    requests reuse connections as they free up. Returns a list in the same
+    order as `batch`, holding a response dict (as send_request() returns)
+    or a RequestError for each request. Bodies are written to temporary
+    files and read back once curl is done. Multipart requests are not
+    supported.
+    """
+    if not batch:
+        return []
+    with tempfile.TemporaryDirectory(prefix="pingstream-batch-") as directory:
+        # -s alone leaves the parallel progress meter on stderr
+        cmd = ["curl", "--no-progress-meter", "--parallel", "--parallel-max", str(len(batch))]
+        if any(prepared.get("http_version") == "2-prior-knowledge" for prepared in batch):
+            # curl 7.88 fails transfers that wait to share a prior-knowledge
+            # (h2c) connection, so these start at once on their own connections
+            cmd.append("--parallel-immediate")
+        for number, prepared in enumerate(batch):
+            if prepared["files"] or prepared.get("form"):
+                raise ValueError("Multipart requests cannot be sent in a batch")
+            part = curl_command(dict(prepared, body=None))
+            if prepared["body"] is not None:
+                body_path = os.path.join(directory, f"{number}.request")
+                with open(body_path, "wb") as f:
+                    f.write(prepared["body"])
+                part[-1:-1] = ["--data-binary", "@" + body_path]
+            # Each transfer gets its own header and body files, and reports
+            # its number, exit code and error after the usual fields
+            part[:2] = (["--next"] if number else []) + [
+                "-s",
+                "--max-time", str(timeout),
+                "-D", os.path.join(directory, f"{number}.headers"),
+                "-o", os.path.join(directory, f"{number}.body"),
+                "-w", "%{stderr}" + CURL_WRITE_OUT_MARKER + " %{urlnum} %{exitcode}"
+                + "".join(f" %{{{field}}}" for field in CURL_WRITE_OUT_FIELDS) + " %{errormsg}\n",
+            ]
+            cmd.extend(part)
+
+        count("subprocess.curl")
+        count("curl.batched_requests", len(batch))
+        try:
+            process = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise RequestError(f"Could not run curl: {e}") from e
+
+        reports = {}
+        for line in process.stderr.decode("utf-8", errors="replace").splitlines():
+            if CURL_WRITE_OUT_MARKER in line:
+                values = line[line.index(CURL_WRITE_OUT_MARKER):].split(" ", len(CURL_WRITE_OUT_FIELDS) + 3)
+                reports[int(values[1])] = values[2:]
+
+        results = []
+        for number in range(len(batch)):
+            report = reports.get(number)
+            if report is None:
+                results.append(RequestError(f"curl exited with status {process.returncode}"))
+                continue
+            exit_code, values, error = report[0], report[1:-1], report[-1]
+            if exit_code != "0":
+                results.append(RequestError(error.strip() or f"curl exited with status {exit_code}"))
+                continue
+            data = ResponseBody(keep=keep_body)
+            body_path = os.path.join(directory, f"{number}.body")
+            if os.path.exists(body_path):
+                with open(body_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        data.write(chunk)
+            with open(os.path.join(directory, f"{number}.headers"), "r", encoding="latin-1") as f:
+                header_block = f.read()
+            results.append(_curl_response(dict(zip(CURL_WRITE_OUT_FIELDS, values)), header_block, data))
+        return results
+
+
+def send_request(prepared, engine="pooled", timeout=DEFAULT_TIMEOUT, pool=None, on_chunk=None, keep_body=True, on_upload=None):
+    """Send a prepared request and return the response
+
+    Both engines return the same dict: status, reason, http_version,
+    headers as (name, value) pairs, the body as a ResponseBody, per-phase
+    timings in milliseconds (see TIMING_PHASES, plus ttfb and total),
+    bytes_up, bytes_down and whether an existing connection was reused.
+    `on_chunk` is called with each piece of the body as it arrives, and
+    `on_upload(sent, total)` as a multipart body goes out.
+    """
+    count(f"engine.{engine}")
+    if engine == "curl":
+        return _send_curl(prepared, timeout, on_chunk, keep_body, on_upload)
+    if engine == "pooled":
+        return _send_pooled(prepared, timeout, pool or _pool, on_chunk, keep_body, on_upload)
+    raise ValueError(f"Unknown engine: {engine}")
@@ -0,0 +1,213 @@
+import gzip
+import io
+import json
+from urllib.parse import quote
+
+from .engine import BODY_METHODS
+from .importer import HTTP_METHODS
+from .model import split_base
+
+POSTMAN_SCHEMA = "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
+OPENAPI_VERSION = "3.0.3"
+
+# Export formats and the file names they are offered under
+EXPORT_FORMATS = {
+    "postman": "api_collection.postman_collection.json",
+    "openapi": "api_collection.openapi.json",
+    "jsonl": "api_collection.jsonl",
+}
+# First line of a JSONL export, which is how the importer recognizes one
+JSONL_HEADER = {"format": "pingstream-collection", "version": 1}
+# Methods exported to OpenAPI: only those the importer reads back
+OPENAPI_METHODS = HTTP_METHODS
+
+
+def _has_body(request):
+    """Whether a body is worth exporting: always for POST/PUT/PATCH, otherwise unless it is the default"""
+    return request.method in BODY_METHODS or request.body != "{}"
+
+
+def _quote(text):
+    # {{variables}} are left for Postman to fill in
+    return quote(text, safe="/{}")
+
+
+def _query_string(params):
+    return "&".join(f"{_quote(key)}={_quote(value)}" for key, value in params)
+
+
+def _postman_url(request):
+    """A plain URL, or a URL object with the query params listed, as Postman writes them
+
+    Keys and values are percent-encoded, as in the raw URL. Params without
+    a value are not sent, so they are listed disabled.
+    """
+    if not request.params:
+        return request.url
+    sent = [(key, value) for key, value in request.params if key and value]
+    separator = "&" if "?" in request.url else "?"
+    return {
+        "raw": request.url + separator + _query_string(sent) if sent else request.url,
+        "query": [
+            {"key": _quote(key), "value": _quote(value)} if key and value else {"key": _quote(key), "value": value, "disabled": True}
+            for key, value in request.params
+        ],
+    }
+
+
+def _postman_item(request):
+    """Postman item for one request"""
+    item_request = {
+        "method": request.method,
+        "url": _postman_url(request),
+        "header": [{"key": key, "value": value} for key, value in request.headers if key],
+    }
+    if _has_body(request):
+        item_request["body"] = {
+            "mode": "raw",
+            "raw": request.body,
+            "options": {
+                "raw": {
+                    "language": "json"
+                }
+            }
+        }
+    return {"name": request.name, "request": item_request}
+
+
+def _write_postman(collections, out, name):
+    # A Postman v2.1 collection with one folder per collection, one item per line
+    out.write('{"info": ' + json.dumps({"name": name, "schema": POSTMAN_SCHEMA}) + ', "item": [')
+    written = 0
+    for i, collection in enumerate(collections):
+        out.write((",\n" if i else "\n") + '{"name": ' + json.dumps(collection.name) + ', "item": [')
+        for j, request in enumerate(collection.requests):
+            out.write((",\n" if j else "\n") + json.dumps(_postman_item(request)))
+            written += 1
+        out.write("\n]}")
+    out.write("\n]}\n")
+    return written
+
+
+def _body_example(body):
+    """A body as an OpenAPI example: parsed when the importer would print it back the same way
+
+    Only objects and arrays are parsed; the importer takes any string
+    example as the body itself, so a body holding a JSON string or number
+    stays a string.
+    """
+    try:
+        value = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(value, (dict, list)) and json.dumps(value, indent=2) == body:
+        return value
+    return body
+
+
+def _openapi_operation(folder, request, path, examples):
+    operation = {"tags": [folder], "summary": request.name}
+    if request.operation_id:
+        operation["operationId"] = request.operation_id
+    parameters = []
+    for location, pairs in (("query", request.params), ("header", request.headers)):
+        for key, value in pairs:
+            parameter = {"name": key, "in": location, "schema": {"type": "string"}}
+            if value:
+                parameter["example"] = value
+            parameters.append(parameter)
+    if "{" in path:
+        # Path templates are written as they are; they only need declaring
+        parameters.extend(
+            {"name": segment[1:-1], "in": "path", "required": True, "schema": {"type": "string"}}
+            for segment in path.split("/")
+            if segment.startswith("{") and segment.endswith("}") and not segment.startswith("{{")
+        )
+    if parameters:
+        operation["parameters"] = parameters
+    if _has_body(request):
+        # Bodies repeat a lot, and checking one means an indented json.dumps()
+        if request.body not in examples:
+            examples[request.body] = _body_example(request.body)
+        operation["requestBody"] = {"content": {"application/json": {"example": examples[request.body]}}}
+    return operation
+
+
+def _write_openapi(collections, out, name):
+    # Operations are grouped by path first; only references are held
+    paths = {}
+    for collection in collections:
+        for request in collection.requests:
+            base, path = split_base(request.url)
+            paths.setdefault(path or "/", []).append((collection.name, request, base))
+
+    out.write(json.dumps({"openapi": OPENAPI_VERSION, "info": {"title": name, "version": "1.0.0"}})[:-1] + ', "paths": {')
+    written = 0
+    examples = {}
+    for path, operations in paths.items():
+        path_item = {}
+        for folder, request, base in operations:
+            method = request.method.lower()
+            # OpenAPI has one operation per path and method; later duplicates are left out
+            if method not in OPENAPI_METHODS or method in path_item:
+                continue
+            operation = _openapi_operation(folder, request, path, examples)
+            if base:
+                operation["servers"] = [{"url": base}]
+            path_item[method] = operation
+            written += 1
+        if path_item:
+            out.write((",\n" if written > len(path_item) else "\n") + json.dumps(path) + ": " + json.dumps(path_item))
+    out.write("\n}}\n")
+    return written
+
+
+def _write_jsonl(collections, out, name):
+    out.write(json.dumps(dict(JSONL_HEADER, name=name)) + "\n")
+    written = 0
+    for collection in collections:
+        for request in collection.requests:
+            out.write(json.dumps([
+                collection.name,
+                request.name,
+                request.method,
+                request.url,
+                request.headers,
+                request.params,
+                request.body,
+                request.operation_id,
+            ]) + "\n")
+            written += 1
+    return written
+
+
+_WRITERS = {
+    "postman": _write_postman,
+    "openapi": _write_openapi,
+    "jsonl": _write_jsonl,
+}
+
+
+def export_collections(collections, fileobj, export_format="postman", name="Exported API Collection", compress=False):
+    """Write collections to a binary file in one of EXPORT_FORMATS and return how many requests were written
+
+    Requests are serialized one at a time, so the whole document is never
+    held in memory. With `compress` the output is gzipped. Importing the
+    result gives back the same folders and requests. JSONL keeps every
+    field; Postman has no operation ids, and OpenAPI holds one request per
+    path and method, so duplicates are left out of it.
+    """
+    if export_format not in _WRITERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    # mtime=0 makes the same export give the same bytes
+    raw = gzip.GzipFile(fileobj=fileobj, mode="wb", mtime=0) if compress else fileobj
+    out = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+    try:
+        written = _WRITERS[export_format](collections, out, name)
+        out.flush()
+    finally:
+        # Leave the caller's file open
+        out.detach()
+        if compress:
+            raw.close()
+    return written
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Where history, stored bodies and other local state live
+PINGSTREAM_HOME = os.environ.get("PINGSTREAM_HOME") or os.path.join(os.path.expanduser("~"), ".pingstream")
+
+# Larger bodies are recorded without their content
+MAX_STORED_BODY = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER,
+    total_ms REAL,
+    request TEXT NOT NULL,
+    response TEXT,
+    timings TEXT,
+    body_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS history_created ON history (created);
+-- URL search matches anywhere in the URL, which no index can serve
+DROP INDEX IF EXISTS history_url;
+CREATE INDEX IF NOT EXISTS history_method ON history (method, id);
+CREATE INDEX IF NOT EXISTS history_status ON history (status, id);
+"""
+
+# Filters for the status column, as SQL conditions
+STATUS_FILTERS = {
+    "2xx": "status BETWEEN 200 AND 299",
+    "3xx": "status BETWEEN 300 AND 399",
+    "4xx": "status BETWEEN 400 AND 499",
+    "5xx": "status BETWEEN 500 AND 599",
+    "Failed": "status IS NULL",
+}
+
+
+class HistoryStore:
+    """Request history in SQLite, with response bodies stored by content hash
+
+    Each entry keeps the full request (headers, params, body), response
+    metadata and timings. Bodies are written once under bodies/ named by
+    their SHA-256, so repeated identical responses share one file.
+    """
+
+    def __init__(self, home=None):
+        self.home = home or PINGSTREAM_HOME
+        self.bodies_dir = os.path.join(self.home, "bodies")
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Streamlit runs each rerun on its own thread, so share one
+        # connection and serialize access ourselves
+        self._db = sqlite3.connect(os.path.join(self.home, "history.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _store_body(self, body):
+        """Copy a ResponseBody into content-addressed storage and return its hash"""
+        if body.size > MAX_STORED_BODY:
+            return None
+        digest = hashlib.sha256()
+        source = body.open()
+        with tempfile.NamedTemporaryFile(dir=self.bodies_dir, delete=False) as tmp_file:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp_file.write(chunk)
+
+        body_hash = digest.hexdigest()
+        path = self.body_path(body_hash)
+        if os.path.exists(path):
+            os.unlink(tmp_file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_file.name, path)
+        return body_hash
+
+    def body_path(self, body_hash):
+        return os.path.join(self.bodies_dir, body_hash[:2], body_hash[2:])
+
+    def record(self, request, response=None, error=None):
+        """Add a sent request and its response (or error) and return the entry id
+
+        `request` holds the form fields: method, url, headers, params and body.
+        """
+        body_hash = None
+        meta = {"error": error}
+        timings = None
+        if response is not None:
+            body_hash = self._store_body(response["body"])
+            timings = response["timings"]
+            meta = {
+                "reason": response["reason"],
+                "http_version": response["http_version"],
+                "headers": response["headers"],
+                "size": response["body"].size,
+                "bytes_up": response["bytes_up"],
+                "bytes_down": response["bytes_down"],
+                "reused": response["reused"],
+                "engine": response["engine"],
+            }
+
+        row = (
+            time.time(),
+            request["method"],
+            request["url"],
+            response["status"] if response is not None else None,
+            timings["total"] if timings else None,
+            json.dumps({key: request[key] for key in ("headers", "params", "body")}),
+            json.dumps(meta),
+            json.dumps(timings) if timings else None,
+            body_hash,
+        )
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO history (created, method, url, status, total_ms, request, response, timings, body_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+        return cursor.lastrowid
+
+    def search(self, url_contains=None, method=None, status=None, before_id=None, limit=50):
+        """List entries newest first, without their request and response details
+
+        `status` is one of the STATUS_FILTERS keys. Pass the id of the last
+        entry of a page as `before_id` to fetch the next page.
+        """
+        conditions = []
+        args = []
+        if url_contains:
+            # A scan, newest first, that stops once `limit` entries match
+            conditions.append("instr(url, ?) > 0")
+            args.append(url_contains)
+        if method:
+            conditions.append("method = ?")
+            args.append(method)
+        if status:
+            conditions.append(STATUS_FILTERS[status])
+        if before_id is not None:
+            conditions.append("id < ?")
+            args.append(before_id)
+
+        sql = "SELECT id, created, method, url, status, total_ms FROM history"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [
+            {"id": row[0], "created": row[1], "method": row[2], "url": row[3], "status": row[4], "total_ms": row[5]}
+            for row in rows
+        ]
+
+    def get(self, entry_id):
+        """Return one entry with its full request, response metadata and timings"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, created, method, url, status, total_ms, request, response, timings, body_hash FROM history WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        request = json.loads(row[6])
+        request.update({"method": row[2], "url": row[3]})
+        return {
+            "id": row[0],
+            "created": row[1],
+            "status": row[4],
+            "total_ms": row[5],
+            "request": request,
+            "response": json.loads(row[7]) if row[7] else None,
+            "timings": json.loads(row[8]) if row[8] else None,
+            "body_hash": row[9],
+        }
+
+    def open_body(self, body_hash):
+        """Open a stored response body for reading, or return None if it is gone"""
+        try:
+            return open(self.body_path(body_hash), "rb")
+        except (OSError, TypeError):
+            return None
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def clear(self):
+        """Delete every entry; stored bodies are left for clear_bodies()"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM history")
+
+    def clear_bodies(self):
+        """Delete stored bodies no entry refers to"""
+        with self._lock:
+            referenced = {row[0] for row in self._db.execute("SELECT DISTINCT body_hash FROM history WHERE body_hash IS NOT NULL")}
+        for prefix in os.listdir(self.bodies_dir):
+            directory = os.path.join(self.bodies_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if prefix + name not in referenced:
+                    os.unlink(os.path.join(directory, name))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the shared history store, opening it on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
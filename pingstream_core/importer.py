@@ -0,0 +1,292 @@
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+
+from .jsonstream import JsonStream
+from .model import Collection, Request
+from .profiler import profiled
+
+HTTP_METHODS = ['get', 'post', 'put', 'delete', 'patch']
+
+# Parsed imports kept by content hash, so re-importing a file is free
+IMPORT_CACHE_SIZE = 4
+_import_cache = OrderedDict()
+
+
+def _add_request(folders, folder, request):
+    """Append a request to its folder, creating the folder on first use"""
+    collection = folders.get(folder)
+    if collection is None:
+        collection = folders[folder] = Collection(folder)
+    collection.requests.append(request)
+
+
+def _sample_body(properties):
+    """Same text as json.dumps({prop: ""}, indent=2), without the slow pure-Python indenting encoder"""
+    if not properties:
+        return "{}"
+    return "{\n" + ",\n".join(f'  {json.dumps(prop)}: ""' for prop in properties) + "\n}"
+
+
+def _example_text(parameter):
+    """A parameter's example as form text, or "" without one"""
+    example = parameter.get('example')
+    if example is None:
+        return ""
+    return example if isinstance(example, str) else json.dumps(example)
+
+
+def _openapi_request(path, method, operation, shared):
+    """Build a request from one OpenAPI operation"""
+    # Get summary/description
+    name = operation.get('summary', path)
+    if not name or name == path:
+        name = operation.get('operationId', path)
+
+    # Extract query parameters and headers
+    params = []
+    headers = []
+    for param in operation.get('parameters', []):
+        if param['in'] == 'query':
+            params.append((param['name'], _example_text(param)))
+        elif param['in'] == 'header':
+            headers.append((param['name'], _example_text(param)))
+
+    # Extract request body schema if exists
+    body = "{}"
+    if 'requestBody' in operation and 'content' in operation['requestBody']:
+        if 'application/json' in operation['requestBody']['content']:
+            media = operation['requestBody']['content']['application/json']
+            schema = media.get('schema', {})
+            if 'example' in media:
+                example = media['example']
+                body = example if isinstance(example, str) else json.dumps(example, indent=2)
+            # Generate a sample body based on schema (simplified)
+            elif 'properties' in schema:
+                body = _sample_body(schema['properties'])
+
+    # An operation-level server, as exports write for absolute URLs, prefixes the path
+    servers = operation.get('servers')
+    url = servers[0]['url'] + path if servers else path
+
+    return Request(name, method.upper(), url, headers, params, body, operation.get('operationId'), shared)
+
+
+def _add_openapi_path(folders, path, path_data, shared):
+    """Add every supported operation of one OpenAPI path item"""
+    for method, operation in path_data.items():
+        if method.lower() in HTTP_METHODS:
+            # Get tag as folder name (if exists)
+            folder = 'Default'
+            if 'tags' in operation and operation['tags']:
+                folder = operation['tags'][0]
+            _add_request(folders, folder, _openapi_request(path, method, operation, shared))
+
+
+def _postman_request(item, shared):
+    """Build a request from one Postman collection item"""
+    # Extract URL
+    url = ""
+    params = None
+    if isinstance(item['request']['url'], dict):
+        url = item['request']['url'].get('raw', '')
+        query = item['request']['url'].get('query') or []
+        if query:
+            # Listed query params with a value become params, and come off
+            # the raw URL. Params without one are never sent, so an enabled
+            # empty one (?flag=) stays on the URL and a disabled one is kept
+            params = []
+            bare = []
+            for q in query:
+                if q.get('value'):
+                    if not q.get('disabled'):
+                        params.append((q['key'], q['value']))
+                elif q.get('disabled'):
+                    params.append((q['key'], ""))
+                else:
+                    bare.append(q['key'] if q.get('value') is None else q['key'] + "=")
+            base, _, raw_query = url.partition('?')
+            listed = "&".join(
+                q['key'] if q.get('value') is None else f"{q['key']}={q['value']}"
+                for q in query
+                if not q.get('disabled')
+            )
+            kept = [raw_query[:-len(listed) - 1]] if raw_query.endswith("&" + listed) else []
+            url = base + "?" + "&".join(kept + bare) if kept or bare else base
+    else:
+        url = item['request']['url']
+
+    # Extract headers
+    headers = []
+    for header in item['request'].get('header', []):
+        headers.append((header['key'], header.get('value', '')))
+
+    # Extract body
+    body = "{}"
+    if 'body' in item['request'] and item['request']['body']:
+        if 'raw' in item['request']['body']:
+            body = item['request']['body']['raw']
+
+    return Request(item['name'], item['request']['method'], url, headers, params, body, None, shared)
+
+
+def _add_postman_items(folders, items, parent_name=None, shared=None):
+    for item in items:
+        if 'request' in item:
+            # This is a request
+            _add_request(folders, parent_name or 'Default', _postman_request(item, shared))
+        elif 'item' in item:
+            # This is a folder
+            _add_postman_items(folders, item['item'], item['name'], shared)
+
+
+@profiled("parse_openapi_spec")
+def parse_openapi_spec(data):
+    """Parse OpenAPI specification to extract endpoints"""
+    # Folders are indexed by name; dicts keep them in first-seen order
+    folders = {}
+    # Identical bodies and header/param lists are stored once per import
+    shared = {}
+
+    # Check if it's OpenAPI format
+    if 'openapi' in data and 'paths' in data:
+        for path, path_data in data['paths'].items():
+            _add_openapi_path(folders, path, path_data, shared)
+
+    # Check if it's a Postman collection
+    elif 'info' in data and 'item' in data:
+        _add_postman_items(folders, data['item'], shared=shared)
+
+    return list(folders.values())
+
+
+def _stream_postman_items(stream, folders, shared, parent_name=None):
+    """Add the Postman items of the array starting here, one item at a time"""
+    for _ in stream.iter_array():
+        item = {}
+        for key in stream.iter_object():
+            if key == 'item' and 'name' in item:
+                # Folders are streamed too, since one folder can hold everything
+                _stream_postman_items(stream, folders, shared, item['name'])
+                item['item'] = []
+            else:
+                item[key] = stream.read_value()
+        _add_postman_items(folders, [item], parent_name, shared)
+
+
+@profiled("stream_collections")
+def _stream_collections(stream, progress=None, total=None):
+    """Parse a JSON OpenAPI spec or Postman collection from a JsonStream
+
+    Only one path item or Postman item is materialized at a time, and
+    top-level members that are not needed (such as components) are skipped.
+    """
+    if stream.peek() != "{":
+        return []
+
+    openapi_folders = {}
+    postman_folders = {}
+    shared = {}
+    seen = set()
+    # Progress is only reported when another chunk has been read
+    reported = 0
+    for key in stream.iter_object():
+        seen.add(key)
+        if key == 'paths':
+            for path in stream.iter_object():
+                _add_openapi_path(openapi_folders, path, stream.read_value(), shared)
+                if progress is not None and stream.bytes_read != reported:
+                    reported = stream.bytes_read
+                    progress(reported, total)
+        elif key == 'item':
+            _stream_postman_items(stream, postman_folders, shared)
+        else:
+            stream.skip_value()
+        if progress is not None and stream.bytes_read != reported:
+            reported = stream.bytes_read
+            progress(reported, total)
+
+    if 'openapi' in seen and 'paths' in seen:
+        return list(openapi_folders.values())
+    if 'info' in seen and 'item' in seen:
+        return list(postman_folders.values())
+    return []
+
+
+@profiled("jsonl_collections")
+def _jsonl_collections(fileobj, progress=None, total=None):
+    """Parse a JSONL export: a header line, then one request per line
+
+    Each request line is a JSON array of folder, name, method, url,
+    headers, params, body and operation id (see exporter._write_jsonl).
+    """
+    lines = iter(fileobj)
+    header = json.loads(next(lines, b"{}"))
+    if header.get('format') != 'pingstream-collection':
+        return []
+
+    folders = {}
+    shared = {}
+    for number, line in enumerate(lines, 2):
+        if not line.strip():
+            continue
+        folder, name, method, url, headers, params, body, operation_id = json.loads(line)
+        _add_request(folders, folder, Request(name, method, url, headers, params, body, operation_id, shared))
+        if progress is not None and number % 10000 == 0:
+            progress(fileobj.tell(), total)
+    return list(folders.values())
+
+
+@profiled("file_digest")
+def file_digest(fileobj):
+    """SHA-256 of a file object's content; the file is rewound afterwards"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    while True:
+        chunk = fileobj.read(1024 * 1024)
+        if not chunk:
+            break
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+@profiled("import_collection")
+def import_collection(fileobj, filename, progress=None):
+    """Parse an uploaded OpenAPI spec, Postman collection or JSONL export
+
+    JSON is streamed; YAML has to be loaded whole. Files ending in .gz are
+    decompressed as they are read. Results are cached by content hash, and
+    each call returns fresh folders and requests, with new ids, so callers
+    can merge and edit them freely.
+    `progress(bytes_read, total_bytes)` is called as the file is read.
+    """
+    digest = file_digest(fileobj)
+    if digest in _import_cache:
+        _import_cache.move_to_end(digest)
+    else:
+        fileobj.seek(0, 2)
+        total = fileobj.tell()
+        fileobj.seek(0)
+        source = fileobj
+        if filename.endswith('.gz'):
+            filename = filename[:-3]
+            source = gzip.GzipFile(fileobj=fileobj, mode="rb")
+            if progress is not None:
+                # Report the position in the compressed file, which `total` measures
+                report = progress
+                progress = lambda done, total: report(fileobj.tell(), total)
+        if filename.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.load(source, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+            collections = parse_openapi_spec(data) if isinstance(data, dict) else []
+        elif filename.endswith('.jsonl'):
+            collections = _jsonl_collections(source, progress, total)
+        else:
+            collections = _stream_collections(JsonStream(source), progress, total)
+        _import_cache[digest] = collections
+        while len(_import_cache) > IMPORT_CACHE_SIZE:
+            _import_cache.popitem(last=False)
+
+    return [Collection(c.name, [request.copy() for request in c.requests]) for c in _import_cache[digest]]
@@ -0,0 +1,152 @@
+import re
+from array import array
+from bisect import bisect_left
+
+METHODS = {"GET", "POST", "PUT", "DELETE", "PATCH"}
+
+# Path parameters in OpenAPI ({id}), Postman (:id) and variable ({{base}}) form
+_path_param = re.compile(r"\{\{[^}]*\}\}|\{[^}]*\}|(?<=/):[A-Za-z_]\w*")
+_word = re.compile(r"\{\}|[A-Za-z0-9]+")
+_camel = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+# Scores for how a query token matched an indexed token
+EXACT, PREFIX, FUZZY = 3, 2, 1
+PHRASE_BONUS = 5
+MAX_PREFIX_MATCHES = 200
+
+
+def normalize_path(url):
+    """Path of a URL with every path parameter written as {}"""
+    path = url
+    if "://" in path or path.startswith("{{"):
+        # Drop the scheme and host, or a Postman {{baseUrl}} variable
+        rest = path.split("://", 1)[-1]
+        path = "/" + rest.split("/", 1)[1] if "/" in rest else "/"
+    path = path.split("?", 1)[0].split("#", 1)[0]
+    return _path_param.sub("{}", path)
+
+
+def tokenize(text):
+    """Lowercase words of `text`, with camelCase words also split into parts"""
+    tokens = []
+    for word in _word.findall(_path_param.sub("{}", text)):
+        tokens.append(word.lower())
+        parts = _camel.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def _trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EndpointIndex:
+    """Search index over imported collections
+
+    Every request is indexed by method, path segments, folder (the OpenAPI
+    tag), operationId and name. Query words match indexed words exactly,
+    by prefix, or fuzzily by shared trigrams, and every word has to match.
+    A query containing a path such as "orders/{id}" also ranks endpoints
+    whose path contains it first.
+
+    Endpoints are numbered in collection order and kept in parallel lists;
+    postings are arrays of those numbers rather than lists of ints.
+    """
+
+    def __init__(self, collections):
+        self.requests = []
+        self.folders = []
+        self.paths = []
+        self._postings = {}
+        for collection in collections:
+            folder_words = set(tokenize(collection.name))
+            for request in collection.requests:
+                entry_id = len(self.requests)
+                path = normalize_path(request.url)
+                self.requests.append(request)
+                self.folders.append(collection.name)
+                self.paths.append(path)
+
+                words = set(tokenize(path))
+                words.add(request.method.lower())
+                words.update(folder_words)
+                words.update(tokenize(request.name))
+                if request.operation_id:
+                    words.update(tokenize(request.operation_id))
+                for word in words:
+                    postings = self._postings.get(word)
+                    if postings is None:
+                        postings = self._postings[word] = array("I")
+                    postings.append(entry_id)
+
+        self._vocabulary = sorted(self._postings)
+        self._trigram_index = {}
+        for word in self._vocabulary:
+            if len(word) >= 3:
+                for trigram in _trigrams(word):
+                    self._trigram_index.setdefault(trigram, []).append(word)
+
+    def __len__(self):
+        return len(self.requests)
+
+    def entry(self, entry_id):
+        """The endpoint numbered `entry_id`, as a dict of id, folder, request and path"""
+        return {"id": entry_id, "folder": self.folders[entry_id], "request": self.requests[entry_id], "path": self.paths[entry_id]}
+
+    def _match_word(self, word):
+        """Indexed words matching a query word, with how well they match"""
+        matches = {}
+        start = bisect_left(self._vocabulary, word)
+        for candidate in self._vocabulary[start:start + MAX_PREFIX_MATCHES]:
+            if not candidate.startswith(word):
+                break
+            matches[candidate] = EXACT if candidate == word else PREFIX
+
+        if len(word) >= 3:
+            query_trigrams = _trigrams(word)
+            shared = {}
+            for trigram in query_trigrams:
+                for candidate in self._trigram_index.get(trigram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            for candidate, count in shared.items():
+                # Dice coefficient of the two trigram sets
+                if candidate not in matches and 2 * count / (len(query_trigrams) + len(candidate)) >= 0.5:
+                    matches[candidate] = FUZZY
+        return matches
+
+    def search(self, query):
+        """Numbers of the endpoints matching every word of the query, best first"""
+        words = tokenize(query)
+        methods = {word.upper() for word in words if word.upper() in METHODS}
+        words = [word for word in words if word.upper() not in METHODS]
+
+        scores = None
+        for word in dict.fromkeys(words):
+            word_scores = {}
+            for candidate, score in self._match_word(word).items():
+                for entry_id in self._postings[candidate]:
+                    if word_scores.get(entry_id, 0) < score:
+                        word_scores[entry_id] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {entry_id: total + word_scores[entry_id] for entry_id, total in scores.items() if entry_id in word_scores}
+            if not scores:
+                return []
+
+        if scores is None:
+            if not methods:
+                return []
+            scores = {entry_id: 0 for entry_id in range(len(self.requests))}
+        if methods:
+            scores = {entry_id: score for entry_id, score in scores.items() if self.requests[entry_id].method in methods}
+
+        if "/" in query:
+            phrase = normalize_path(query.strip().split()[-1]).strip("/").lower()
+            for entry_id in scores:
+                if phrase and phrase in self.paths[entry_id].lower():
+                    scores[entry_id] += PHRASE_BONUS
+
+        return sorted(scores, key=lambda entry_id: (-scores[entry_id], entry_id))
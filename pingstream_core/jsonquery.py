@@ -0,0 +1,461 @@
+import json
+import re
+
+from .jsonstream import JsonStream
+from .profiler import profiled
+
+# Steps of a compiled path are tuples:
+#   ("child", names)              object members by name
+#   ("index", indexes)            array elements by position
+#   ("slice", start, stop, step)  array elements in a range; stop may be None
+#   ("wild",)                     every member or element
+#   ("filter", predicate)         every member or element the predicate accepts
+#   ("descend", step)             `step` applied at any depth below
+# While a path is evaluated, ("test", predicate) stands for a filter that
+# still has to be checked against the node it was carried down to.
+
+_NAME = re.compile(r"[A-Za-z_$][A-Za-z0-9_$-]*")
+_INTEGER = re.compile(r"-?\d+")
+_COMPARISON = re.compile(r"(==|!=|<=|>=|<|>)")
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+_MISSING = object()
+
+
+def _split_outside_quotes(text, separator):
+    """Split on `separator` where it is not inside a quoted string or brackets"""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif depth == 0 and text.startswith(separator, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _literal(text):
+    """A filter's right-hand side: a JSON literal, or a string in single quotes"""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return text[1:-1].replace("\\'", "'")
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise ValueError(f"Cannot read {text!r} in a filter; quote strings") from None
+
+
+def _getter(text):
+    """Compile `@`, `@.a.b` or `@['a'][0]` into a function of the current node"""
+    text = text.strip()
+    if not text.startswith("@"):
+        raise ValueError(f"Filters compare a path starting with @, not {text!r}")
+    steps = compile_path("$" + text[1:])
+    for step in steps:
+        if step[0] not in ("child", "index") or len(step[1]) != 1:
+            raise ValueError(f"Filter paths take plain names and indexes: {text!r}")
+    keys = [step[1][0] for step in steps]
+
+    def get(value):
+        for key in keys:
+            if isinstance(key, str) and isinstance(value, dict) and key in value:
+                value = value[key]
+            elif isinstance(key, int) and isinstance(value, list) and key < len(value):
+                value = value[key]
+            else:
+                return _MISSING
+        return value
+    return get
+
+
+def _comparison(text):
+    # The operator is the first one outside a quoted string
+    match = None
+    quote = None
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        else:
+            match = _COMPARISON.match(text, i)
+            if match:
+                break
+    if match is None:
+        # Existence: @.field is present (and not null)
+        get = _getter(text)
+        return lambda value: get(value) not in (_MISSING, None)
+    left, operator, right = text[:match.start()], match.group(), text[match.end():]
+    get, compare, expected = _getter(left), _OPERATORS[operator], _literal(right)
+
+    def test(value):
+        found = get(value)
+        if found is _MISSING:
+            return False
+        if isinstance(found, bool) != isinstance(expected, bool):
+            # true is not 1 in JSON, though it is in Python
+            return operator == "!="
+        try:
+            return compare(found, expected)
+        except TypeError:
+            # Ordering a string against a number, say
+            return False
+    return test
+
+
+def _predicate(text):
+    """Compile a filter body: comparisons joined by && and ||"""
+    alternatives = []
+    for alternative in _split_outside_quotes(text, "||"):
+        alternatives.append([_comparison(term) for term in _split_outside_quotes(alternative, "&&")])
+    if len(alternatives) == 1 and len(alternatives[0]) == 1:
+        # The usual single comparison, called once per element
+        return alternatives[0][0]
+    return lambda value: any(all(test(value) for test in terms) for terms in alternatives)
+
+
+def _bracket(text):
+    """Compile what is inside [ ] into one step"""
+    text = text.strip()
+    if text == "*":
+        return ("wild",)
+    if text.startswith("?"):
+        body = text[1:].strip()
+        if not (body.startswith("(") and body.endswith(")")):
+            raise ValueError(f"Filters are written [?(...)], not [{text}]")
+        return ("filter", _predicate(body[1:-1]))
+    if ":" in text and not text.startswith(("'", '"')):
+        parts = [part.strip() for part in text.split(":")]
+        if len(parts) > 3:
+            raise ValueError(f"Bad slice [{text}]")
+        start, stop, step = (parts + [""] * 3)[:3]
+        numbers = [int(part) if part else None for part in (start, stop, step)]
+        if any(number is not None and number < 0 for number in numbers):
+            raise ValueError("Negative indexes need the array's length, which a streaming query does not know")
+        return ("slice", numbers[0] or 0, numbers[1], numbers[2] or 1)
+    items = [item.strip() for item in _split_outside_quotes(text, ",")]
+    if all(_INTEGER.fullmatch(item) for item in items):
+        indexes = tuple(int(item) for item in items)
+        if any(index < 0 for index in indexes):
+            raise ValueError("Negative indexes need the array's length, which a streaming query does not know")
+        return ("index", indexes)
+    names = []
+    for item in items:
+        if len(item) >= 2 and item[0] == item[-1] and item[0] in "'\"":
+            names.append(item[1:-1])
+        else:
+            raise ValueError(f"Quote member names in brackets: [{text}]")
+    return ("child", tuple(names))
+
+
+def compile_path(expression):
+    """Compile a JSONPath expression into a tuple of steps
+
+    Supported: `$`, `.name`, `['name', 'other']`, `[0]`, `[0,2]`,
+    `[start:stop:step]`, `*`, recursive descent (`..name`, `..*`,
+    `..[0]`) and filters such as `[?(@.price > 10 && @.tags)]`. The
+    leading `$` may be left out. Negative indexes are not supported, as
+    they depend on the length of an array that has not been read yet.
+    """
+    text = expression.strip()
+    if text.startswith("$"):
+        text = text[1:]
+    elif text and text[0] not in ".[":
+        text = "." + text
+    steps = []
+    i = 0
+    while i < len(text):
+        descend = text.startswith("..", i)
+        if descend:
+            i += 2
+        elif text[i] == ".":
+            i += 1
+        elif text[i] != "[":
+            raise ValueError(f"Unexpected {text[i]!r} at position {i + 1} of {expression!r}")
+
+        if i < len(text) and text[i] == "[":
+            depth, quote, end = 0, None, i
+            while end < len(text):
+                char = text[end]
+                if quote:
+                    if char == "\\":
+                        end += 1
+                    elif char == quote:
+                        quote = None
+                elif char in "'\"":
+                    quote = char
+                elif char == "[":
+                    depth += 1
+                elif char == "]":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            if end >= len(text):
+                raise ValueError(f"Unclosed [ in {expression!r}")
+            step = _bracket(text[i + 1:end])
+            i = end + 1
+        elif text.startswith("*", i):
+            step = ("wild",)
+            i += 1
+        else:
+            match = _NAME.match(text, i)
+            if match is None:
+                raise ValueError(f"Expected a name at position {i + 1} of {expression!r}")
+            step = ("child", (match.group(),))
+            i = match.end()
+        steps.append(("descend", step) if descend else step)
+    return tuple(steps)
+
+
+def _selects(step, key):
+    kind = step[0]
+    if kind == "wild":
+        return True
+    if kind == "child":
+        return isinstance(key, str) and key in step[1]
+    if isinstance(key, str):
+        return False
+    if kind == "index":
+        return key in step[1]
+    if kind == "slice":
+        _, start, stop, every = step
+        return key >= start and (stop is None or key < stop) and (key - start) % every == 0
+    return False
+
+
+def _by_position(step):
+    if step[0] == "descend":
+        step = step[1]
+    return step[0] in ("index", "slice")
+
+
+def _advance(states, key):
+    """The states that carry on to the member or element `key`"""
+    carried = {}
+    for steps in states:
+        step = steps[0]
+        if step[0] == "descend":
+            # Keep looking further down, and try the step on this child
+            carried[steps] = None
+            step = step[1]
+        if step[0] == "filter":
+            carried[(("test", step[1]),) + steps[1:]] = None
+        elif _selects(step, key):
+            carried[steps[1:]] = None
+    return tuple(carried)
+
+
+def _settle(states, value):
+    """Check pending filters against a node: whether it matches, and the states left for its children"""
+    matched = False
+    pending = []
+    queue = list(states)
+    while queue:
+        steps = queue.pop()
+        if not steps:
+            matched = True
+        elif steps[0][0] == "test":
+            if steps[0][1](value):
+                queue.append(steps[1:])
+        else:
+            pending.append(steps)
+    return matched, tuple(pending)
+
+
+def _walk_value(value, states, path):
+    matched, states = _settle(states, value)
+    if matched:
+        yield path, value
+    if not states:
+        return
+    step = states[0][0] if len(states) == 1 else None
+    if step is not None and step[0] in ("child", "index") and len(step[1]) == 1:
+        # A single name or index is looked up rather than searched for
+        key = step[1][0]
+        if isinstance(value, dict) and isinstance(key, str) and key in value:
+            yield from _walk_value(value[key], (states[0][1:],), path + (key,))
+        elif isinstance(value, list) and isinstance(key, int) and key < len(value):
+            yield from _walk_value(value[key], (states[0][1:],), path + (key,))
+        return
+    if isinstance(value, dict):
+        children = value.items()
+    elif isinstance(value, list):
+        children = enumerate(value)
+    else:
+        return
+    for key, child in children:
+        carried = _advance(states, key)
+        if carried:
+            yield from _walk_value(child, carried, path + (key,))
+
+
+def _walk_stream(stream, states, path):
+    if any(not steps or steps[0][0] == "test" for steps in states):
+        # The node is a match or has to be tested: only now is it built
+        yield from _walk_value(stream.read_value(), states, path)
+        return
+    found, value = stream.read_buffered()
+    if found:
+        # Small enough to be in the buffer already: built at C speed
+        yield from _walk_value(value, states, path)
+        return
+    kind = stream.peek()
+    if kind == "{":
+        for key in stream.iter_object():
+            carried = _advance(states, key)
+            if carried:
+                yield from _walk_stream(stream, carried, path + (key,))
+            else:
+                stream.skip_value()
+    elif kind == "[":
+        # Unless a state picks elements by position, every element gets the same states
+        uniform = not any(_by_position(steps[0]) for steps in states)
+        carried = _advance(states, 0) if uniform else None
+        for index, _ in enumerate(stream.iter_array()):
+            if not uniform:
+                carried = _advance(states, index)
+            if carried:
+                yield from _walk_stream(stream, carried, path + (index,))
+            else:
+                stream.skip_value()
+    else:
+        stream.skip_value()
+
+
+def _most_matches(steps):
+    """How many nodes a path can match at most, or None when unbounded"""
+    most = 1
+    for step in steps:
+        if step[0] in ("child", "index"):
+            most *= len(step[1])
+        elif step[0] == "slice" and step[2] is not None:
+            _, start, stop, every = step
+            most *= max(0, -(-(stop - start) // every))
+        else:
+            return None
+    return most
+
+
+def format_path(path):
+    """A path of keys and indexes as JSONPath: $.items[3]['first name']"""
+    parts = ["$"]
+    for key in path:
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+        elif _NAME.fullmatch(key):
+            parts.append(f".{key}")
+        else:
+            parts.append("[" + json.dumps(key) + "]")
+    return "".join(parts)
+
+
+@profiled("query_json")
+def query_json(fileobj, expression, limit=None):
+    """Yield (path, value) for each node of a JSON document matching a JSONPath expression
+
+    The document is read incrementally from `fileobj`: members that cannot
+    match are skipped without being built, and only matched nodes (and
+    the elements a filter has to look at, one at a time) are parsed into
+    Python values, except that values already in the read buffer are
+    built whole, which is quicker than walking them. Paths are tuples of
+    keys and indexes, in document order. Stops after `limit` matches.
+    """
+    steps = compile_path(expression)
+    # A path without wildcards, filters or descent stops as soon as it is done
+    most = _most_matches(steps)
+    if most is not None and (limit is None or most < limit):
+        limit = most
+    if limit == 0:
+        return
+    stream = JsonStream(fileobj)
+    if not stream.peek():
+        return
+    for count, match in enumerate(_walk_stream(stream, (steps,), ()), 1):
+        yield match
+        if limit is not None and count >= limit:
+            return
+
+
+def _seek(stream, path):
+    """Move the stream to the value at `path`"""
+    for depth, key in enumerate(path):
+        kind = stream.peek()
+        if isinstance(key, str) and kind == "{":
+            for member in stream.iter_object():
+                if member == key:
+                    break
+                stream.skip_value()
+            else:
+                raise KeyError(format_path(path[:depth + 1]))
+        elif isinstance(key, int) and kind == "[":
+            for index, _ in enumerate(stream.iter_array()):
+                if index == key:
+                    break
+                stream.skip_value()
+            else:
+                raise KeyError(format_path(path[:depth + 1]))
+        else:
+            raise KeyError(format_path(path[:depth + 1]))
+
+
+@profiled("json_children")
+def json_children(fileobj, path=(), offset=0, limit=50):
+    """List a page of the members or elements of the node at `path`, for a lazy tree view
+
+    Returns {"kind", "children", "has_more"}: kind is "object", "array" or
+    "value"; children are (key, kind, value) tuples where value is None
+    for objects and arrays, which are skipped rather than parsed. The
+    document is read only as far as the end of the page.
+    """
+    stream = JsonStream(fileobj)
+    _seek(stream, path)
+    kind = stream.peek()
+    if kind not in ("{", "["):
+        return {"kind": "value", "value": stream.read_value(), "children": [], "has_more": False}
+
+    children = []
+    has_more = False
+    keys = stream.iter_object() if kind == "{" else (index for index, _ in enumerate(stream.iter_array()))
+    for position, key in enumerate(keys):
+        if position >= offset + limit:
+            has_more = True
+            break
+        if position < offset:
+            stream.skip_value()
+            continue
+        child = stream.peek()
+        if child == "{":
+            children.append((key, "object", None))
+            stream.skip_value()
+        elif child == "[":
+            children.append((key, "array", None))
+            stream.skip_value()
+        else:
+            children.append((key, "value", stream.read_value()))
+    return {"kind": "object" if kind == "{" else "array", "children": children, "has_more": has_more}
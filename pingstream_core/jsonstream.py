@@ -0,0 +1,181 @@
+import codecs
+import json
+import re
+from json.decoder import scanstring
+
+CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+_structural = re.compile(r'[\[\]{}"]')
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+class JsonStream:
+    """Incremental reader over a JSON document in a file
+
+    Only a window of the text is held in memory. The caller walks the
+    document with iter_object() and iter_array(), and for each member
+    either parses it whole with read_value() (at C speed, through
+    json.JSONDecoder.raw_decode) or passes over it with skip_value(),
+    which only builds what is already buffered and scans the rest.
+    """
+
+    def __init__(self, fileobj, chunk_size=CHUNK_SIZE):
+        self._file = fileobj
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.bytes_read = 0
+
+    def _fill(self, grow=False):
+        """Read more input, dropping what has been consumed; False at end of input
+
+        With `grow`, read at least as much as is already buffered, so a value
+        larger than one chunk is re-parsed a logarithmic number of times.
+        """
+        if self._eof:
+            return False
+        size = max(self._chunk_size, len(self._buf) - self._pos) if grow else self._chunk_size
+        chunk = self._file.read(size)
+        self.bytes_read += len(chunk)
+        if isinstance(chunk, bytes):
+            text = self._decoder.decode(chunk, final=not chunk)
+        else:
+            text = chunk
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it, or "" at the end"""
+        while True:
+            self._pos = _whitespace.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found or 'end of input'!r} after byte {self.bytes_read}")
+        self._pos += 1
+
+    def _cut_short(self, value, end):
+        """Whether a number parsed up to `end` may go on in input not read yet, like the 12 of 12.5"""
+        if self._eof or not isinstance(value, (int, float)):
+            return False
+        return end == len(self._buf) or self._buf[end] in _NUMBER_CHARS
+
+    def read_value(self):
+        """Parse the next value whole"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # The value may just continue in the next chunk
+                if self._fill(grow=True):
+                    continue
+                raise
+            if self._cut_short(value, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def read_buffered(self):
+        """Parse the next value if it ends within the text already buffered
+
+        Returns (True, value), or (False, None) without consuming anything
+        when the value runs on past the buffer. Small values are built at C
+        speed this way; large ones are left to be walked.
+        """
+        self.peek()
+        try:
+            value, end = _decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            return False, None
+        if self._cut_short(value, end):
+            return False, None
+        self._pos = end
+        return True, value
+
+    def skip_value(self):
+        """Move past the next value without building it"""
+        if self.peek() not in ("[", "{"):
+            self.read_value()
+            return
+        # Building a value that is already buffered and dropping it is
+        # quicker than scanning it here
+        if self.read_buffered()[0]:
+            return
+
+        depth = 0
+        while True:
+            match = _structural.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON input")
+                continue
+
+            char = match.group()
+            if char == '"':
+                try:
+                    _, end = scanstring(self._buf, match.end())
+                except json.JSONDecodeError:
+                    # The string continues in the next chunk
+                    self._pos = match.start()
+                    if not self._fill(grow=True):
+                        raise
+                    continue
+                self._pos = end
+            else:
+                self._pos = match.end()
+                depth += 1 if char in "[{" else -1
+                if depth == 0:
+                    return
+
+    def iter_object(self):
+        """Yield each key of the object starting here
+
+        The caller must consume the matching value before asking for the
+        next key.
+        """
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            separator = self.peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' after byte {self.bytes_read}")
+
+    def iter_array(self):
+        """Yield once for each element of the array starting here
+
+        The caller must consume the element before the next iteration.
+        """
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            separator = self.peek()
+            self._pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' after byte {self.bytes_read}")
@@ -0,0 +1,513 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from .engine import DEFAULT_TIMEOUT, RequestError, get_header, get_pool, send_request
+
+PERCENTILES = [50, 90, 99, 99.9]
+# Statuses that mean "slow down": retried, and counted as throttling
+THROTTLE_STATUSES = (429, 503)
+# Longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 60
+# Requests a control step needs before its latency is trusted
+MIN_STEP_REQUESTS = 5
+# The knee is the least concurrency that reaches this share of the peak throughput
+KNEE_FRACTION = 0.95
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in microseconds
+
+    Values below 2**sub_bucket_bits are counted exactly; above that each
+    power-of-two range is split into 2**(sub_bucket_bits - 1) linear buckets,
+    so every recorded value is within 1 / 2**(sub_bucket_bits - 1) of its
+    bucket. Counts are kept sparsely, which makes merging and shipping
+    histograms between threads or processes cheap.
+    """
+
+    def __init__(self, sub_bucket_bits=8):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < 1 << self.sub_bucket_bits:
+            return value
+        half = 1 << (self.sub_bucket_bits - 1)
+        shift = value.bit_length() - self.sub_bucket_bits
+        return (1 << self.sub_bucket_bits) + (shift - 1) * half + ((value >> shift) - half)
+
+    def _highest_value(self, index):
+        """Largest value that falls into the bucket at `index`"""
+        if index < 1 << self.sub_bucket_bits:
+            return index
+        half = 1 << (self.sub_bucket_bits - 1)
+        offset = index - (1 << self.sub_bucket_bits)
+        shift = offset // half + 1
+        top = offset % half + half
+        return ((top + 1) << shift) - 1
+
+    def record(self, value):
+        """Record one latency in microseconds"""
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same precision"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def to_json(self):
+        """The sparse counts and totals as a JSON-ready dict, for shipping to another process"""
+        return {
+            "bits": self.sub_bucket_bits,
+            "counts": sorted(self.counts.items()),
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    def merge_json(self, data):
+        """Add the counts of a histogram shipped with to_json()"""
+        if data["bits"] != self.sub_bucket_bits:
+            raise ValueError(f"Cannot merge a histogram of {data['bits']} sub-bucket bits into one of {self.sub_bucket_bits}")
+        for index, count in data["counts"]:
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += data["count"]
+        self.total += data["total"]
+        if data["count"]:
+            self.min = data["min"] if self.min is None else min(self.min, data["min"])
+            self.max = data["max"] if self.max is None else max(self.max, data["max"])
+
+    def percentile(self, percentile):
+        """Value at or below which `percentile` percent of recorded values fall"""
+        if not self.count:
+            return None
+        threshold = max(1, percentile / 100.0 * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+def _new_window():
+    return {"requests": 0, "errors": 0, "histogram": LatencyHistogram()}
+
+
+class LoadTest:
+    """Drive one prepared request at a fixed concurrency or a target rate
+
+    With `rate` set, requests are started on a fixed schedule (open loop)
+    and latency is measured from the scheduled start, so a slow server
+    cannot hide queueing delay (coordinated omission). Without it,
+    `concurrency` workers send back to back (closed loop). The test stops
+    after `duration` seconds or `total_requests` requests, whichever comes
+    first. It runs in background threads; read progress with snapshot().
+    """
+
+    def __init__(self, prepared, engine="pooled", concurrency=10, rate=None, duration=None, total_requests=None, timeout=DEFAULT_TIMEOUT, send=None):
+        if not duration and not total_requests:
+            raise ValueError("Set a duration or a request count")
+        self.prepared = prepared
+        self.engine = engine
+        self.concurrency = max(1, int(concurrency))
+        self.rate = rate
+        self.duration = duration
+        self.total_requests = total_requests
+        self.timeout = timeout
+        self.send = send or send_request
+        self.histogram = LatencyHistogram()
+        self.statuses = {}
+        self.errors = 0
+        self.error_messages = {}
+        self.windows = {}
+        self.started = None
+        self.finished = None
+        self._issued = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the test in the background"""
+        self.started = time.monotonic()
+        target = self._run_rate if self.rate else self._run_concurrency
+        self._thread = threading.Thread(target=target, name="pingstream-loadtest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Ask the test to stop; requests in flight are still recorded"""
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _over(self):
+        """Whether the test was stopped or has run for its duration"""
+        return self._stop.is_set() or bool(self.duration and time.monotonic() - self.started >= self.duration)
+
+    def _claim(self):
+        """Reserve the next request, or return False once the test is over"""
+        if self._over():
+            return False
+        with self._lock:
+            if self.total_requests and self._issued >= self.total_requests:
+                return False
+            self._issued += 1
+        return True
+
+    def _send_one(self, scheduled):
+        status = None
+        error = None
+        try:
+            response = self.send(self.prepared, engine=self.engine, timeout=self.timeout, keep_body=False)
+            status = response["status"]
+        except RequestError as e:
+            error = str(e)
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+        finished = time.monotonic()
+        self._record(finished, (finished - scheduled) * 1000000, status, error)
+
+    def _record(self, finished, latency_us, status, error):
+        failed = error is not None or status >= 400
+        second = int(finished - self.started)
+        with self._lock:
+            self.histogram.record(latency_us)
+            if error is not None:
+                self.error_messages[error] = self.error_messages.get(error, 0) + 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            if failed:
+                self.errors += 1
+            window = self.windows.setdefault(second, _new_window())
+            window["requests"] += 1
+            window["errors"] += failed
+            window["histogram"].record(latency_us)
+
+    def _run_concurrency(self):
+        def worker():
+            while self._claim():
+                self._send_one(time.monotonic())
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.finished = time.monotonic()
+
+    def _acquire(self, slots):
+        """Wait for a free request slot, giving up once the test is over"""
+        while not slots.acquire(timeout=0.1):
+            if self._over():
+                return False
+        return True
+
+    def _run_rate(self):
+        interval = 1.0 / self.rate
+        next_start = self.started
+        # At most `concurrency` requests are outstanding. When all are busy
+        # the schedule falls behind, and the wait counts towards the latency
+        # of the requests sent late; nothing queues up past a stop or the
+        # end of the duration.
+        slots = threading.Semaphore(self.concurrency)
+
+        def send(scheduled):
+            try:
+                self._send_one(scheduled)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while self._claim():
+                delay = next_start - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                if not self._acquire(slots):
+                    break
+                executor.submit(send, next_start)
+                next_start += interval
+        self.finished = time.monotonic()
+
+    def snapshot(self):
+        """Summarize results so far; safe to call while the test runs"""
+        with self._lock:
+            elapsed = (self.finished or time.monotonic()) - self.started
+            count = self.histogram.count
+            timeline = []
+            for second in sorted(self.windows):
+                window = self.windows[second]
+                timeline.append({
+                    "second": second,
+                    "requests": window["requests"],
+                    "errors": window["errors"],
+                    "p50_ms": window["histogram"].percentile(50) / 1000,
+                    "p99_ms": window["histogram"].percentile(99) / 1000,
+                })
+            return {
+                "running": self.running,
+                "elapsed": elapsed,
+                "requests": count,
+                "errors": self.errors,
+                "error_rate": self.errors / count if count else 0.0,
+                "throughput": count / elapsed if elapsed > 0 else 0.0,
+                "latency_ms": {
+                    "min": self.histogram.min / 1000 if count else None,
+                    "mean": self.histogram.mean() / 1000 if count else None,
+                    "max": self.histogram.max / 1000 if count else None,
+                    **{f"p{p:g}": self.histogram.percentile(p) / 1000 if count else None for p in PERCENTILES},
+                },
+                "statuses": dict(self.statuses),
+                "error_messages": dict(self.error_messages),
+                "timeline": timeline,
+            }
+
+
+def retry_after_seconds(value, now=None):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class AdaptiveLoadTest(LoadTest):
+    """Ramp concurrency up and down to find the most throughput the endpoint sustains
+
+    Every `interval` seconds an AIMD controller looks at the requests that
+    finished in that step. The step is congested when more than
+    `max_error_rate` of them failed, when any were throttled (429/503), or
+    when their median latency exceeds `latency_tolerance` times the lowest
+    median seen so far. Congestion multiplies the concurrency by `decrease`;
+    otherwise it grows by `increase`, between `min_concurrency` and
+    `max_concurrency`. Until the first congestion it doubles instead (slow
+    start), so large limits are reached quickly.
+
+    Throttled requests and connection errors are retried up to `retries`
+    times. The wait is the server's Retry-After when it sends one, which
+    also pauses every worker. Without one it is a random delay up to
+    `backoff * 2**attempt` seconds, capped at `max_backoff` ("full
+    jitter"). Latency is measured from the first attempt. snapshot() adds
+    the control steps and the knee (see knee()).
+    """
+
+    def __init__(self, prepared, engine="pooled", min_concurrency=1, max_concurrency=256, increase=1, decrease=0.7,
+                 interval=1.0, latency_tolerance=1.5, max_error_rate=0.05, retries=2, backoff=0.1, max_backoff=10.0,
+                 duration=None, total_requests=None, timeout=DEFAULT_TIMEOUT, send=None):
+        super().__init__(prepared, engine=engine, concurrency=min_concurrency, duration=duration,
+                         total_requests=total_requests, timeout=timeout, send=send)
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.increase = max(1, int(increase))
+        self.decrease = decrease
+        self.interval = interval
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.steps = []
+        self.baseline_ms = None
+        self.retried = 0
+        self.throttled = 0
+        self._step = _new_window()
+        self._step["throttled"] = 0
+        self._resume_at = 0.0
+        self._slow_start = True
+        self._changed = threading.Condition(self._lock)
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run_adaptive, name="pingstream-loadtest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        super().stop()
+        with self._changed:
+            self._changed.notify_all()
+
+    def _throttle(self, retry_after):
+        """Count a throttled response, and hold every worker back as its Retry-After asks"""
+        with self._lock:
+            self.throttled += 1
+            self._step["throttled"] += 1
+            if retry_after is not None:
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+
+    def _wait_turn(self, number):
+        """Block worker `number` while it is above the concurrency limit or the test is paused"""
+        with self._changed:
+            while not self._stop.is_set() and number >= self.concurrency:
+                self._changed.wait()
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            self._stop.wait(delay)
+
+    def _send_one(self, scheduled):
+        status = None
+        error = None
+        for attempt in range(self.retries + 1):
+            wait = None
+            try:
+                response = self.send(self.prepared, engine=self.engine, timeout=self.timeout, keep_body=False)
+            except RequestError as e:
+                status, error = None, str(e)
+            except Exception as e:
+                status, error = None, f"{e.__class__.__name__}: {e}"
+                break
+            else:
+                status, error = response["status"], None
+                if status not in THROTTLE_STATUSES:
+                    break
+                wait = retry_after_seconds(get_header(response["headers"], "Retry-After"))
+                if wait is not None:
+                    wait = min(wait, MAX_RETRY_AFTER)
+                self._throttle(wait)
+            if attempt == self.retries or self._stop.is_set():
+                break
+            if wait is None:
+                wait = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            with self._lock:
+                self.retried += 1
+            if self._stop.wait(wait):
+                break
+        finished = time.monotonic()
+        self._record(finished, (finished - scheduled) * 1000000, status, error)
+
+    def _record(self, finished, latency_us, status, error):
+        super()._record(finished, latency_us, status, error)
+        with self._lock:
+            self._step["requests"] += 1
+            self._step["errors"] += error is not None or status >= 400
+            self._step["histogram"].record(latency_us)
+
+    def _control(self, elapsed, length):
+        """Close the current step, `length` seconds long, and set the next concurrency limit"""
+        with self._lock:
+            step, self._step = self._step, _new_window()
+            self._step["throttled"] = 0
+        concurrency = self.concurrency
+        requests = step["requests"]
+        histogram = step["histogram"]
+        p50 = histogram.percentile(50) / 1000 if requests else None
+        error_rate = step["errors"] / requests if requests else 0.0
+        if requests >= MIN_STEP_REQUESTS and not step["throttled"] and error_rate <= self.max_error_rate:
+            self.baseline_ms = p50 if self.baseline_ms is None else min(self.baseline_ms, p50)
+        slow = p50 is not None and self.baseline_ms is not None and p50 > self.baseline_ms * self.latency_tolerance
+        congested = step["throttled"] > 0 or error_rate > self.max_error_rate or (requests >= MIN_STEP_REQUESTS and slow)
+        self.steps.append({
+            "second": round(elapsed, 1),
+            "concurrency": concurrency,
+            "requests": requests,
+            "throughput": requests / length if length > 0 else 0.0,
+            "p50_ms": p50,
+            "p99_ms": histogram.percentile(99) / 1000 if requests else None,
+            "error_rate": error_rate,
+            "throttled": step["throttled"],
+            "congested": congested,
+        })
+        if congested:
+            self._slow_start = False
+            concurrency = max(self.min_concurrency, int(concurrency * self.decrease))
+        elif requests:
+            concurrency = min(self.max_concurrency, concurrency * 2 if self._slow_start else concurrency + self.increase)
+        with self._changed:
+            self.concurrency = concurrency
+            self._changed.notify_all()
+
+    def _run_adaptive(self):
+        # Idle connections beyond the pool's limit would be closed and reopened
+        with get_pool().capacity(self.max_concurrency if self.engine == "pooled" else 0):
+            self._ramp()
+
+    def _ramp(self):
+        def worker(number):
+            while True:
+                self._wait_turn(number)
+                if not self._claim():
+                    # The test is over: wake the workers held above the limit
+                    self.stop()
+                    break
+                self._send_one(time.monotonic())
+
+        threads = []
+        step_started = self.started
+        next_step = self.started + self.interval
+        while True:
+            # Workers are started as the limit first reaches them
+            while len(threads) < self.concurrency:
+                thread = threading.Thread(target=worker, args=(len(threads),), daemon=True)
+                thread.start()
+                threads.append(thread)
+            if self._stop.wait(max(0.0, next_step - time.monotonic())) or not any(thread.is_alive() for thread in threads):
+                break
+            now = time.monotonic()
+            self._control(now - self.started, now - step_started)
+            step_started = now
+            next_step += self.interval
+        self.stop()
+        for thread in threads:
+            thread.join()
+        self.finished = time.monotonic()
+
+    def knee(self):
+        """The step where throughput stops paying for itself, or None before the first healthy step
+
+        Past the knee, more concurrency only adds queueing: it is the healthy
+        step with the least concurrency (then the lowest median latency) whose
+        throughput is within KNEE_FRACTION of the best healthy step's.
+        """
+        healthy = [step for step in self.steps if not step["congested"] and step["requests"]]
+        if not healthy:
+            return None
+        peak = max(step["throughput"] for step in healthy)
+        near_peak = [step for step in healthy if step["throughput"] >= peak * KNEE_FRACTION]
+        return min(near_peak, key=lambda step: (step["concurrency"], step["p50_ms"]))
+
+    def snapshot(self):
+        report = super().snapshot()
+        with self._lock:
+            report.update({
+                "concurrency": self.concurrency,
+                "baseline_ms": self.baseline_ms,
+                "retried": self.retried,
+                "throttled": self.throttled,
+                "steps": list(self.steps),
+                "knee": self.knee(),
+            })
+        return report
@@ -0,0 +1,162 @@
+import itertools
+import sys
+import types
+from collections import deque
+
+# Request ids are small integers, unique within the process
+_ids = itertools.count(1)
+
+# Never looked into when sizing an object: shared by everything, or not data
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def split_base(url):
+    """Split a URL into its scheme and host (or leading {{variable}}) and the rest"""
+    if url.startswith("{{"):
+        end = url.find("}}")
+        if end != -1:
+            return url[:end + 2], url[end + 2:]
+    scheme_end = url.find("://")
+    if scheme_end != -1:
+        path_start = url.find("/", scheme_end + 3)
+        if path_start == -1:
+            return url, ""
+        return url[:path_start], url[path_start:]
+    return "", url
+
+
+def _share(shared, value):
+    """Return the copy of `value` already in `shared`, adding it if it is new"""
+    if shared is None:
+        return value
+    return shared.setdefault(value, value)
+
+
+def _pairs(rows, shared):
+    """Key/value rows (dicts or pairs) as a tuple of pairs with interned keys"""
+    if not rows:
+        return ()
+    pairs = []
+    for row in rows:
+        key, value = (row["key"], row["value"]) if isinstance(row, dict) else row
+        pairs.append(_share(shared, (sys.intern(key), value)))
+    return _share(shared, tuple(pairs))
+
+
+class Request:
+    """One request of a collection, stored compactly
+
+    Methods, header and param names and URL bases (scheme and host, or a
+    leading {{variable}}) are interned; headers and params are tuples of
+    (key, value) pairs. Requests created with the same `shared` dict (one
+    per import) share identical bodies and header/param tuples.
+    """
+
+    __slots__ = ("id", "name", "method", "_base", "_path", "headers", "params", "body", "operation_id")
+
+    def __init__(self, name, method, url, headers=None, params=None, body="{}", operation_id=None, shared=None):
+        self.id = next(_ids)
+        self.name = name
+        self.method = sys.intern(method)
+        base, self._path = split_base(url)
+        self._base = sys.intern(base)
+        self.headers = _pairs(headers, shared)
+        self.params = _pairs(params, shared)
+        self.body = _share(shared, body)
+        self.operation_id = operation_id
+
+    @property
+    def url(self):
+        return self._base + self._path
+
+    def copy(self):
+        """The same request under a new id; its fields are immutable, so they are shared"""
+        request = Request.__new__(Request)
+        for slot in self.__slots__:
+            setattr(request, slot, getattr(self, slot))
+        request.id = next(_ids)
+        return request
+
+    def header_rows(self):
+        """Headers as the {"key", "value"} rows used by forms and prepare_request()"""
+        return [{"key": key, "value": value} for key, value in self.headers]
+
+    def param_rows(self):
+        return [{"key": key, "value": value} for key, value in self.params]
+
+    def to_form(self):
+        """The request as editable form fields: method, url, headers, params and body"""
+        return {
+            "method": self.method,
+            "url": self.url,
+            "headers": self.header_rows(),
+            "params": self.param_rows(),
+            "body": self.body,
+        }
+
+    def __repr__(self):
+        return f"Request({self.id}, {self.method} {self.url})"
+
+
+class Collection:
+    """A named folder of requests"""
+
+    __slots__ = ("name", "requests")
+
+    def __init__(self, name, requests=None):
+        self.name = name
+        self.requests = requests if requests is not None else []
+
+    def __repr__(self):
+        return f"Collection({self.name!r}, {len(self.requests)} requests)"
+
+
+def deep_size(obj, seen=None):
+    """Approximate bytes held by an object and everything it refers to
+
+    Follows containers, __slots__ and instance __dict__s, counting each
+    object once; classes, modules and functions are not looked into.
+    Objects whose ids are in `seen` are skipped, and new ones added to it.
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        try:
+            size += sys.getsizeof(obj)
+        except TypeError:
+            continue
+        if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        elif not isinstance(obj, _OPAQUE_TYPES):
+            for cls in type(obj).__mro__:
+                slots = getattr(cls, "__slots__", ())
+                for slot in (slots,) if isinstance(slots, str) else slots:
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+    return size
+
+
+def memory_report(collections):
+    """Bytes held by each collection, counting shared objects once
+
+    Returns one {"folder", "requests", "bytes"} dict per collection. An
+    object shared between collections (an interned method, a common body)
+    is counted in the first collection that uses it.
+    """
+    seen = set()
+    return [
+        {"folder": collection.name, "requests": len(collection.requests), "bytes": deep_size(collection, seen)}
+        for collection in collections
+    ]
@@ -0,0 +1,118 @@
+import mimetypes
+import os
+import uuid
+
+# Size of each piece of a file handed to the socket
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def _quote(value):
+    """Escape a name or filename for a Content-Disposition parameter, as browsers do"""
+    return value.replace("\r", "%0D").replace("\n", "%0A").replace('"', "%22")
+
+
+def file_content_type(filename, content_type=None):
+    """The given content type, or one guessed from the filename"""
+    return content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def _file_size(fileobj):
+    """Size of a file object from its start, or None if it cannot seek"""
+    try:
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class MultipartEncoder:
+    """multipart/form-data body that is produced piece by piece as it is sent
+
+    `fields` is a list of (name, value) text fields and `files` a list of
+    (field, filename, fileobj) or (field, filename, fileobj, content_type)
+    tuples. Nothing is read until chunks() is iterated, and file content is
+    never copied: in-memory files (io.BytesIO, including Streamlit uploads)
+    are sliced through memoryviews, and other files are read into one reused
+    buffer, so memory use does not grow with file size. `length` is None when
+    a file cannot seek, in which case the body has to be sent chunked.
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+        self._parts = []
+        for name, value in fields or []:
+            header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'
+            self._parts.append((header.encode("utf-8"), value.encode("utf-8")))
+        for file_part in files or []:
+            field, filename, fileobj = file_part[:3]
+            content_type = file_content_type(filename, file_part[3] if len(file_part) > 3 else None)
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{_quote(field)}"; filename="{_quote(filename)}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n'
+            )
+            self._parts.append((header.encode("utf-8"), fileobj))
+        self._closing = f"--{self.boundary}--\r\n".encode("utf-8")
+
+        self.length = len(self._closing)
+        for header, value in self._parts:
+            size = len(value) if isinstance(value, bytes) else _file_size(value)
+            if size is None:
+                self.length = None
+                break
+            self.length += len(header) + size + 2
+
+    def _file_chunks(self, fileobj):
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        if hasattr(fileobj, "getbuffer"):
+            view = fileobj.getbuffer()
+            for start in range(0, len(view), self.chunk_size):
+                yield view[start:start + self.chunk_size]
+            return
+        if hasattr(fileobj, "readinto"):
+            buffer = bytearray(self.chunk_size)
+            view = memoryview(buffer)
+            while True:
+                size = fileobj.readinto(buffer)
+                if not size:
+                    return
+                yield view[:size]
+        while True:
+            chunk = fileobj.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def _pieces(self):
+        pending = b""
+        for header, value in self._parts:
+            if isinstance(value, bytes):
+                pending += header + value + b"\r\n"
+                continue
+            # Small pieces go out together, ahead of each file
+            yield pending + header
+            yield from self._file_chunks(value)
+            pending = b"\r\n"
+        yield pending + self._closing
+
+    def chunks(self, on_progress=None):
+        """Yield the body in pieces; `on_progress(sent, length)` follows each one
+
+        A yielded piece may be a view into a buffer that is reused for the
+        next piece, so it has to be written out before asking for more.
+        Every call starts from the beginning again, so a failed send can be
+        retried.
+        """
+        sent = 0
+        for piece in self._pieces():
+            if not len(piece):
+                continue
+            yield piece
+            sent += len(piece)
+            if on_progress is not None:
+                on_progress(sent, self.length)
@@ -0,0 +1,233 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .model import deep_size
+
+# Reruns kept for the breakdown and the exported trace
+PROFILE_RUNS = 50
+
+
+class ProfiledRun:
+    """Timings of one script run: sequential phases, with nested sections inside them
+
+    Spans are (name, start, duration, depth) tuples with times in seconds
+    from the profiler's origin. Phases have depth 0; sections opened inside
+    a phase are one deeper for each level of nesting.
+    """
+
+    __slots__ = ("label", "thread", "start", "duration", "spans", "counters", "_phase", "_depth")
+
+    def __init__(self, label, start):
+        self.label = label
+        self.thread = threading.get_ident()
+        self.start = start
+        self.duration = None
+        self.spans = []
+        self.counters = {}
+        self._phase = None
+        self._depth = 1
+
+    def breakdown(self):
+        """Milliseconds spent in each phase, in order, plus whatever fell outside any phase"""
+        phases = {}
+        for name, _, duration, depth in self.spans:
+            if depth == 0:
+                phases[name] = phases.get(name, 0.0) + duration * 1000
+        outside = self.duration * 1000 - sum(phases.values())
+        if outside > 0.05:
+            phases["(outside phases)"] = outside
+        return phases
+
+
+class Profiler:
+    """Opt-in timers for the app's reruns, and counters for what the engine does
+
+    start_run() and finish_run() bracket one run of the script, phase()
+    moves it on to its next top-level part, and section() times a nested
+    block. Outside a run these cost a few attribute lookups. Runs are
+    tracked per thread, so only the threads that start one are timed.
+    Counters are process-wide and always on; each run records how much
+    they moved while it ran.
+    """
+
+    def __init__(self, max_runs=PROFILE_RUNS):
+        self.runs = deque(maxlen=max_runs)
+        self.counters = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _now(self):
+        return time.perf_counter() - self._origin
+
+    def _current(self):
+        return getattr(self._local, "run", None)
+
+    def start_run(self, label="rerun"):
+        run = ProfiledRun(label, self._now())
+        with self._lock:
+            run.counters = dict(self.counters)
+        self._local.run = run
+
+    def finish_run(self):
+        run = self._current()
+        if run is None:
+            return
+        self._local.run = None
+        self._close_phase(run)
+        run.duration = self._now() - run.start
+        with self._lock:
+            run.counters = {
+                name: value - run.counters.get(name, 0)
+                for name, value in self.counters.items()
+                if value != run.counters.get(name, 0)
+            }
+            self.runs.append(run)
+
+    @contextmanager
+    def run(self, label="rerun", enabled=True):
+        """Profile the block as one run, when `enabled`"""
+        if not enabled:
+            yield
+            return
+        self.start_run(label)
+        try:
+            yield
+        finally:
+            self.finish_run()
+
+    def _close_phase(self, run):
+        if run._phase is not None:
+            name, start = run._phase
+            run.spans.append((name, start, self._now() - start, 0))
+            run._phase = None
+
+    def phase(self, name):
+        """End the current phase of this thread's run and start the next one"""
+        run = self._current()
+        if run is None:
+            return
+        self._close_phase(run)
+        run._phase = (name, self._now())
+
+    @contextmanager
+    def section(self, name):
+        """Time a block as part of this thread's run, if one is being profiled"""
+        run = self._current()
+        if run is None:
+            yield
+            return
+        start = self._now()
+        depth = run._depth
+        run._depth += 1
+        try:
+            yield
+        finally:
+            run._depth = depth
+            run.spans.append((name, start, self._now() - start, depth))
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def clear(self):
+        """Forget the recorded runs; counters keep counting"""
+        with self._lock:
+            self.runs.clear()
+
+    def to_json(self):
+        """The recorded runs and counter totals as a JSON-ready dict, times in milliseconds"""
+        with self._lock:
+            runs = list(self.runs)
+            counters = dict(self.counters)
+        return {
+            "runs": [
+                {
+                    "label": run.label,
+                    "start_ms": run.start * 1000,
+                    "wall_ms": run.duration * 1000,
+                    "phases": run.breakdown(),
+                    "spans": [
+                        {"name": name, "start_ms": start * 1000, "duration_ms": duration * 1000, "depth": depth}
+                        for name, start, duration, depth in run.spans
+                    ],
+                    "counters": run.counters,
+                }
+                for run in runs
+            ],
+            "counters": counters,
+        }
+
+    def chrome_trace(self):
+        """The recorded runs in Chrome's trace event format, for chrome://tracing or Perfetto"""
+        with self._lock:
+            runs = list(self.runs)
+        pid = os.getpid()
+        events = []
+        for number, run in enumerate(runs, 1):
+            events.append({
+                "name": f"{run.label} #{number}", "cat": "run", "ph": "X", "pid": pid, "tid": run.thread,
+                "ts": run.start * 1e6, "dur": run.duration * 1e6, "args": {"counters": run.counters},
+            })
+            for name, start, duration, depth in run.spans:
+                events.append({
+                    "name": name, "cat": "phase" if depth == 0 else "section", "ph": "X", "pid": pid, "tid": run.thread,
+                    "ts": start * 1e6, "dur": duration * 1e6,
+                })
+            if run.counters:
+                events.append({
+                    "name": "counters", "ph": "C", "pid": pid, "tid": run.thread,
+                    "ts": (run.start + run.duration) * 1e6, "args": run.counters,
+                })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+_profiler = Profiler()
+
+
+def get_profiler():
+    """Return the shared profiler"""
+    return _profiler
+
+
+def count(name, amount=1):
+    """Add to one of the shared profiler's counters"""
+    _profiler.count(name, amount)
+
+
+def profiled(name):
+    """Decorator timing every call of a function as a section of the current run"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler._current() is None:
+                return func(*args, **kwargs)
+            with _profiler.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def state_sizes(state):
+    """Size of each entry of a mapping such as Streamlit's session state, largest first
+
+    Each entry is measured on its own, so objects shared between entries
+    count towards each of them. Returns (rows, total) where rows are
+    {"key", "type", "bytes"} dicts and total counts shared objects once.
+    """
+    rows = []
+    seen = set()
+    total = 0
+    for key in list(state.keys()):
+        try:
+            value = state[key]
+        except KeyError:
+            continue
+        rows.append({"key": str(key), "type": type(value).__name__, "bytes": deep_size(value)})
+        total += deep_size(value, seen)
+    rows.sort(key=lambda row: row["bytes"], reverse=True)
+    return rows, total
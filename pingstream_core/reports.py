@@ -0,0 +1,107 @@
+import json
+import xml.etree.ElementTree as ET
+
+REPORT_FORMATS = ["json", "junit", "jsonl"]
+
+
+def result_passed(result):
+    """A request passes when it got a response with a status below 400"""
+    return not result["error"] and result["status"] is not None and result["status"] < 400
+
+
+class Tally:
+    """Running totals of a run, for reports that do not keep every result"""
+
+    def __init__(self):
+        self.total = 0
+        self.failed = 0
+        self.errors = 0
+
+    def add(self, result):
+        self.total += 1
+        self.failed += not result_passed(result)
+        self.errors += bool(result["error"])
+
+    def summary(self, elapsed):
+        """Totals so far; `elapsed` is in seconds"""
+        return {
+            "total": self.total,
+            "passed": self.total - self.failed,
+            "failed": self.failed,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+        }
+
+
+def summarize(results, elapsed):
+    """Totals for a finished run; `elapsed` is in seconds"""
+    tally = Tally()
+    for result in results:
+        tally.add(result)
+    return tally.summary(elapsed)
+
+
+def write_json_report(results, summary, fileobj):
+    """Write the summary and every result as one JSON document"""
+    json.dump({"summary": summary, "results": results}, fileobj, indent=2)
+    fileobj.write("\n")
+
+
+def write_jsonl_result(result, fileobj):
+    """Write one result as a line of JSON, as soon as it is known"""
+    fileobj.write(json.dumps(result) + "\n")
+
+
+def write_junit_report(results, summary, fileobj, name="pingstream"):
+    """Write JUnit XML with one test suite per folder and one test case per request
+
+    Requests that got a response with a 4xx or 5xx status are failures;
+    requests that got no response at all are errors.
+    """
+    suites = {}
+    for result in results:
+        suites.setdefault(result["folder"], []).append(result)
+
+    root = ET.Element("testsuites", {
+        "name": name,
+        "tests": str(summary["total"]),
+        "failures": str(summary["failed"] - summary["errors"]),
+        "errors": str(summary["errors"]),
+        "time": f"{summary['elapsed_s']:.3f}",
+    })
+    for folder, folder_results in suites.items():
+        failures = sum(1 for result in folder_results if not result["error"] and not result_passed(result))
+        errors = sum(1 for result in folder_results if result["error"])
+        suite_time = sum(result["latency_ms"] or 0 for result in folder_results) / 1000
+        suite = ET.SubElement(root, "testsuite", {
+            "name": folder,
+            "tests": str(len(folder_results)),
+            "failures": str(failures),
+            "errors": str(errors),
+            "time": f"{suite_time:.3f}",
+        })
+        for result in folder_results:
+            case = ET.SubElement(suite, "testcase", {
+                "classname": folder,
+                "name": f"{result['method']} {result['name']}" + (f" (row {result['row']})" if result.get("row") else ""),
+                "time": f"{(result['latency_ms'] or 0) / 1000:.3f}",
+            })
+            if result["error"]:
+                ET.SubElement(case, "error", {"message": result["error"]}).text = result["url"]
+            elif not result_passed(result):
+                ET.SubElement(case, "failure", {"message": f"HTTP {result['status']}"}).text = result["url"]
+
+    fileobj.write(ET.tostring(root, encoding="unicode"))
+    fileobj.write("\n")
+
+
+def write_report(report_format, results, summary, fileobj):
+    """Write a whole report; jsonl reports end with a {"summary": ...} line"""
+    if report_format == "jsonl":
+        for result in results:
+            write_jsonl_result(result, fileobj)
+        fileobj.write(json.dumps({"summary": summary}) + "\n")
+    elif report_format == "junit":
+        write_junit_report(results, summary, fileobj)
+    else:
+        write_json_report(results, summary, fileobj)
@@ -0,0 +1,253 @@
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from .engine import DEFAULT_TIMEOUT, RequestError, get_pool, prepare_request, send_batch, send_request
+
+
+def resolve_url(base_url, url):
+    """Prefix relative URLs (as imported from OpenAPI paths) with a base URL"""
+    if not base_url or "://" in url:
+        return url
+    return base_url.rstrip("/") + "/" + url.lstrip("/")
+
+
+def collection_jobs(collections, folder=None):
+    """List (folder, request) pairs for one folder, or every folder when `folder` is None"""
+    jobs = []
+    for collection in collections:
+        if folder is None or collection.name == folder:
+            for request in collection.requests:
+                jobs.append((collection.name, request))
+    return jobs
+
+
+# Jobs read ahead of the ones in flight, per unit of concurrency, so job
+# iterators (such as dataset iterations) are consumed lazily
+QUEUE_AHEAD = 4
+
+
+def _result(index, folder, request, url, row=None):
+    return {
+        "index": index,
+        "folder": folder,
+        "name": request.name,
+        "method": request.method,
+        "url": url,
+        "row": row,
+        "status": None,
+        "latency_ms": None,
+        "size": None,
+        "protocol": "",
+        "error": "",
+        "cache": "",
+    }
+
+
+def _prepare(job, base_url, http_version=None):
+    """Prepare a (folder, request) job, or render a (folder, template, row, values) job"""
+    if len(job) > 2:
+        folder, template, row, values = job
+        prepared = template.render(values, base_url)
+    else:
+        request, row = job[1], None
+        url = resolve_url(base_url, request.url)
+        prepared = prepare_request(request.method, url, request.header_rows(), request.param_rows(), request.body)
+    if http_version is not None:
+        prepared["http_version"] = http_version
+    return prepared, row
+
+
+def _record(result, response):
+    result["status"] = response["status"]
+    result["size"] = response["body"].size
+    result["protocol"] = response["http_version"]
+    result["cache"] = response.get("cache", "")
+
+
+def _execute(job, engine, timeout, cache=None):
+    index, folder, request, row, prepared = job
+    result = _result(index, folder, request, prepared["url"], row)
+    start = time.perf_counter()
+    try:
+        send = cache.send if cache is not None else send_request
+        response = send(prepared, engine=engine, timeout=timeout, keep_body=False)
+    except RequestError as e:
+        result["error"] = str(e)
+    except Exception as e:
+        result["error"] = f"{e.__class__.__name__}: {e}"
+    else:
+        _record(result, response)
+    result["latency_ms"] = (time.perf_counter() - start) * 1000
+    return [result]
+
+
+def _execute_batch(jobs, timeout):
+    """Send jobs to one host from a single curl process, sharing its connections"""
+    start = time.perf_counter()
+    try:
+        responses = send_batch([job[4] for job in jobs], timeout=timeout, keep_body=False)
+    except Exception as e:
+        responses = [e] * len(jobs)
+    elapsed = (time.perf_counter() - start) * 1000
+    results = []
+    for (index, folder, request, row, prepared), response in zip(jobs, responses):
+        result = _result(index, folder, request, prepared["url"], row)
+        if isinstance(response, RequestError):
+            result["error"] = str(response)
+            result["latency_ms"] = elapsed
+        elif isinstance(response, Exception):
+            result["error"] = f"{response.__class__.__name__}: {response}"
+            result["latency_ms"] = elapsed
+        else:
+            _record(result, response)
+            # The batch finishes with its slowest transfer; curl times each one
+            result["latency_ms"] = response["timings"]["total"]
+        results.append(result)
+    return results
+
+
+def _timed_out(job):
+    index, folder, request, row, prepared = job
+    result = _result(index, folder, request, prepared["url"], row)
+    result["error"] = "Run timed out"
+    return result
+
+
+def _unread(jobs, pending, read):
+    """How many of `jobs` were never read; None if some were but `jobs` has no length"""
+    try:
+        return len(jobs) - read
+    except TypeError:
+        return 0 if next(pending, None) is None else None
+
+
+class RunResults:
+    """The results of run_requests(), yielded as they finish
+
+    When the total timeout stops a run, the jobs in flight or queued are
+    yielded as timed out, but the ones never read from `jobs` are only
+    counted, so a long job iterator is not walked to its end. Their number
+    is `not_started`: 0 when every job was read, and None when some were
+    left in a job iterator without a length.
+    """
+
+    __slots__ = ("not_started", "_results")
+
+    def __init__(self, jobs, *args):
+        self.not_started = 0
+        self._results = _schedule(self, jobs, *args)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._results)
+
+    def close(self):
+        self._results.close()
+
+
+def _schedule(run, jobs, base_url, engine, concurrency, per_host, timeout, deadline, cache, http_version):
+    """Send jobs for run_requests() until they run out or the deadline passes"""
+    batched = engine == "curl" and cache is None
+    pending = enumerate(jobs)
+    read = 0
+    exhausted = False
+    queued = 0
+    # One queue per host keeps a slow host from blocking the others
+    queues = {}
+    active = {}
+    running = 0
+    in_flight = {}
+    # Idle connections beyond the pool's limit would be closed and reopened
+    with get_pool().capacity(per_host):
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            while not exhausted or queues or in_flight:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                while not exhausted and queued < concurrency * QUEUE_AHEAD:
+                    try:
+                        index, job = next(pending)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    read += 1
+                    prepared, row = _prepare(job, base_url, http_version)
+                    host = urlsplit(prepared["url"]).netloc
+                    queues.setdefault(host, deque()).append((index, job[0], job[1], row, prepared))
+                    active.setdefault(host, 0)
+                    queued += 1
+
+                for host in list(queues):
+                    queue = queues[host]
+                    while queue and active[host] < per_host and running < concurrency:
+                        job_timeout = timeout
+                        if deadline is not None:
+                            # Jobs are only started while there is time left for them
+                            job_timeout = deadline - time.monotonic()
+                            if job_timeout <= 0:
+                                break
+                            job_timeout = min(timeout, job_timeout)
+                        size = min(len(queue), per_host - active[host], concurrency - running) if batched else 1
+                        batch = [queue.popleft() for _ in range(size)]
+                        queued -= size
+                        if batched:
+                            future = executor.submit(_execute_batch, batch, job_timeout)
+                        else:
+                            future = executor.submit(_execute, batch[0], engine, job_timeout, cache)
+                        in_flight[future] = (host, batch)
+                        active[host] += size
+                        running += size
+                    if not queue:
+                        del queues[host]
+
+                if not in_flight:
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                done, _ = wait(in_flight, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, batch = in_flight.pop(future)
+                    active[host] -= len(batch)
+                    running -= len(batch)
+                    yield from future.result()
+
+            # Whatever is left ran out of time
+            leftovers = [job for _, batch in in_flight.values() for job in batch]
+            for queue in queues.values():
+                leftovers.extend(queue)
+            for job in sorted(leftovers, key=lambda job: job[0]):
+                yield _timed_out(job)
+            if not exhausted:
+                run.not_started = _unread(jobs, pending, read)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+def run_requests(jobs, base_url="", engine="pooled", concurrency=8, per_host=4, timeout=DEFAULT_TIMEOUT, total_timeout=None, cache=None, http_version=None):
+    """Send jobs concurrently; returns a RunResults of the results as they finish
+
+    Jobs are (folder, request) pairs, or (folder, template, row, values)
+    from templates.iteration_jobs(), and are read from `jobs` only a few
+    at a time, so it can be a generator of any length. At most
+    `concurrency` requests are in flight overall and at most `per_host` to
+    any one host. Requests still queued or running when `total_timeout`
+    seconds have passed are reported as timed out; jobs not read by then
+    are counted in the RunResults' `not_started`. With a ResponseCache as
+    `cache`, GETs are served from it when possible.
+
+    With the curl engine (and no cache), the requests free slots allow for
+    a host are sent together from one curl process, so they share its
+    connections: an HTTP/2 origin gets a single multiplexed connection.
+    `http_version` (one of HTTP_VERSIONS) overrides every request's own.
+    """
+    if concurrency < 1 or per_host < 1:
+        raise ValueError(f"Concurrency and requests per host must be at least 1, not {concurrency} and {per_host}")
+    deadline = time.monotonic() + total_timeout if total_timeout else None
+    return RunResults(jobs, base_url, engine, concurrency, per_host, timeout, deadline, cache, http_version)
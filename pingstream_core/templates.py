@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import re
+
+from .engine import BODY_METHODS
+from .runner import resolve_url
+
+DATASET_TYPES = ["csv", "jsonl", "ndjson"]
+
+VARIABLE_PATTERN = re.compile(r"\{\{\s*([^{}\s]+)\s*\}\}")
+
+
+def _json_string_escape(value):
+    """Escape a value for use inside a JSON string literal"""
+    return json.dumps(value)[1:-1]
+
+
+def _inside_json_string(text):
+    """Yield True or False for each offset of `text`: whether it is inside a JSON string"""
+    inside = escaped = False
+    for char in text:
+        yield inside
+        if escaped:
+            escaped = False
+        elif char == "\\" and inside:
+            escaped = True
+        elif char == '"':
+            inside = not inside
+
+
+class Template:
+    """Text with {{variable}} placeholders, split into pieces once
+
+    render() only fills the variable pieces in and joins them, so rendering
+    the same template for every row of a dataset does no parsing. A
+    placeholder whose variable has no value is left as it is. With
+    json_body=True, values that land inside a JSON string are escaped, and
+    values outside strings are inserted as they are, so `{"id": {{id}}}`
+    takes a number and `{"name": "{{name}}"}` any text.
+    """
+
+    __slots__ = ("text", "_pieces", "_slots")
+
+    def __init__(self, text, json_body=False):
+        self.text = text
+        self._pieces = []
+        self._slots = []
+        inside = list(_inside_json_string(text)) if json_body and "{{" in text else None
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(text):
+            self._pieces.append(text[position:match.start()])
+            escape = _json_string_escape if inside is not None and inside[match.start()] else None
+            self._slots.append((len(self._pieces), match.group(1), escape))
+            self._pieces.append(match.group(0))
+            position = match.end()
+        self._pieces.append(text[position:])
+
+    @property
+    def variables(self):
+        return {name for _, name, _ in self._slots}
+
+    def render(self, values):
+        if not self._slots:
+            return self.text
+        pieces = self._pieces[:]
+        for index, name, escape in self._slots:
+            value = values.get(name)
+            if value is not None:
+                pieces[index] = escape(value) if escape is not None else value
+        return "".join(pieces)
+
+
+class RequestTemplate:
+    """A request with its URL, headers, params and body compiled as templates
+
+    render() builds the same prepared request as prepare_request() would for
+    the substituted form fields. Header and param rows are compiled when both
+    their key and value are set, and left out of a rendered request when
+    either comes out empty.
+    """
+
+    __slots__ = ("name", "method", "url", "headers", "params", "body")
+
+    def __init__(self, method, url, headers=None, params=None, body=None, name=""):
+        self.name = name
+        self.method = method
+        self.url = Template(url)
+        self.headers = [(Template(row["key"]), Template(row["value"])) for row in headers or [] if row["key"] and row["value"]]
+        self.params = [(Template(row["key"]), Template(row["value"])) for row in params or [] if row["key"] and row["value"]]
+        self.body = Template(body, json_body=True) if method in BODY_METHODS and body and body.strip() else None
+
+    @classmethod
+    def from_request(cls, request):
+        """Compile a collection's Request"""
+        return cls(request.method, request.url, request.header_rows(), request.param_rows(), request.body, request.name)
+
+    @property
+    def variables(self):
+        names = set(self.url.variables)
+        for key, value in self.headers + self.params:
+            names |= key.variables | value.variables
+        if self.body is not None:
+            names |= self.body.variables
+        return names
+
+    def render(self, values, base_url=""):
+        """Prepared request for one row of values; relative URLs are prefixed with `base_url`"""
+        url = resolve_url(base_url, self.url.render(values))
+        pairs = []
+        for key, value in self.params:
+            key, value = key.render(values), value.render(values)
+            if key and value:
+                pairs.append(f"{key}={value}")
+        if pairs:
+            url += ("&" if "?" in url else "?") + "&".join(pairs)
+
+        headers = []
+        for key, value in self.headers:
+            key, value = key.render(values), value.render(values)
+            if key and value:
+                headers.append((key, value))
+
+        data = None
+        if self.body is not None:
+            headers.append(("Content-Type", "application/json"))
+            data = self.body.render(values).encode("utf-8")
+
+        return {"method": self.method, "url": url, "headers": headers, "body": data, "files": [], "form": [], "http_version": "auto"}
+
+
+def _text_value(value):
+    """A JSON value as template text: strings as they are, anything else as JSON"""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def dataset_rows(fileobj, filename):
+    """Yield the rows of a CSV or JSON Lines dataset as dicts of strings
+
+    `fileobj` is a binary file, read a line at a time, so datasets of any
+    size stream in constant memory. CSV columns are named by the header
+    row; each JSON line has to be an object, and values other than strings
+    are turned back into JSON text (`3`, `true`, `null`).
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if filename.lower().endswith((".jsonl", ".ndjson")):
+            for number, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"Line {number} of {filename} is not valid JSON: {e}") from e
+                if not isinstance(row, dict):
+                    raise ValueError(f"Line {number} of {filename} is not a JSON object")
+                yield {key: _text_value(value) for key, value in row.items()}
+        else:
+            yield from csv.DictReader(text)
+    finally:
+        # Leave the caller's file open
+        text.detach()
+
+
+def iteration_jobs(jobs, rows):
+    """Runner jobs sending every (folder, request) job once per dataset row
+
+    Requests are compiled once, unless they already are RequestTemplates;
+    rows are pulled from `rows` only as the runner asks for more jobs.
+    Yields (folder, template, row_number, values).
+    """
+    templates = [
+        (folder, request if isinstance(request, RequestTemplate) else RequestTemplate.from_request(request))
+        for folder, request in jobs
+    ]
+    for number, values in enumerate(rows, 1):
+        for folder, template in templates:
+            yield folder, template, number, values
@@ -0,0 +1,136 @@
+import json
+import random
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from benchmarks.mock_server import ServerProcess
+
+ENGINES = ["pooled", pytest.param("curl", marks=pytest.mark.skipif(shutil.which("curl") is None, reason="curl is not installed"))]
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    """Base URL of the benchmarks' mock API server, run in a child process"""
+    with ServerProcess() as server:
+        yield server.url
+
+
+class TestHandler(BaseHTTPRequestHandler):
+    """Serves the responses the tests need
+
+        /echo       the request body, with its Content-Type
+        /peer       the client's port, which tells connections apart
+        /items      a JSON list of ?count= items (10 by default);
+                    ?latency_ms= delays the response, ?error_rate= is the
+                    share answered with a 500 and ?chunked=1 sends it in
+                    chunks
+        /fresh      fresh for a minute
+        /private    fresh for a minute, but Cache-Control: private
+        /etag       always revalidated; 304 when If-None-Match matches
+
+    /fresh, /private and /etag answer with JSON holding the request's Authorization
+    header and how many times the path (with its query) has been served.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _read_body(self):
+        length = self.headers.get("Content-Length")
+        if length:
+            return self.rfile.read(int(length))
+        body = b""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if not size:
+                    self.rfile.readline()
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return body
+
+    def _send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, body, headers=(), size=4096):
+        self.send_response(200)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(body), size):
+            chunk = body[start:start + size]
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _respond(self):
+        body = self._read_body()
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/echo":
+            self._send(200, body, [("Content-Type", self.headers.get("Content-Type", "application/octet-stream"))])
+        elif url.path == "/peer":
+            self._send(200, json.dumps({"port": self.client_address[1]}).encode(), [("Content-Type", "application/json")])
+        elif url.path.startswith("/items"):
+            time.sleep(float(query.get("latency_ms", 0)) / 1000)
+            if random.random() < float(query.get("error_rate", 0)):
+                self._send(500, b'{"error": "injected"}', [("Content-Type", "application/json")])
+                return
+            items = [{"id": i, "name": f"item {i}"} for i in range(int(query.get("count", 10)))]
+            body = json.dumps(items).encode()
+            if query.get("chunked"):
+                self._send_chunked(body, [("Content-Type", "application/json")])
+            else:
+                self._send(200, body, [("Content-Type", "application/json")])
+        elif url.path in ("/fresh", "/private", "/etag"):
+            self._cacheable(url.path)
+        else:
+            self._send(404)
+
+    def _cacheable(self, path):
+        with self.server.lock:
+            self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+            served = self.server.hits[self.path]
+        headers = [("Content-Type", "application/json")]
+        if path == "/fresh":
+            headers.append(("Cache-Control", "max-age=60"))
+        elif path == "/private":
+            headers.append(("Cache-Control", "private, max-age=60"))
+        else:
+            headers.extend([("Cache-Control", "no-cache"), ("ETag", '"v1"')])
+            if self.headers.get("If-None-Match") == '"v1"':
+                self._send(304, headers=headers[1:])
+                return
+        self._send(200, json.dumps({"authorization": self.headers.get("Authorization"), "served": served}).encode(), headers)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def server():
+    """An in-process TestHandler server; `url` is its base URL and `hits` counts requests per path"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TestHandler)
+    server.daemon_threads = True
+    # Clients that give up early (timeouts, stopped tests) are expected
+    server.handle_error = lambda request, client_address: None
+    server.lock = threading.Lock()
+    server.hits = {}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
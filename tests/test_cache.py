@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from pingstream_core.cache import ResponseCache, cache_key, freshness_lifetime
+from pingstream_core.engine import prepare_request
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(home=str(tmp_path))
+
+
+def _get(cache, url, authorization=None, headers=()):
+    rows = [{"key": "Authorization", "value": authorization}] if authorization else []
+    rows.extend({"key": key, "value": value} for key, value in headers)
+    response = cache.send(prepare_request("GET", url, headers=rows))
+    return response["cache"], json.loads(response["body"].read())
+
+
+def test_cache_key_normalizes_scheme_host_and_port():
+    assert cache_key("get", "HTTP://Example.COM:80/a?b=1#frag") == "GET http://example.com/a?b=1"
+    assert cache_key("GET", "https://example.com:443") == "GET https://example.com/"
+    assert cache_key("GET", "https://example.com:8443/") == "GET https://example.com:8443/"
+
+
+def test_freshness_lifetime():
+    assert freshness_lifetime([("Cache-Control", "public, max-age=60")], now=0) == 60
+    assert freshness_lifetime([("Date", "Wed, 21 Oct 2015 07:28:00 GMT"), ("Expires", "Wed, 21 Oct 2015 07:30:00 GMT")], now=0) == 120
+    # An invalid Expires means already expired
+    assert freshness_lifetime([("Expires", "0")], now=0) == 0
+    # Heuristic freshness: a tenth of the time since the last modification
+    headers = [("Date", "Wed, 21 Oct 2015 07:28:00 GMT"), ("Last-Modified", "Wed, 21 Oct 2015 07:18:00 GMT")]
+    assert freshness_lifetime(headers, now=0) == 60
+
+
+def test_fresh_responses_are_served_from_memory_and_disk(cache, server, tmp_path):
+    url = f"{server.url}/fresh?test=tiers"
+    assert _get(cache, url) == ("miss", {"authorization": None, "served": 1})
+    assert _get(cache, url) == ("hit", {"authorization": None, "served": 1})
+    # A new cache over the same directory reads the entry back from disk
+    assert _get(ResponseCache(home=str(tmp_path)), url) == ("hit", {"authorization": None, "served": 1})
+    assert server.hits["/fresh?test=tiers"] == 1
+
+
+def test_credentials_get_their_own_entries(cache, server):
+    url = f"{server.url}/fresh?test=credentials"
+    assert _get(cache, url, "Bearer alice") == ("miss", {"authorization": "Bearer alice", "served": 1})
+    assert _get(cache, url, "Bearer bob") == ("miss", {"authorization": "Bearer bob", "served": 2})
+    assert _get(cache, url, "Bearer alice") == ("hit", {"authorization": "Bearer alice", "served": 1})
+    assert _get(cache, url) == ("miss", {"authorization": None, "served": 3})
+    assert _get(cache, url, headers=[("Cookie", "session=1")])[0] == "miss"
+
+
+def test_private_responses_are_stored(cache, server):
+    url = f"{server.url}/private?test=private"
+    assert _get(cache, url, "Bearer alice") == ("miss", {"authorization": "Bearer alice", "served": 1})
+    assert _get(cache, url, "Bearer alice") == ("hit", {"authorization": "Bearer alice", "served": 1})
+    assert _get(cache, url, "Bearer bob") == ("miss", {"authorization": "Bearer bob", "served": 2})
+
+
+def test_stale_responses_are_revalidated(cache, server):
+    url = f"{server.url}/etag?test=revalidate"
+    assert _get(cache, url) == ("miss", {"authorization": None, "served": 1})
+    # The server answers 304 and the stored body is served
+    assert _get(cache, url) == ("revalidated", {"authorization": None, "served": 1})
+    assert server.hits["/etag?test=revalidate"] == 2
+
+
+def test_conditional_and_non_get_requests_bypass(cache, server):
+    url = f"{server.url}/fresh?test=bypass"
+    assert _get(cache, url, headers=[("If-None-Match", '"v0"')])[0] == "bypass"
+    response = cache.send(prepare_request("POST", url, body="{}"))
+    assert response["cache"] == "bypass"
+    assert cache.counters["bypass"] == 2
@@ -0,0 +1,44 @@
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from pingstream_core.cli import build_parser, main
+
+
+def test_json_report(server, tmp_path, capsys):
+    collection = tmp_path / "collection.json"
+    collection.write_text(json.dumps({
+        "openapi": "3.0.0",
+        "paths": {f"/items/{i}": {"get": {"summary": f"Item {i}"}} for i in range(5)},
+    }))
+    report = tmp_path / "report.json"
+    assert main(["run", str(collection), "--base-url", server.url, "--report", "json", "-o", str(report), "-q"]) == 0
+    data = json.loads(report.read_text())
+    assert data["summary"]["passed"] == data["summary"]["total"] == 5
+    assert "5 passed, 0 failed of 5" in capsys.readouterr().err
+
+
+def test_junit_report_and_exit_status(server, tmp_path, capsys):
+    collection = tmp_path / "collection.json"
+    collection.write_text(json.dumps({
+        "openapi": "3.0.0",
+        "paths": {"/items": {"get": {"summary": "Fine"}}, "/missing": {"get": {"summary": "Missing"}}},
+    }))
+    assert main(["run", str(collection), "--base-url", server.url, "--report", "junit"]) == 1
+    suite = ET.fromstring(capsys.readouterr().out)
+    assert suite.get("failures") == "1"
+    assert suite.find(".//testcase[@name='GET Missing']/failure").get("message") == "HTTP 404"
+    assert suite.find(".//testcase[@name='GET Fine']/failure") is None
+
+
+def test_unreadable_collection(tmp_path, capsys):
+    assert main(["run", str(tmp_path / "missing.json")]) == 2
+    assert "cannot import" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("option", ["--concurrency", "--per-host"])
+def test_limits_below_one_are_rejected(option, capsys):
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["run", "collection.json", option, "0"])
+    assert "must be at least 1" in capsys.readouterr().err
@@ -0,0 +1,79 @@
+import socket
+import threading
+import time
+
+from pingstream_core.distributed import PROTOCOL_VERSION, DistributedLoadTest, _Connection, _shares
+from pingstream_core.engine import prepare_request
+
+
+def _join(address, token, pid):
+    """Join a coordinator as a fake remote worker; returns the connection and the coordinator's first message"""
+    connection = _Connection(socket.create_connection(address))
+    connection.send({"type": "hello", "version": PROTOCOL_VERSION, "token": token, "host": "remote", "pid": pid})
+    return connection, connection.receive()
+
+
+def test_shares():
+    assert _shares(10, 3) == [4, 3, 3]
+    assert _shares(2, 4) == [1, 1, 0, 0]
+
+
+def test_local_workers_send_the_request_count(mock_server):
+    test = DistributedLoadTest(prepare_request("GET", f"{mock_server}/items"), concurrency=4, total_requests=40, processes=2)
+    test.start()
+    test.wait(60)
+    report = test.snapshot()
+    assert report["error"] is None
+    assert report["requests"] == 40
+    assert report["statuses"] == {200: 40}
+    assert [worker["state"] for worker in report["workers"]] == ["done", "done"]
+
+
+def test_no_more_workers_than_the_concurrency(mock_server):
+    test = DistributedLoadTest(prepare_request("GET", f"{mock_server}/items"), concurrency=1, duration=1, processes=0, remote_workers=2, token="secret")
+    capped = DistributedLoadTest(prepare_request("GET", f"{mock_server}/items"), concurrency=2, duration=1, processes=4)
+    assert capped.processes == 2
+    capped._server.close()
+    test.start()
+    messages = []
+
+    def worker(pid):
+        connection, message = _join(test.address, "secret", pid)
+        messages.append(message)
+        if message["type"] == "start":
+            connection.send({"type": "done"})
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(pid,)) for pid in (1, 2)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    test.wait(10)
+    assert sorted(message["type"] for message in messages) == ["start", "stop"]
+    assert [message["concurrency"] for message in messages if message["type"] == "start"] == [1]
+    assert sorted(worker["state"] for worker in test.snapshot()["workers"]) == ["done", "unused"]
+
+
+def test_malformed_messages_drop_the_worker(mock_server):
+    test = DistributedLoadTest(prepare_request("GET", f"{mock_server}/items"), concurrency=1, duration=30, processes=0, remote_workers=1, token="secret")
+    test.start()
+    connection, message = _join(test.address, "secret", 1)
+    assert message["type"] == "start"
+    connection.send({"no": "type"})
+    started = time.monotonic()
+    test.wait(10)
+    assert time.monotonic() - started < 5
+    assert test.snapshot()["workers"][0]["state"] == "lost"
+    connection.close()
+
+
+def test_wrong_token_is_turned_away(mock_server):
+    test = DistributedLoadTest(prepare_request("GET", f"{mock_server}/items"), concurrency=1, duration=1, processes=0, remote_workers=1, token="secret")
+    test.start()
+    connection, message = _join(test.address, "guess", 1)
+    assert message == {"type": "error", "message": "Wrong token"}
+    connection.close()
+    test.stop()
+    test.wait(10)
+    assert test.snapshot()["workers"] == []
@@ -0,0 +1,146 @@
+import io
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import ENGINES
+from pingstream_core.engine import ConnectionPool, RequestError, build_url, curl_command, get_header, prepare_request, send_batch, send_request
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_get(server, engine):
+    response = send_request(prepare_request("GET", f"{server.url}/items"), engine=engine)
+    assert response["status"] == 200
+    assert response["engine"] == engine
+    assert get_header(response["headers"], "content-type") == "application/json"
+    assert len(json.loads(response["body"].read())) == 10
+    assert response["timings"]["total"] > 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_chunked_body_arrives_whole(server, engine):
+    chunks = []
+    response = send_request(prepare_request("GET", f"{server.url}/items?count=5000&chunked=1"), engine=engine, on_chunk=chunks.append)
+    assert get_header(response["headers"], "Transfer-Encoding") == "chunked"
+    assert b"".join(chunks) == response["body"].read()
+    assert len(json.loads(response["body"].read())) == 5000
+    assert response["body"].read_range(0, 8) == response["body"].head[:8] == b'[{"id": '
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_bodies_that_are_not_kept_are_still_measured(server, engine):
+    response = send_request(prepare_request("GET", f"{server.url}/items?count=5000"), engine=engine, keep_body=False)
+    assert response["body"].size == len(response["body"]) > 100000
+    with pytest.raises(ValueError):
+        response["body"].read()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_error_status_is_a_response(server, engine):
+    response = send_request(prepare_request("GET", f"{server.url}/items?error_rate=1"), engine=engine)
+    assert response["status"] == 500
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_json_body(server, engine):
+    prepared = prepare_request("PUT", f"{server.url}/echo", body='{"name": "pingstream"}')
+    response = send_request(prepared, engine=engine)
+    assert get_header(response["headers"], "Content-Type") == "application/json"
+    assert json.loads(response["body"].read()) == {"name": "pingstream"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_multipart_upload(server, engine):
+    uploads = []
+    prepared = prepare_request(
+        "POST",
+        f"{server.url}/echo",
+        files=[("report", "report.csv", io.BytesIO(b"a,b\n1,2\n"), "text/csv"), ("notes", "notes.txt", io.BytesIO(b"hello"))],
+        form=[{"key": "note", "value": "quarterly"}],
+    )
+    response = send_request(prepared, engine=engine, on_upload=lambda sent, total: uploads.append((sent, total)))
+    content_type = get_header(response["headers"], "Content-Type")
+    assert content_type.startswith("multipart/form-data; boundary=")
+    body = response["body"].read()
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    assert body.startswith(b"--" + boundary)
+    assert b'name="note"\r\n\r\nquarterly\r\n' in body
+    assert b'name="report"; filename="report.csv"\r\nContent-Type: text/csv\r\n\r\na,b\n1,2\n\r\n' in body
+    assert b'name="notes"; filename="notes.txt"' in body
+    assert body.endswith(b"--" + boundary + b"--\r\n")
+    assert uploads and uploads[-1][0] == len(body)
+
+
+def test_pooled_connections_are_kept_alive(server):
+    pool = ConnectionPool()
+    prepared = prepare_request("GET", f"{server.url}/peer")
+    ports = {json.loads(send_request(prepared, pool=pool)["body"].read())["port"] for _ in range(3)}
+    assert len(ports) == 1
+
+
+def test_pool_capacity_is_released(server):
+    pool = ConnectionPool(max_idle_per_host=2)
+    prepared = prepare_request("GET", f"{server.url}/items?latency_ms=50")
+    with pool.capacity(16):
+        assert pool._limit() == 16
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(lambda _: send_request(prepared, pool=pool), range(6)))
+        assert [len(idle) for idle in pool._idle.values()] == [6]
+    assert pool._limit() == 2
+    assert [len(idle) for idle in pool._idle.values()] == [2]
+    # A pool that keeps nothing idle closes every connection afterwards
+    pool.max_idle_per_host = 0
+    with pool.capacity(4):
+        send_request(prepared, pool=pool)
+    assert [len(idle) for idle in pool._idle.values()] == [0]
+
+
+def test_build_url():
+    params = [{"key": "q", "value": "1"}, {"key": "empty", "value": ""}, {"key": "", "value": "x"}]
+    assert build_url("https://api.example.com/items", params) == "https://api.example.com/items?q=1"
+    assert build_url("https://api.example.com/items?a=1", params) == "https://api.example.com/items?a=1&q=1"
+    assert build_url("https://api.example.com/items", []) == "https://api.example.com/items"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_timings_add_up(server, engine):
+    response = send_request(prepare_request("GET", f"{server.url}/items?latency_ms=100"), engine=engine, pool=ConnectionPool())
+    timings = response["timings"]
+    assert timings["wait"] >= 90
+    assert timings["ttfb"] <= timings["total"]
+    phases = sum(timings[phase] for phase in ("dns", "connect", "tls", "wait", "transfer"))
+    assert abs(phases - timings["total"]) < 5
+    assert response["bytes_down"] > len(response["body"])
+    assert not response["reused"]
+
+
+def test_reused_connections_are_reported(server):
+    pool = ConnectionPool()
+    prepared = prepare_request("GET", f"{server.url}/items")
+    assert [send_request(prepared, pool=pool)["reused"] for _ in range(2)] == [False, True]
+
+
+def test_http_version_flags():
+    assert "--http2" in curl_command(prepare_request("GET", "https://api.example.com/", http_version="2"))
+    assert curl_command(prepare_request("GET", "https://api.example.com/"))[:2] == ["curl", "-s"]
+    with pytest.raises(RequestError):
+        send_request(prepare_request("GET", "https://api.example.com/", http_version="2"))
+
+
+@pytest.mark.skipif(shutil.which("curl") is None, reason="curl is not installed")
+def test_batches_keep_their_order(server):
+    batch = [
+        prepare_request("GET", f"{server.url}/items?count=3"),
+        prepare_request("PUT", f"{server.url}/echo", body='{"n": 1}'),
+        prepare_request("GET", f"{server.url}/missing"),
+        prepare_request("GET", "http://127.0.0.1:1/"),
+    ]
+    items, echo, missing, unreachable = send_batch(batch)
+    assert len(json.loads(items["body"].read())) == 3
+    assert json.loads(echo["body"].read()) == {"n": 1}
+    assert missing["status"] == 404
+    assert isinstance(unreachable, RequestError)
+    with pytest.raises(ValueError):
+        send_batch([prepare_request("POST", f"{server.url}/echo", form=[{"key": "a", "value": "1"}])])
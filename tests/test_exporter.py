@@ -0,0 +1,96 @@
+import io
+import json
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+from pingstream_core.engine import build_url
+from pingstream_core.exporter import EXPORT_FORMATS, export_collections
+from pingstream_core.importer import import_collection
+from pingstream_core.model import Collection, Request
+
+
+def _collections():
+    return [
+        Collection("users", [
+            Request("List users", "GET", "https://api.example.com/users", [("Accept", "application/json")], [("page", "2"), ("active", "")]),
+            Request("Create user", "POST", "https://api.example.com/users", [("Authorization", "Bearer {{token}}")],
+                    body=json.dumps({"name": "Ada", "tags": ["admin"]}, indent=2), operation_id="createUser"),
+            Request("Rename user", "PATCH", "https://api.example.com/users/{id}", body='"Grace"'),
+        ]),
+        Collection("health", [
+            Request("Ping", "GET", "/ping"),
+            Request("Count", "PUT", "https://status.example.com/count", body="42"),
+        ]),
+    ]
+
+
+def _round_trip(collections, export_format, compress=False):
+    out = io.BytesIO()
+    written = export_collections(collections, out, export_format, compress=compress)
+    filename = EXPORT_FORMATS[export_format] + (".gz" if compress else "")
+    return written, import_collection(io.BytesIO(out.getvalue()), filename)
+
+
+def _summary(collections, operation_ids=True):
+    return [
+        (collection.name, [
+            (request.name, request.method, request.url, request.headers, request.params, request.body, request.operation_id if operation_ids else None)
+            for request in collection.requests
+        ])
+        for collection in collections
+    ]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_jsonl_round_trip_keeps_everything(compress):
+    written, imported = _round_trip(_collections(), "jsonl", compress)
+    assert written == 5
+    assert _summary(imported) == _summary(_collections())
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_postman_round_trip(compress):
+    written, imported = _round_trip(_collections(), "postman", compress)
+    assert written == 5
+    # Postman collections have no operation ids
+    assert _summary(imported) == _summary(_collections(), operation_ids=False)
+
+
+def test_postman_export_encodes_query_params():
+    collections = [Collection("search", [
+        Request("Search", "GET", "https://api.example.com/search", params=[("q", "a&b=c d"), ("token", "{{token}}")]),
+    ])]
+    _, imported = _round_trip(collections, "postman")
+    request = imported[0].requests[0]
+    assert request.url == "https://api.example.com/search"
+    url = build_url(request.url, request.param_rows())
+    assert url == "https://api.example.com/search?q=a%26b%3Dc%20d&token={{token}}"
+    assert parse_qsl(urlsplit(url).query) == [("q", "a&b=c d"), ("token", "{{token}}")]
+
+
+def test_openapi_round_trip():
+    written, imported = _round_trip(_collections(), "openapi")
+    assert written == 5
+    requests = {request.name: request for collection in imported for request in collection.requests}
+    assert sorted(requests) == ["Count", "Create user", "List users", "Ping", "Rename user"]
+    assert requests["List users"].params == (("page", "2"), ("active", ""))
+    assert requests["Create user"].operation_id == "createUser"
+    assert json.loads(requests["Create user"].body) == {"name": "Ada", "tags": ["admin"]}
+    # Bodies that are JSON strings or numbers come back as they were
+    assert requests["Rename user"].body == '"Grace"'
+    assert requests["Count"].body == "42"
+    assert requests["Count"].url == "https://status.example.com/count"
+
+
+def test_openapi_leaves_out_what_it_cannot_hold():
+    collections = [Collection("misc", [
+        Request("First", "GET", "/things"),
+        Request("Duplicate", "GET", "/things"),
+        Request("Probe", "HEAD", "/things"),
+        Request("Options only", "OPTIONS", "/other"),
+    ])]
+    out = io.BytesIO()
+    assert export_collections(collections, out, "openapi") == 1
+    document = json.loads(out.getvalue())
+    assert document["paths"] == {"/things": {"get": {"tags": ["misc"], "summary": "First"}}}
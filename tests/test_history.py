@@ -0,0 +1,50 @@
+import pytest
+
+from pingstream_core.engine import prepare_request, send_request
+from pingstream_core.history import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(home=str(tmp_path))
+
+
+def _record(store, server, path, method="GET"):
+    request = {"method": method, "url": f"{server.url}{path}", "headers": [], "params": [], "body": ""}
+    response = send_request(prepare_request(method, request["url"]))
+    return store.record(request, response)
+
+
+def test_entries_keep_the_request_and_response(store, server):
+    entry_id = _record(store, server, "/items?count=3")
+    entry = store.get(entry_id)
+    assert entry["status"] == 200
+    assert entry["request"]["url"] == f"{server.url}/items?count=3"
+    assert entry["response"]["engine"] == "pooled"
+    assert entry["timings"]["total"] == entry["total_ms"]
+    with store.open_body(entry["body_hash"]) as body:
+        assert body.read().startswith(b'[{"id": 0')
+    assert store.get(entry_id + 1) is None
+
+
+def test_search_filters_and_pages(store, server):
+    for i in range(5):
+        _record(store, server, f"/items?count={i}")
+    _record(store, server, "/items?error_rate=1", method="POST")
+    assert store.count() == 6
+    assert [entry["method"] for entry in store.search(method="POST")] == ["POST"]
+    assert [entry["status"] for entry in store.search(status="5xx")] == [500]
+    assert len(store.search(url_contains="count=")) == 5
+    first = store.search(limit=4)
+    second = store.search(before_id=first[-1]["id"], limit=4)
+    assert [entry["id"] for entry in first + second] == sorted((entry["id"] for entry in first + second), reverse=True)
+    assert len(second) == 2
+
+
+def test_identical_bodies_are_stored_once(store, server, tmp_path):
+    first = store.get(_record(store, server, "/items?count=2"))
+    second = store.get(_record(store, server, "/items?count=2"))
+    assert first["body_hash"] == second["body_hash"]
+    store.clear()
+    store.clear_bodies()
+    assert store.open_body(first["body_hash"]) is None
@@ -0,0 +1,123 @@
+import io
+import json
+
+from pingstream_core.engine import build_url
+from pingstream_core.importer import import_collection, parse_openapi_spec
+
+OPENAPI = {
+    "openapi": "3.0.0",
+    "components": {"schemas": {"Pet": {"properties": {"name": {"type": "string"}}}}},
+    "paths": {
+        "/pets": {
+            "get": {"tags": ["pets"], "summary": "List pets", "parameters": [{"name": "limit", "in": "query"}]},
+            "post": {
+                "tags": ["pets"],
+                "operationId": "addPet",
+                "requestBody": {"content": {"application/json": {"schema": {"properties": {"name": {"type": "string"}}}}}},
+            },
+            "head": {"summary": "Ignored"},
+        },
+        "/health": {"get": {"summary": "Health"}},
+    },
+}
+
+POSTMAN = {
+    "info": {"name": "shop", "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"},
+    "item": [
+        {"name": "Ping", "request": {"method": "GET", "url": "https://api.example.com/ping"}},
+        {"name": "orders", "item": [
+            {"name": "List orders", "request": {"method": "GET", "url": {"raw": "https://api.example.com/orders"},
+                                                "header": [{"key": "Accept", "value": "application/json"}]}},
+            {"name": "Create order", "request": {"method": "POST", "url": "https://api.example.com/orders",
+                                                 "body": {"mode": "raw", "raw": "{\"sku\": 1}"}}},
+        ]},
+    ],
+}
+
+
+def _summary(collections):
+    return [(c.name, [(r.name, r.method, r.url, r.headers, r.params, r.body) for r in c.requests]) for c in collections]
+
+
+def _import(document, filename="collection.json", progress=None):
+    return import_collection(io.BytesIO(json.dumps(document).encode()), filename, progress)
+
+
+def test_streamed_import_matches_the_parsed_document():
+    for document in (OPENAPI, POSTMAN):
+        assert _summary(_import(document)) == _summary(parse_openapi_spec(document))
+
+
+def test_openapi_import():
+    pets, default = _import(OPENAPI)
+    assert (pets.name, default.name) == ("pets", "Default")
+    assert [(r.name, r.method, r.operation_id) for r in pets.requests] == [("List pets", "GET", None), ("addPet", "POST", "addPet")]
+    assert pets.requests[0].params == (("limit", ""),)
+    assert json.loads(pets.requests[1].body) == {"name": ""}
+
+
+def test_postman_folders():
+    default, orders = _import(POSTMAN)
+    assert [r.name for r in default.requests] == ["Ping"]
+    assert [(r.method, r.url) for r in orders.requests] == [
+        ("GET", "https://api.example.com/orders"),
+        ("POST", "https://api.example.com/orders"),
+    ]
+    assert orders.requests[0].headers == (("Accept", "application/json"),)
+    assert orders.requests[1].body == '{"sku": 1}'
+
+
+def test_yaml_import():
+    import yaml
+
+    collections = import_collection(io.BytesIO(yaml.safe_dump(OPENAPI, sort_keys=False).encode()), "spec.yaml")
+    assert _summary(collections) == _summary(parse_openapi_spec(OPENAPI))
+
+
+def test_progress_is_reported():
+    calls = []
+    document = dict(OPENAPI, paths={f"/pets/{i}": OPENAPI["paths"]["/pets"] for i in range(200)})
+    data = json.dumps(document).encode()
+    import_collection(io.BytesIO(data), "big.json", progress=lambda done, total: calls.append((done, total)))
+    assert calls and calls[-1] == (len(data), len(data))
+
+
+def test_unknown_documents_give_no_collections():
+    assert _import({"hello": "world"}) == []
+    assert _import([1, 2, 3]) == []
+
+
+def test_cached_imports_return_fresh_requests():
+    first, second = _import(POSTMAN), _import(POSTMAN)
+    assert _summary(first) == _summary(second)
+    first_ids = {request.id for collection in first for request in collection.requests}
+    second_ids = {request.id for collection in second for request in collection.requests}
+    assert not first_ids & second_ids
+
+
+def test_openapi_examples_fill_params_and_bodies():
+    spec = {
+        "openapi": "3.0.0",
+        "paths": {"/pets": {
+            "get": {"parameters": [{"name": "limit", "in": "query", "example": 10}, {"name": "X-Trace", "in": "header", "example": "on"}]},
+            "post": {"requestBody": {"content": {"application/json": {"example": {"name": "Rex"}}}}},
+        }},
+    }
+    [default] = parse_openapi_spec(spec)
+    listing, adding = default.requests
+    assert listing.params == (("limit", "10"),)
+    assert listing.headers == (("X-Trace", "on"),)
+    assert json.loads(adding.body) == {"name": "Rex"}
+
+
+def test_postman_query_becomes_params():
+    document = dict(POSTMAN, item=[{"name": "Search", "request": {"method": "GET", "url": {
+        "raw": "https://api.example.com/items?flag=&q=1",
+        "query": [{"key": "flag", "value": ""}, {"key": "q", "value": "1"}, {"key": "off", "value": "x", "disabled": True}],
+    }}}])
+    [collection] = _import(document)
+    request = collection.requests[0]
+    # An empty param is still sent, so it stays on the URL
+    assert request.url == "https://api.example.com/items?flag="
+    assert request.params == (("q", "1"),)
+    assert build_url(request.url, request.param_rows()) == "https://api.example.com/items?flag=&q=1"
@@ -0,0 +1,47 @@
+from pingstream_core.index import EndpointIndex, normalize_path, tokenize
+from pingstream_core.model import Collection, Request
+
+COLLECTIONS = [
+    Collection("orders", [
+        Request("List orders", "GET", "/orders"),
+        Request("Get order", "GET", "/orders/{orderId}", operation_id="getOrderById"),
+        Request("Cancel order", "DELETE", "{{baseUrl}}/orders/:id"),
+    ]),
+    Collection("customers", [
+        Request("Customer orders", "GET", "https://api.example.com/customers/{id}/orders?page=1"),
+    ]),
+]
+
+
+def _names(index, query):
+    return [index.requests[number].name for number in index.search(query)]
+
+
+def test_normalize_path():
+    assert normalize_path("https://api.example.com/customers/{id}/orders?page=1") == "/customers/{}/orders"
+    assert normalize_path("{{baseUrl}}/orders/:id") == "/orders/{}"
+    assert normalize_path("/orders/{{orderId}}#top") == "/orders/{}"
+
+
+def test_tokenize_splits_camel_case():
+    assert tokenize("getOrderById") == ["getorderbyid", "get", "order", "by", "id"]
+
+
+def test_every_word_has_to_match():
+    index = EndpointIndex(COLLECTIONS)
+    assert len(index) == 4
+    assert _names(index, "customer orders") == ["Customer orders"]
+    assert _names(index, "order byid") == []
+
+
+def test_prefix_fuzzy_and_method_matches():
+    index = EndpointIndex(COLLECTIONS)
+    assert "Cancel order" in _names(index, "canc")
+    assert _names(index, "cusomers") == ["Customer orders"]
+    assert _names(index, "delete") == ["Cancel order"]
+    assert _names(index, "GET order by id") == ["Get order"]
+
+
+def test_paths_rank_first():
+    index = EndpointIndex(COLLECTIONS)
+    assert _names(index, "orders/{id}")[:2] == ["Get order", "Cancel order"]
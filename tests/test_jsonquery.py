@@ -0,0 +1,85 @@
+import io
+import json
+
+import pytest
+
+from pingstream_core.jsonquery import compile_path, format_path, json_children, query_json
+
+STORE = {
+    "store": {
+        "book": [
+            {"title": "Sayings", "price": 8.95, "tags": ["classic"]},
+            {"title": "Sword", "price": 12.99},
+            {"title": "Moby Dick", "price": 8.99, "isbn": "0-553-21311-3"},
+            {"title": "The Lord", "price": 22.99, "isbn": "0-395-19395-8"},
+        ],
+        "bicycle": {"color": "red", "price": 19.95},
+        "first name": "shop",
+    },
+}
+
+
+def _query(expression, document=STORE, limit=None):
+    return list(query_json(io.BytesIO(json.dumps(document).encode()), expression, limit))
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("$.store.bicycle.color", [(("store", "bicycle", "color"), "red")]),
+    ("store.bicycle.color", [(("store", "bicycle", "color"), "red")]),
+    ("$.store.book[1].title", [(("store", "book", 1, "title"), "Sword")]),
+    ("$.store.book[0,2].price", [(("store", "book", 0, "price"), 8.95), (("store", "book", 2, "price"), 8.99)]),
+    ("$.store.book[1:4:2].title", [(("store", "book", 1, "title"), "Sword"), (("store", "book", 3, "title"), "The Lord")]),
+    ("$.store['first name']", [(("store", "first name"), "shop")]),
+    ("$.store.book[?(@.isbn)].title", [(("store", "book", 2, "title"), "Moby Dick"), (("store", "book", 3, "title"), "The Lord")]),
+    ("$.store.book[?(@.price < 10 && @.tags)].title", [(("store", "book", 0, "title"), "Sayings")]),
+    ("$.store.book[?(@.title == 'Sword')].price", [(("store", "book", 1, "price"), 12.99)]),
+    ("$.store.missing", []),
+])
+def test_query(expression, expected):
+    assert _query(expression) == expected
+
+
+def test_recursive_descent_finds_every_price_in_document_order():
+    prices = [value for _, value in _query("$..price")]
+    assert prices == [8.95, 12.99, 8.99, 22.99, 19.95]
+
+
+def test_wildcards_and_limits():
+    assert [path for path, _ in _query("$.store.*")] == [("store", "book"), ("store", "bicycle"), ("store", "first name")]
+    assert len(_query("$..title", limit=2)) == 2
+
+
+def test_large_documents_are_read_incrementally():
+    document = {"items": [{"id": i, "payload": "x" * 100} for i in range(20000)]}
+    assert _query("$.items[19999].id", document) == [(("items", 19999, "id"), 19999)]
+    assert [value for _, value in _query("$.items[?(@.id >= 19998)].id", document)] == [19998, 19999]
+
+
+@pytest.mark.parametrize("expression", ["$.store[", "$.[", "$.store.book[-1]", "$!"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        compile_path(expression)
+
+
+def test_format_path():
+    assert format_path(("store", "book", 3, "first name")) == "$.store.book[3][\"first name\"]"
+    assert format_path(()) == "$"
+
+
+def test_json_children_pages_through_a_node():
+    source = io.BytesIO(json.dumps(STORE).encode())
+    page = json_children(source, ("store",))
+    assert page["kind"] == "object"
+    assert page["children"] == [("book", "array", None), ("bicycle", "object", None), ("first name", "value", "shop")]
+    assert not page["has_more"]
+
+    source.seek(0)
+    page = json_children(source, ("store", "book"), offset=1, limit=2)
+    assert [key for key, _, _ in page["children"]] == [1, 2]
+    assert page["has_more"]
+
+    source.seek(0)
+    assert json_children(source, ("store", "bicycle", "price"))["value"] == 19.95
+    source.seek(0)
+    with pytest.raises(KeyError):
+        json_children(source, ("store", "car"))
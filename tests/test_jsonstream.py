@@ -0,0 +1,73 @@
+import io
+import json
+
+import pytest
+
+from pingstream_core.jsonstream import JsonStream
+
+DOCUMENT = {
+    "name": "café ☕",
+    "count": 1234567890123,
+    "ratio": -12.5e-3,
+    "flags": [True, False, None],
+    "nested": {"deep": [[1, 2], {"a": "x\"y\\z"}], "empty": {}, "none": []},
+    "items": [{"id": i, "tags": ["t" * (i % 7)]} for i in range(50)],
+}
+
+
+def _stream(value, chunk_size):
+    return JsonStream(io.BytesIO(json.dumps(value).encode("utf-8")), chunk_size=chunk_size)
+
+
+def _walk(stream):
+    """Rebuild the next value through iter_object() and iter_array()"""
+    kind = stream.peek()
+    if kind == "{":
+        return {key: _walk(stream) for key in stream.iter_object()}
+    if kind == "[":
+        return [_walk(stream) for _ in stream.iter_array()]
+    return stream.read_value()
+
+
+# Tiny chunks cut numbers, strings and escapes at every possible place
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 65536])
+def test_walking_rebuilds_the_document(chunk_size):
+    stream = _stream(DOCUMENT, chunk_size)
+    assert _walk(stream) == DOCUMENT
+    assert stream.peek() == ""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64])
+def test_read_value_parses_whole_values(chunk_size):
+    assert _stream(DOCUMENT, chunk_size).read_value() == DOCUMENT
+    assert _stream(12.5, chunk_size).read_value() == 12.5
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 16, 4096])
+def test_skip_value_lands_on_the_next_member(chunk_size):
+    stream = _stream(DOCUMENT, chunk_size)
+    seen = {}
+    for key in stream.iter_object():
+        if key in ("name", "ratio"):
+            seen[key] = stream.read_value()
+        else:
+            stream.skip_value()
+    assert seen == {"name": DOCUMENT["name"], "ratio": DOCUMENT["ratio"]}
+
+
+def test_text_files_and_byte_order_marks():
+    assert JsonStream(io.StringIO('{"a": [1, 2]}')).read_value() == {"a": [1, 2]}
+    assert JsonStream(io.BytesIO(b'\xef\xbb\xbf[1]')).read_value() == [1]
+
+
+def test_read_buffered_leaves_long_values():
+    stream = _stream(DOCUMENT, 16)
+    assert stream.read_buffered() == (False, None)
+    assert stream.read_value() == DOCUMENT
+    assert _stream([1, 2], 64).read_buffered() == (True, [1, 2])
+
+
+@pytest.mark.parametrize("text", ['{"a": 1', '{"a" 1}', '[1 2]', '{"a": [1, 2}'])
+def test_malformed_input_raises(text):
+    with pytest.raises(ValueError):
+        _walk(JsonStream(io.BytesIO(text.encode()), chunk_size=4))
@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from pingstream_core.engine import get_pool, prepare_request
+from pingstream_core.loadtest import AdaptiveLoadTest, LatencyHistogram, LoadTest, retry_after_seconds
+
+
+def _run(test, stop_after=None):
+    """Start a test and return the seconds it took to finish, stopping it after `stop_after` seconds"""
+    started = time.monotonic()
+    test.start()
+    if stop_after is not None:
+        time.sleep(stop_after)
+        test.stop()
+    test.wait()
+    return time.monotonic() - started
+
+
+def test_requires_a_duration_or_request_count():
+    with pytest.raises(ValueError):
+        LoadTest(prepare_request("GET", "http://127.0.0.1/"))
+
+
+@pytest.mark.parametrize("rate", [None, 50])
+def test_request_count(server, rate):
+    test = LoadTest(prepare_request("GET", f"{server.url}/items"), concurrency=4, rate=rate, total_requests=25)
+    _run(test)
+    report = test.snapshot()
+    assert report["requests"] == 25
+    assert report["statuses"] == {200: 25}
+    assert not report["running"]
+
+
+@pytest.mark.parametrize("rate", [None, 500])
+def test_duration_is_honoured_by_a_slow_server(server, rate):
+    test = LoadTest(prepare_request("GET", f"{server.url}/items?latency_ms=200"), concurrency=4, rate=rate, duration=1)
+    assert _run(test) < 1.6
+    assert test.snapshot()["requests"] > 0
+
+
+@pytest.mark.parametrize("rate", [None, 500])
+def test_stop_is_honoured_by_a_slow_server(server, rate):
+    test = LoadTest(prepare_request("GET", f"{server.url}/items?latency_ms=200"), concurrency=4, rate=rate, duration=60)
+    assert _run(test, stop_after=0.5) < 1.2
+
+
+def test_rate_is_kept(server):
+    test = LoadTest(prepare_request("GET", f"{server.url}/items"), concurrency=4, rate=40, duration=1)
+    _run(test)
+    assert 30 <= test.snapshot()["requests"] <= 42
+
+
+def test_late_requests_count_their_wait(server):
+    # Four slots and 200 ms responses sustain 20 RPS: at 100 RPS requests
+    # queue, and their latency is measured from when they were due
+    test = LoadTest(prepare_request("GET", f"{server.url}/items?latency_ms=200"), concurrency=4, rate=100, duration=1)
+    _run(test)
+    assert test.snapshot()["latency_ms"]["max"] > 400
+
+
+def test_errors_are_counted(server):
+    test = LoadTest(prepare_request("GET", f"{server.url}/items?error_rate=1"), concurrency=2, total_requests=10)
+    _run(test)
+    report = test.snapshot()
+    assert report["errors"] == 10
+    assert report["error_rate"] == 1.0
+    assert report["statuses"] == {500: 10}
+
+
+def test_histogram_percentiles_are_within_precision():
+    histogram = LatencyHistogram()
+    for value in range(1, 100001):
+        histogram.record(value)
+    assert histogram.count == 100000
+    assert histogram.min == 1 and histogram.max == 100000
+    for percentile in (50, 90, 99, 99.9):
+        expected = percentile / 100 * 100000
+        assert abs(histogram.percentile(percentile) - expected) / expected < 1 / 2 ** 7
+
+
+def test_histogram_merges_through_json():
+    first, second, whole = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for value in range(0, 50000, 7):
+        (first if value % 2 else second).record(value)
+        whole.record(value)
+    merged = LatencyHistogram()
+    merged.merge_json(first.to_json())
+    merged.merge_json(second.to_json())
+    assert merged.counts == whole.counts
+    assert (merged.count, merged.total, merged.min, merged.max) == (whole.count, whole.total, whole.min, whole.max)
+    with pytest.raises(ValueError):
+        LatencyHistogram(sub_bucket_bits=6).merge_json(first.to_json())
+
+
+def test_retry_after():
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds("") is None
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480.0) == 10.0
+
+
+def test_adaptive_test_backs_off_when_throttled(mock_server):
+    # Four slots, and 429s once more than four requests wait for one
+    url = f"{mock_server}/items?latency_ms=20&capacity=4&overload=4&retry_after=0"
+    test = AdaptiveLoadTest(prepare_request("GET", url), max_concurrency=64, interval=0.3, duration=2.5)
+    limit = get_pool()._limit()
+    _run(test)
+    # The pool keeps more idle connections only while the test runs
+    assert get_pool()._limit() == limit
+    report = test.snapshot()
+    assert report["throttled"] > 0
+    assert any(step["congested"] for step in report["steps"])
+    congested = next(step for step in report["steps"] if step["congested"])
+    assert congested["concurrency"] >= 8
+    assert report["knee"] is not None and report["knee"]["concurrency"] <= congested["concurrency"]
+
+
+def test_knee_is_the_least_concurrency_near_the_peak():
+    test = AdaptiveLoadTest(prepare_request("GET", "http://127.0.0.1/"), duration=1)
+    test.steps = [
+        {"concurrency": 1, "throughput": 50, "p50_ms": 20, "requests": 50, "congested": False},
+        {"concurrency": 4, "throughput": 190, "p50_ms": 21, "requests": 190, "congested": False},
+        {"concurrency": 8, "throughput": 200, "p50_ms": 40, "requests": 200, "congested": False},
+        {"concurrency": 16, "throughput": 400, "p50_ms": 80, "requests": 400, "congested": True},
+    ]
+    assert test.knee()["concurrency"] == 4
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from benchmarks.mock_server import body_size
+from conftest import ENGINES
+from pingstream_core.engine import get_header, prepare_request, send_request
+
+
+def _get(mock_server, query, engine="pooled"):
+    return send_request(prepare_request("GET", f"{mock_server}/items?{query}"), engine=engine)
+
+
+@pytest.mark.parametrize("size", [0, 100, 4096, 200000])
+def test_json_bodies_have_the_promised_size(mock_server, size):
+    response = _get(mock_server, f"size={size}")
+    assert response["body"].size == body_size("json", size)
+    assert isinstance(json.loads(response["body"].read()), list)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_chunked_bodies(mock_server, engine):
+    chunks = []
+    prepared = prepare_request("GET", f"{mock_server}/items?size=200000&chunked=1&chunks=8")
+    response = send_request(prepared, engine=engine, on_chunk=chunks.append)
+    assert get_header(response["headers"], "Transfer-Encoding") == "chunked"
+    assert response["body"].size == body_size("json", 200000)
+    assert b"".join(chunks) == response["body"].read()
+
+
+def test_bytes_status_and_errors(mock_server):
+    response = _get(mock_server, "kind=bytes&size=10&status=201")
+    assert (response["status"], response["body"].read()) == (201, b"x" * 10)
+    assert _get(mock_server, "error_rate=1")["status"] == 500
+
+
+def test_request_bodies_are_discarded(mock_server):
+    prepared = prepare_request("POST", f"{mock_server}/items?size=10&kind=bytes", body='{"a": 1}')
+    assert [send_request(prepared)["status"] for _ in range(3)] == [200, 200, 200]
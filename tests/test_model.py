@@ -0,0 +1,58 @@
+import sys
+
+from pingstream_core.model import Collection, Request, deep_size, memory_report, split_base
+
+
+def test_split_base():
+    assert split_base("https://api.example.com/users?page=1") == ("https://api.example.com", "/users?page=1")
+    assert split_base("https://api.example.com") == ("https://api.example.com", "")
+    assert split_base("{{baseUrl}}/users") == ("{{baseUrl}}", "/users")
+    assert split_base("/users") == ("", "/users")
+
+
+def test_requests_round_trip_their_fields():
+    request = Request("List users", "GET", "https://api.example.com/users", [{"key": "Accept", "value": "application/json"}], [("page", "2")])
+    assert request.url == "https://api.example.com/users"
+    assert request.to_form() == {
+        "method": "GET",
+        "url": "https://api.example.com/users",
+        "headers": [{"key": "Accept", "value": "application/json"}],
+        "params": [{"key": "page", "value": "2"}],
+        "body": "{}",
+    }
+    assert Request("Other", "GET", "/users").id != request.id
+
+
+def test_identical_values_are_shared_within_an_import():
+    shared = {}
+    first = Request("a", "POST", "/a", [("Accept", "*/*")], body='{"x": 1}', shared=shared)
+    second = Request("b", "POST", "/b", [("Accept", "*/*")], body='{"x": 1}', shared=shared)
+    assert first.headers is second.headers
+    assert first.body is second.body
+
+
+def test_memory_report_counts_shared_objects_once():
+    shared = {}
+    body = "x" * 10000
+    collections = [
+        Collection("first", [Request("a", "POST", "/a", body=body, shared=shared)]),
+        Collection("second", [Request("b", "POST", "/b", body="".join(body), shared=shared)]),
+    ]
+    first, second = memory_report(collections)
+    assert (first["folder"], first["requests"]) == ("first", 1)
+    assert first["bytes"] > 10000 > second["bytes"]
+
+
+class Slotted:
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+
+def test_deep_size_follows_containers_and_slots():
+    payload = "x" * 10000
+    assert deep_size(Slotted(payload)) >= sys.getsizeof(payload)
+    assert deep_size({"a": [payload, payload]}) < 2 * sys.getsizeof(payload)
+    # Classes and functions are not looked into
+    assert deep_size(Slotted) == sys.getsizeof(Slotted)
@@ -0,0 +1,53 @@
+import time
+
+from pingstream_core.profiler import Profiler, state_sizes
+
+
+def test_runs_record_phases_sections_and_counters():
+    profiler = Profiler()
+    profiler.count("requests")
+    with profiler.run("rerun"):
+        profiler.phase("setup")
+        with profiler.section("load"):
+            with profiler.section("parse"):
+                time.sleep(0.01)
+        profiler.phase("render")
+        profiler.count("requests", 2)
+    # Outside a run nothing is timed
+    profiler.phase("ignored")
+    with profiler.section("ignored"):
+        pass
+
+    [run] = profiler.runs
+    assert [(name, depth) for name, _, _, depth in run.spans] == [("parse", 2), ("load", 1), ("setup", 0), ("render", 0)]
+    assert list(run.breakdown())[:2] == ["setup", "render"]
+    assert run.breakdown()["setup"] >= 10
+    assert run.counters == {"requests": 2}
+    assert profiler.counters == {"requests": 3}
+
+
+def test_disabled_runs_are_not_recorded():
+    profiler = Profiler()
+    with profiler.run(enabled=False):
+        profiler.phase("setup")
+    assert not profiler.runs
+
+
+def test_exports():
+    profiler = Profiler(max_runs=2)
+    for _ in range(3):
+        with profiler.run():
+            profiler.phase("only")
+    report = profiler.to_json()
+    assert len(report["runs"]) == 2
+    assert report["runs"][0]["spans"][0]["name"] == "only"
+    events = profiler.chrome_trace()["traceEvents"]
+    assert [event["cat"] for event in events] == ["run", "phase", "run", "phase"]
+
+
+def test_state_sizes_count_shared_objects_once_in_the_total():
+    payload = "x" * 10000
+    rows, total = state_sizes({"small": 1, "first": [payload], "second": [payload]})
+    assert [row["key"] for row in rows][-1] == "small"
+    assert rows[0]["bytes"] > 10000
+    assert total < sum(row["bytes"] for row in rows)
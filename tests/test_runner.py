@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from conftest import ENGINES
+from pingstream_core.engine import get_pool
+from pingstream_core.model import Request
+from pingstream_core.runner import resolve_url, run_requests
+
+
+def _jobs(count, query=""):
+    return [("folder", Request(f"item {i}", "GET", f"/items/{i}?{query}")) for i in range(count)]
+
+
+def test_resolve_url():
+    assert resolve_url("https://api.example.com/", "/users") == "https://api.example.com/users"
+    assert resolve_url("https://api.example.com", "http://other.example.com/x") == "http://other.example.com/x"
+    assert resolve_url("", "/users") == "/users"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_every_job_gets_a_result(server, engine):
+    results = list(run_requests(_jobs(30), base_url=server.url, engine=engine, concurrency=6, per_host=3))
+    assert sorted(result["index"] for result in results) == list(range(30))
+    assert all(result["status"] == 200 and not result["error"] for result in results)
+    assert all(result["protocol"] == "HTTP/1.1" for result in results)
+    assert results[0]["url"].startswith(server.url)
+
+
+def test_per_host_limit_is_not_exceeded(server):
+    # 12 requests of 200 ms, at most 2 at a time: 6 rounds
+    started = time.monotonic()
+    results = list(run_requests(_jobs(12, "latency_ms=200"), base_url=server.url, concurrency=12, per_host=2))
+    assert len(results) == 12
+    assert time.monotonic() - started >= 1.1
+
+
+@pytest.mark.parametrize("concurrency, per_host", [(0, 4), (4, 0), (-1, 1)])
+def test_limits_below_one_are_rejected(concurrency, per_host):
+    with pytest.raises(ValueError):
+        run_requests(_jobs(1), concurrency=concurrency, per_host=per_host)
+
+
+def test_total_timeout_reports_the_jobs_it_read_as_timed_out(server):
+    started = time.monotonic()
+    results = run_requests(_jobs(60, "latency_ms=300"), base_url=server.url, concurrency=4, per_host=4, total_timeout=0.5)
+    finished = list(results)
+    assert time.monotonic() - started < 1.5
+    # The first four finish in time; the next four only get what is left
+    assert 0 < sum(result["status"] == 200 for result in finished) <= 4
+    timed_out = [result for result in finished if result["error"] == "Run timed out"]
+    assert timed_out and all(result["status"] is None for result in timed_out)
+    # Only a few jobs are read ahead; the rest are counted, not reported
+    assert len(finished) < 60
+    assert sorted(result["index"] for result in finished) == list(range(len(finished)))
+    assert results.not_started == 60 - len(finished)
+
+
+def test_total_timeout_leaves_a_job_iterator_unread(server):
+    consumed = []
+
+    def jobs():
+        for job in _jobs(1000, "latency_ms=300"):
+            consumed.append(job)
+            yield job
+
+    results = run_requests(jobs(), base_url=server.url, concurrency=2, per_host=2, total_timeout=0.3)
+    finished = list(results)
+    assert len(finished) < 100
+    assert len(consumed) < 100
+    assert results.not_started is None
+
+
+def test_pool_limit_is_restored_after_a_run(server):
+    pool = get_pool()
+    limit = pool.max_idle_per_host
+    results = list(run_requests(_jobs(24, "latency_ms=50"), base_url=server.url, concurrency=24, per_host=24))
+    assert all(result["status"] == 200 for result in results)
+    assert pool._limit() == limit
+    assert all(len(idle) <= limit for idle in pool._idle.values())
+
+
+def test_jobs_are_read_lazily(server):
+    consumed = []
+
+    def jobs():
+        for job in _jobs(100):
+            consumed.append(job)
+            yield job
+
+    results = run_requests(jobs(), base_url=server.url, concurrency=2, per_host=2)
+    next(results)
+    assert len(consumed) < 100
+    results.close()
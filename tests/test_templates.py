@@ -0,0 +1,63 @@
+import io
+import json
+
+import pytest
+
+from pingstream_core.engine import prepare_request
+from pingstream_core.model import Request
+from pingstream_core.runner import run_requests
+from pingstream_core.templates import RequestTemplate, Template, dataset_rows, iteration_jobs
+
+
+def test_template_fills_known_variables():
+    template = Template("/users/{{ id }}/{{missing}}")
+    assert template.variables == {"id", "missing"}
+    assert template.render({"id": "7"}) == "/users/7/{{missing}}"
+    assert Template("plain").render({"id": "7"}) == "plain"
+
+
+def test_json_bodies_escape_values_inside_strings():
+    template = Template('{"id": {{id}}, "name": "{{name}}"}', json_body=True)
+    rendered = template.render({"id": "3", "name": 'say "hi"\n'})
+    assert json.loads(rendered) == {"id": 3, "name": 'say "hi"\n'}
+
+
+def test_rendering_matches_prepare_request():
+    headers = [{"key": "Authorization", "value": "Bearer {{token}}"}, {"key": "X-Empty", "value": "{{none}}"}]
+    params = [{"key": "page", "value": "{{page}}"}]
+    template = RequestTemplate("POST", "/users/{{id}}", headers, params, '{"id": {{id}}}')
+    assert template.variables == {"token", "none", "id", "page"}
+    values = {"token": "abc", "none": "", "id": "5", "page": "2"}
+    expected = prepare_request(
+        "POST",
+        "https://api.example.com/users/5",
+        [{"key": "Authorization", "value": "Bearer abc"}, {"key": "X-Empty", "value": ""}],
+        [{"key": "page", "value": "2"}],
+        '{"id": 5}',
+    )
+    assert template.render(values, "https://api.example.com") == expected
+
+
+def test_dataset_rows():
+    csv_rows = list(dataset_rows(io.BytesIO(b"\xef\xbb\xbfid,name\n1,Ada\n2,Grace\n"), "users.csv"))
+    assert csv_rows == [{"id": "1", "name": "Ada"}, {"id": "2", "name": "Grace"}]
+    jsonl = b'{"id": 1, "admin": true, "name": "Ada"}\n\n{"id": 2, "admin": null, "name": "Grace"}\n'
+    assert list(dataset_rows(io.BytesIO(jsonl), "users.jsonl")) == [
+        {"id": "1", "admin": "true", "name": "Ada"},
+        {"id": "2", "admin": "null", "name": "Grace"},
+    ]
+
+
+@pytest.mark.parametrize("data", [b'{"id": 1}\n[1]\n', b'{"id": 1}\nnot json\n'])
+def test_bad_json_lines_are_reported(data):
+    with pytest.raises(ValueError, match="Line 2"):
+        list(dataset_rows(io.BytesIO(data), "rows.jsonl"))
+
+
+def test_iterations_run_once_per_row(server):
+    jobs = [("users", Request("Items", "GET", "/items?count={{count}}"))]
+    rows = ({"count": str(count)} for count in range(1, 6))
+    results = list(run_requests(iteration_jobs(jobs, rows), base_url=server.url, concurrency=2))
+    assert sorted(result["row"] for result in results) == [1, 2, 3, 4, 5]
+    assert {result["url"] for result in results} == {f"{server.url}/items?count={count}" for count in range(1, 6)}
+    assert all(result["status"] == 200 for result in results)